@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark bulk DID:peer:2 generation and resolution by worker count.
+
+Prints DIDs/sec for `generate_did_peer2_bulk` and `resolve_did_peer2_bulk` at
+each worker count, with the speed-up over a single in-process worker. Records
+are JSON-encoded in the workers, as the JSON Lines CLI does.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+
+from did_peer_utils import generate_did_peer2_bulk, resolve_did_peer2_bulk  # noqa: E402
+
+
+TRQP_CONFIG = {
+    "services": [
+        {
+            "id": "#tr-1",
+            "type": "TRQP",
+            "serviceEndpoint": {
+                "profile": "https://trustoverip.org/profiles/trp/v2",
+                "uri": "https://localhost:3000/trqp",
+            },
+        }
+    ]
+}
+
+
+def default_worker_counts():
+    counts, workers = [], 1
+    while workers < (os.cpu_count() or 1):
+        counts.append(workers)
+        workers *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def measure(run):
+    started = time.perf_counter()
+    count = sum(1 for _ in run())
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000, help="DIDs per measurement.")
+    parser.add_argument("--chunk-size", type=int, default=256, help="DIDs handed to a worker per task.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=default_worker_counts(),
+        help="Worker counts to measure (default: powers of two up to the CPU count).",
+    )
+    args = parser.parse_args()
+
+    dids = [record["did"] for record in generate_did_peer2_bulk(args.count, TRQP_CONFIG, workers=1)]
+
+    print(f"CPUs: {os.cpu_count()}  DIDs per run: {args.count}  chunk size: {args.chunk_size}")
+    print(f"{'workers':>7}  {'generate/s':>12}  {'speed-up':>8}  {'resolve/s':>12}  {'speed-up':>8}")
+    baseline = None
+    for workers in args.workers:
+        generated = measure(
+            lambda: generate_did_peer2_bulk(
+                args.count, TRQP_CONFIG, workers=workers, chunk_size=args.chunk_size, as_json=True
+            )
+        )
+        resolved = measure(
+            lambda: resolve_did_peer2_bulk(dids, workers=workers, chunk_size=args.chunk_size, as_json=True)
+        )
+        baseline = baseline or (generated, resolved)
+        print(
+            f"{workers:>7}  {generated:>12.0f}  {generated / baseline[0]:>7.2f}x"
+            f"  {resolved:>12.0f}  {resolved / baseline[1]:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
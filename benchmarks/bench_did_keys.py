@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Benchmark batch key decoding and signature verification for DID:peer:2 keys.
+
+Compares the helpers in tools/did_peer_keys.py with doing the same work one
+key at a time, as a verifier would with resolve_did_peer2 and base58:
+
+- decode: base58.b58decode per key, against decode_multibase_keys;
+- load: b58decode and Ed25519PublicKey.from_public_bytes per presentation,
+  against the per-DID cache of did_peer2_signing_keys;
+- verify: resolving, decoding, loading and verifying per presentation,
+  against verify_did_signatures with a cold and a warm key cache.
+
+Signatures are spread over fewer DIDs than presentations, as when the same
+holders present repeatedly.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools"))
+
+from base58 import b58decode  # noqa: E402
+from cryptography.exceptions import InvalidSignature  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey  # noqa: E402
+
+from did_peer_keys import (  # noqa: E402
+    decode_multibase_keys,
+    did_peer2_signing_keys,
+    verify_did_signatures,
+)
+from did_peer_utils import did_peer2_material, generate_did_peer2_bulk, resolve_did_peer2  # noqa: E402
+
+
+def signed_presentations(did_count, signature_count, seed):
+    """Returns (dids, signatures as one buffer, messages), signed by `did_count` DIDs."""
+    rng = random.Random(seed)
+    holders = []
+    for record in generate_did_peer2_bulk(did_count, {}, workers=1):
+        private_key = Ed25519PrivateKey.from_private_bytes(bytes.fromhex(record["ed25519_private_key_hex"]))
+        holders.append((record["did"], private_key))
+    dids, signatures, messages = [], bytearray(), []
+    for index in range(signature_count):
+        did, private_key = rng.choice(holders)
+        message = f'{{"presentation": {index}, "nonce": "{rng.getrandbits(64):016x}"}}'.encode()
+        dids.append(did)
+        signatures += private_key.sign(message)
+        messages.append(message)
+    return dids, signatures, messages
+
+
+def one_at_a_time(dids, signatures, messages):
+    """The per-presentation path: resolve, decode, load and verify each one."""
+    results = bytearray(len(messages))
+    for index, (did, message) in enumerate(zip(dids, messages)):
+        method = resolve_did_peer2(did)["verificationMethod"][0]
+        key = Ed25519PublicKey.from_public_bytes(b58decode(method["publicKeyMultibase"][1:]))
+        try:
+            key.verify(bytes(signatures[index * 64 : (index + 1) * 64]), message)
+        except InvalidSignature:
+            continue
+        results[index] = 1
+    return results
+
+
+def rate(count, run, repeat):
+    """Best items/sec of `repeat` runs of `run`, which handles `count` items."""
+    best = min(timed(run) for _ in range(repeat))
+    return count / best
+
+
+def timed(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dids", type=int, default=1000, help="Distinct signing DIDs.")
+    parser.add_argument("--signatures", type=int, default=5000, help="Signed presentations to verify.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the best is reported.")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for verify_did_signatures.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for choosing signers.")
+    args = parser.parse_args()
+
+    dids, signatures, messages = signed_presentations(args.dids, args.signatures, args.seed)
+    unique = list(dict.fromkeys(dids))
+
+    def key_value(did):
+        return did_peer2_material(did).keys[0][2]
+
+    key_values = [key_value(did) for did in unique]
+
+    def cold_verify():
+        did_peer2_signing_keys.cache_clear()
+        return verify_did_signatures(dids, signatures, messages, workers=args.workers)
+
+    assert one_at_a_time(dids, signatures, messages) == cold_verify() == bytearray(b"\x01" * len(dids))
+
+    print(f"DIDs: {len(unique)}  presentations: {len(dids)}  workers: {args.workers}")
+    print(f"{'step':<8} {'one at a time/s':>16} {'batch/s':>12} {'speed-up':>9}")
+    rows = [
+        (
+            "decode",
+            len(key_values),
+            lambda: [b58decode(value[1:]) for value in key_values],
+            lambda: decode_multibase_keys(key_values),
+        ),
+        (
+            "load",
+            len(dids),
+            lambda: [Ed25519PublicKey.from_public_bytes(b58decode(key_value(did)[1:])) for did in dids],
+            lambda: [did_peer2_signing_keys(did)[0][1] for did in dids],
+        ),
+        (
+            "verify",
+            len(dids),
+            lambda: one_at_a_time(dids, signatures, messages),
+            lambda: verify_did_signatures(dids, signatures, messages, workers=args.workers),
+        ),
+    ]
+    for name, count, single, batch in rows:
+        before, after = rate(count, single, args.repeat), rate(count, batch, args.repeat)
+        print(f"{name:<8} {before:>16.0f} {after:>12.0f} {after / before:>8.2f}x")
+    cold = rate(len(dids), cold_verify, args.repeat)
+    print(f"{'verify (cold key cache)':<25} {cold:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
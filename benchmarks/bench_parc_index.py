@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark the PARC authorization index in tests/trqp_parc_index.py.
+
+Builds an index of synthetic authorizations with validity intervals, and
+reports build time, index size and peak memory. It then measures point
+queries now and at a past time, the one-time cost of merging an authority's
+listings, and `listEntities`-style pages and totals at a past time.
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from trqp_parc_index import ParcIndex, POS_INF  # noqa: E402
+
+AUTHORITIES = ["did:example:ecosystem-a", "did:example:ecosystem-b"]
+PAIRS = [("issue", "credential"), ("verify", "credential")]
+EPOCH_2015 = 1420070400.0
+YEAR = 365.25 * 86400
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def index_megabytes(index):
+    """Bytes held by the index's blob and arrays, including merged listings built so far, in MB."""
+    arrays = [index.entities.offsets, index.authority_of]
+    for listing in index.scope_listings + list(index.merged_listings.values()):
+        arrays += [listing.entities, listing.valid_from, listing.valid_until, listing.block_from, listing.block_until]
+        if listing.distinct_entities is not listing.entities:
+            arrays.append(listing.distinct_entities)
+    return (len(index.entities.blob) + sum(len(column) * column.itemsize for column in arrays)) / 1024**2
+
+
+def synthetic_records(count, seed):
+    """Yields `count` authorizations for count / 2 entities, with random validity in 2015-2030."""
+    generator = random.Random(seed)
+    entities = max(1, count // 2)
+    for _ in range(count):
+        entity = generator.randrange(entities)
+        valid_from = EPOCH_2015 + generator.random() * 10 * YEAR
+        valid_until = POS_INF if generator.random() < 0.7 else valid_from + generator.random() * 5 * YEAR
+        authority_id = AUTHORITIES[entity % len(AUTHORITIES)]
+        action, resource_name = PAIRS[generator.randrange(len(PAIRS))]
+        yield f"did:web:entity{entity}.example.com", authority_id, action, resource_name, valid_from, valid_until
+
+
+def rate(func, queries, seconds=2.0):
+    """Calls func(*query) over `queries` repeatedly for about `seconds`. Returns calls/sec."""
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for query in queries:
+            func(*query)
+        calls += len(queries)
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=10_000_000, help="Synthetic authorization records.")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the synthetic records.")
+    args = parser.parse_args()
+
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    index = ParcIndex()
+    for record in synthetic_records(args.records, args.seed):
+        index.add(*record)
+    added = time.perf_counter()
+    index.build()
+    built = time.perf_counter()
+    print(f"Records: {args.records:,}  entities: {len(index):,}  CPUs: {os.cpu_count()}")
+    print(
+        f"Add: {added - started:.1f}s  build: {built - added:.1f}s  "
+        f"index size: {index_megabytes(index):,.0f} MB  peak RSS while building: {peak_rss_mb() - baseline:,.0f} MB"
+    )
+
+    generator = random.Random(args.seed + 1)
+    now = time.time()
+    past = EPOCH_2015 + 5 * YEAR
+    entities = max(1, args.records // 2)
+    point = []
+    for _ in range(1000):
+        entity = generator.randrange(entities)
+        action, resource_name = PAIRS[generator.randrange(len(PAIRS))]
+        point.append((f"did:web:entity{entity}.example.com", AUTHORITIES[entity % 2], action, resource_name))
+
+    started = time.perf_counter()
+    index.listing(AUTHORITIES[0])
+    print(
+        f"Merging one authority's listings on first use: {time.perf_counter() - started:.1f}s  "
+        f"index size after: {index_megabytes(index):,.0f} MB"
+    )
+
+    print(f"{'query':<52} {'per sec':>10} {'ms each':>9}")
+    for name, func, queries in (
+        ("point query, now", index.holds, [query + (now,) for query in point]),
+        ("point query, at a past time", index.holds, [query + (past,) for query in point]),
+        (
+            "page of 100, authority + action/resource, past time",
+            index.list_entities,
+            [(AUTHORITIES[0], *PAIRS[0], past, 100, 0)],
+        ),
+        (
+            "page of 100 at a deep offset, past time",
+            index.list_entities,
+            [(AUTHORITIES[0], *PAIRS[0], past, 100, entities // 8)],
+        ),
+        ("page of 100, authority alone, past time", index.list_entities, [(AUTHORITIES[0], None, None, past, 100, 0)]),
+        ("page of 100, all entities, no time", index.list_entities, [(None, None, None, None, 100, entities // 2)]),
+    ):
+        per_second = rate(func, queries)
+        print(f"{name:<52} {per_second:>10,.0f} {1000 / per_second:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Throughput baseline for the reference Trust Registry server in tests/trqp_reference_server.py.
+
+Starts the server in a subprocess with a synthetic population, then drives it
+from raw asyncio keep-alive connections. The client sends pre-encoded
+requests and only reads `Content-Length`, so as little CPU as possible is taken
+away from the server when both run on one host. Reports requests/sec and
+latency percentiles per operation, and the time the server took to load its
+records.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+TESTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests")
+sys.path.insert(0, TESTS_DIR)
+
+from trqp_transport import percentile  # noqa: E402
+
+
+def post_request(path, body):
+    payload = json.dumps(body).encode()
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n"
+    ).encode() + payload
+
+
+def get_request(target):
+    return f"GET {target} HTTP/1.1\r\nHost: bench\r\nAccept: application/json\r\n\r\n".encode()
+
+
+def operations(entities):
+    middle = entities // 2
+    return {
+        "POST /authorization": post_request(
+            "/authorization",
+            {
+                "entity_id": f"did:example:entity{middle}",
+                "authority_id": "did:example:ecosystem",
+                "action": "issue",
+                "resource": "credential",
+            },
+        ),
+        "POST /recognition": post_request(
+            "/recognition",
+            {
+                "entity_id": "did:example:trust-registry",
+                "authority_id": "did:example:ecosystem",
+                "action": "recognize",
+                "resource": "trust-registry",
+            },
+        ),
+        "GET /entities/{entity_id}/authorizations": get_request(f"/entities/did:example:entity{middle}/authorizations"),
+        "GET /entities (100 items)": get_request(f"/entities?limit=100&offset={middle}"),
+        "GET /metadata": get_request("/metadata"),
+    }
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def drive(host, port, request, connections, duration):
+    latencies = []
+    failures = 0
+    deadline = time.perf_counter() + duration
+
+    async def connection():
+        nonlocal failures
+        reader, writer = await asyncio.open_connection(host, port)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            writer.write(request)
+            if await read_response(reader) != 200:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+        writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, failures, time.perf_counter() - started
+
+
+def wait_for_server(process):
+    line = process.stderr.readline()
+    while line and "listening" not in line:
+        print(f"  {line.strip()}")
+        line = process.stderr.readline()
+    if not line:
+        raise SystemExit("Reference server exited before listening")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entities", type=int, default=100000, help="Synthetic entities loaded by the server.")
+    parser.add_argument("--connections", type=int, default=32, help="Concurrent keep-alive connections.")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per operation.")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes.")
+    parser.add_argument("--port", type=int, default=8940, help="Local port for the server.")
+    args = parser.parse_args()
+
+    print(f"Server: {args.entities} synthetic entities, {args.workers} worker(s), {os.cpu_count()} CPU(s)")
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(TESTS_DIR, "trqp_reference_server.py"),
+            "--port",
+            str(args.port),
+            "--synthetic",
+            str(args.entities),
+            "--workers",
+            str(args.workers),
+        ],
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        wait_for_server(process)
+        print(f"{'operation':<42} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'failed':>7}")
+        for name, request in operations(args.entities).items():
+            latencies, failures, elapsed = asyncio.run(
+                drive("127.0.0.1", args.port, request, args.connections, args.duration)
+            )
+            latencies.sort()
+            print(
+                f"{name:<42} {len(latencies) / elapsed:>9.0f} {percentile(latencies, 50) * 1000:>8.2f} "
+                f"{percentile(latencies, 99) * 1000:>8.2f} {failures:>7}"
+            )
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
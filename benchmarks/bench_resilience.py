@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""Tail latency of the TRQP client against a registry that injects faults.
+
+Starts the reference server with `--fault-*` options. By default it delays 3%
+of requests by 250 ms, and fails 2% with `503` and `Retry-After: 0`. Then it
+sends the same `POST /authorization` queries through three transports:
+
+- `plain`: a TrqpTransport, with no retries;
+- `retries`: a ResilientTransport with backoff retries;
+- `retries + hedging`: the same, plus a hedged duplicate after the endpoint's
+  p95 latency.
+
+For each, it reports latency percentiles over all queries, including the
+time spent retrying, and the number of queries that did not end in a `200`.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, os.pardir, "tests"))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, os.pardir, "tools"))
+
+from bench_suite import ReferenceServer  # noqa: E402
+from trqp_resilience import ResilientTransport  # noqa: E402
+from trqp_transport import TrqpTransport, percentile  # noqa: E402
+
+
+QUERY = {
+    "entity_id": "did:example:entity123",
+    "authority_id": "did:example:ecosystem",
+    "action": "issue",
+    "resource": "credential",
+}
+
+
+def drive(transport, url, requests_per_worker, concurrency):
+    """Sends the query from `concurrency` threads. Returns (sorted latencies, failures)."""
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+
+    def worker():
+        mine = []
+        failed = 0
+        for _ in range(requests_per_worker):
+            started = time.perf_counter()
+            try:
+                ok = transport.request("post", url, json=QUERY).status_code == 200
+            except transport.errors:
+                ok = False
+            mine.append(time.perf_counter() - started)
+            failed += not ok
+        with lock:
+            latencies.extend(mine)
+            failures[0] += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), failures[0]
+
+
+def transports(args):
+    def resilient(hedge_percentile):
+        return ResilientTransport(
+            TrqpTransport(pool_size=args.concurrency * 2),
+            max_attempts=args.max_attempts,
+            base_delay=args.base_delay,
+            hedge_percentile=hedge_percentile,
+        )
+
+    return {
+        "plain": lambda: TrqpTransport(pool_size=args.concurrency),
+        "retries": lambda: resilient(None),
+        f"retries + hedging (p{args.hedge_percentile:g})": lambda: resilient(args.hedge_percentile),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tail latency with and without retries and hedging.")
+    parser.add_argument("--port", type=int, default=8937, help="Port for the reference server.")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured queries per transport.")
+    parser.add_argument("--warmup", type=int, default=200, help="Unmeasured queries first, to fill latency windows.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Client threads.")
+    parser.add_argument("--delay-rate", type=float, default=0.03, help="Fraction of requests the server delays.")
+    parser.add_argument("--delay", type=float, default=0.25, help="Seconds the server delays them.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of requests the server fails.")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per query when retrying.")
+    parser.add_argument("--base-delay", type=float, default=0.01, help="Base retry backoff in seconds.")
+    parser.add_argument("--hedge-percentile", type=float, default=95, help="Latency percentile that triggers a hedge.")
+    args = parser.parse_args()
+
+    fault_args = [
+        "--fault-delay-rate", str(args.delay_rate),
+        "--fault-delay", str(args.delay),
+        "--fault-error-rate", str(args.error_rate),
+        "--fault-retry-after", "0",
+    ]  # fmt: skip
+    print(
+        f"Faults: {args.delay_rate:.0%} delayed {args.delay * 1000:.0f} ms, {args.error_rate:.0%} answered 503; "
+        f"{args.requests} queries from {args.concurrency} threads"
+    )
+    print(f"{'transport':<26} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'failed':>7}  resilience")
+    with ReferenceServer(args.port, extra_args=fault_args) as base_url:
+        url = f"{base_url}/authorization"
+        per_worker = max(1, args.requests // args.concurrency)
+        for name, make in transports(args).items():
+            transport = make()
+            try:
+                drive(transport, url, max(1, args.warmup // args.concurrency), args.concurrency)
+                latencies, failures = drive(transport, url, per_worker, args.concurrency)
+                counts = transport.stats() if isinstance(transport, ResilientTransport) else {}
+            finally:
+                transport.close()
+            print(
+                f"{name:<26} "
+                + " ".join(f"{percentile(latencies, pct) * 1000:8.1f}" for pct in (50, 90, 99, 100))
+                + f" {failures:7d}  "
+                + " ".join(f"{key}={value}" for key, value in sorted(counts.items()) if key != "open circuits")
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
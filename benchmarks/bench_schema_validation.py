@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Micro-benchmark compiled schema validation of Ayra TRQP profile responses.
+
+Reports the one-time cost of loading and compiling the profile schemas, then
+validations/sec and microseconds per validation for representative response
+bodies. If `jsonschema` is installed, the same bodies are also validated with
+it for comparison.
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from trqp_schema import SchemaRegistry  # noqa: E402
+
+
+AUTHORIZATION_RESPONSE = {
+    "entity_id": "did:example:entity123",
+    "authority_id": "did:example:ecosystem",
+    "action": "issue",
+    "resource": "credential",
+    "authorized": True,
+    "time_requested": "2025-01-01T00:00:00Z",
+    "time_evaluated": "2025-01-01T00:00:01Z",
+    "message": "Entity is authorized.",
+    "context": {"time": "2025-01-01T00:00:00Z"},
+}
+
+RECOGNITION_RESPONSE = {
+    "entity_id": "did:example:trust-registry",
+    "authority_id": "did:example:ecosystem",
+    "action": "recognize",
+    "resource": "trust-registry",
+    "recognized": True,
+    "time_evaluated": "2025-01-01T00:00:01Z",
+}
+
+METADATA_RESPONSE = {
+    "id": "did:example:trust-registry",
+    "name": "Example Trust Registry",
+    "description": "Example registry.",
+    "controllers": ["did:example:controller"],
+    "supported_did_methods": ["did:webvh", "did:web"],
+}
+
+ENTITY_LIST_RESPONSE = {
+    "items": [
+        {"entity_id": f"did:example:entity{index}", "name": f"Entity {index}", "authority_id": "did:example:ecosystem"}
+        for index in range(100)
+    ],
+    "pagination": {"limit": 100, "offset": 0, "total": 100},
+}
+
+CASES = [
+    ("queryAuthorization", AUTHORIZATION_RESPONSE),
+    ("queryRecognition", RECOGNITION_RESPONSE),
+    ("getTrustRegistryMetadata", METADATA_RESPONSE),
+    ("listEntities (100 items)", ENTITY_LIST_RESPONSE),
+]
+
+
+def per_second(func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    return number / seconds
+
+
+def jsonschema_validator(registry, operation_id):
+    """A jsonschema validator for the same response schema, or None if jsonschema is missing."""
+    try:
+        import jsonschema
+    except ImportError:
+        return None
+    schema = registry.operations[operation_id]["responses"][200]["content"]["application/json"]["schema"]
+    document = {**schema, "components": registry._swagger["components"]}
+    return jsonschema.Draft7Validator(document, format_checker=jsonschema.FormatChecker())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Validations per timing run.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    registry = SchemaRegistry()
+    for operation_id, _ in CASES:
+        registry.response_validator(operation_id.split()[0])
+    print(f"Load + compile: {(time.perf_counter() - started) * 1000:.1f} ms (once per process)")
+
+    print(f"{'response':<28} {'validations/s':>14} {'us/validation':>14} {'jsonschema/s':>14}")
+    for name, body in CASES:
+        operation_id = name.split()[0]
+        validate = registry.response_validator(operation_id)
+        if validate(body):
+            raise SystemExit(f"Benchmark body for {name} is invalid: {validate(body)}")
+        rate = per_second(lambda: validate(body), args.number)
+
+        reference = jsonschema_validator(registry, operation_id)
+        reference_rate = (
+            f"{per_second(lambda: reference.is_valid(body), max(1, args.number // 10)):>14.0f}"
+            if reference
+            else f"{'n/a':>14}"
+        )
+        print(f"{name:<28} {rate:>14.0f} {1e6 / rate:>14.2f} {reference_rate}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""Compare per-process response caches with one SharedResponseCache per node.
+
+Forks `--workers` processes, as a pre-forking server would. Each one looks up
+the same `--entries` authorization answers and stores the ones it misses,
+first in its own TrqpResponseCache and then in a SharedResponseCache file that
+all of them open. For each kind of cache, it reports:
+
+- the answers that had to be fetched to warm the node, summed over workers;
+- the memory the warmed caches add, as the sum of the workers' proportional
+  set size (PSS). PSS splits a shared page between the processes that map it,
+  so the sum counts the shared file once;
+- the latency of a cache hit, measured in this process.
+"""
+
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from trqp_cache import MISSING, TrqpResponseCache, cache_key  # noqa: E402
+from trqp_client import TrqpAuthorizationQuery  # noqa: E402
+from trqp_shared_cache import SharedResponseCache  # noqa: E402
+
+
+BASE_URL = "https://example-trust-registry.com"
+
+
+def query_key(index):
+    query = TrqpAuthorizationQuery(f"did:web:entity{index}.example.com", "did:example:ecosystem", "issue", "credential")
+    return cache_key(query, BASE_URL)
+
+
+def fetch(index):
+    """A fresh (status, data) answer, as a client would build from a registry response."""
+    return (
+        200,
+        {
+            "entity_id": f"did:web:entity{index}.example.com",
+            "authority_id": "did:example:ecosystem",
+            "action": "issue",
+            "resource": "credential",
+            "authorized": index % 10 != 0,
+            "time_evaluated": "2026-10-18T12:00:00Z",
+        },
+    )
+
+
+def pss_kb():
+    """This process's proportional set size in kB, or its resident set size where PSS is not reported."""
+    try:
+        with open("/proc/self/smaps_rollup", encoding="ascii") as rollup:
+            for line in rollup:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def make_cache(kind, args):
+    if kind == "per-process":
+        return TrqpResponseCache(max_entries=args.entries)
+    return SharedResponseCache(args.path, slots=args.slots, slot_size=args.slot_size)
+
+
+def warm(kind, args, barrier, results):
+    """Worker: fills the cache as a verifier would. Puts (fetches, PSS growth in kB) on `results`."""
+    keys = [query_key(index) for index in range(args.entries)]
+    cache = make_cache(kind, args)
+    before = pss_kb()
+    barrier.wait()
+    fetches = 0
+    for index, key in enumerate(keys):
+        if cache.get(key) is MISSING:
+            fetches += 1
+            cache.put(key, fetch(index), 300)
+    # A second pass, so every worker has touched every entry it will serve.
+    for key in keys:
+        cache.get(key)
+    # Measure once every worker maps every page it will use, and before any exits.
+    barrier.wait()
+    grown = pss_kb() - before
+    barrier.wait()
+    results.put((fetches, grown))
+
+
+def hit_latency(cache, keys, rounds):
+    """Median microseconds per cache hit over `rounds` passes of `keys`."""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for key in keys:
+            cache.get(key)
+        timings.append((time.perf_counter() - started) / len(keys))
+    return statistics.median(timings) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="Worker processes sharing a node.")
+    parser.add_argument("--entries", type=int, default=20000, help="Distinct cached answers.")
+    parser.add_argument("--slots", type=int, default=65536, help="Slots in the shared cache file.")
+    parser.add_argument("--slot-size", type=int, default=512, help="Bytes per shared cache slot.")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the keys when timing hits.")
+    parser.add_argument("--path", default="/dev/shm/bench-trqp-shared-cache", help="Shared cache file.")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("fork")
+    print(f"Workers: {args.workers}  entries: {args.entries}  shared file: {args.path}")
+    print(f"{'cache':<12} {'fetches':>9} {'memory MB':>10} {'hit us':>8}")
+    for kind in ("per-process", "shared"):
+        if os.path.exists(args.path):
+            os.remove(args.path)
+        barrier, queue = context.Barrier(args.workers), context.Queue()
+        workers = [
+            context.Process(target=warm, args=(kind, args, barrier, queue)) for _ in range(args.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        fetches = sum(fetched for fetched, _ in results)
+        memory = sum(grown for _, grown in results) / 1024
+
+        keys = [query_key(index) for index in range(args.entries)]
+        cache = make_cache(kind, args)
+        if kind == "per-process":
+            for index, key in enumerate(keys):
+                cache.put(key, fetch(index), 300)
+        latency = hit_latency(cache, keys, args.rounds)
+        if kind == "shared":
+            cache.close()
+            os.remove(args.path)
+        print(f"{kind:<12} {fetches:>9} {memory:>10.1f} {latency:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
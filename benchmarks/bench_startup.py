@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Start-up cost of the smoke test and DID tools, against import-time budgets.
+
+For each entry point, runs `python -X importtime -c "import <module>"`
+repeatedly and reports the median cumulative import time of the module, with
+the modules that contributed most to it. It then times a whole
+`api_conformance_test.py --only metadata` probe against a local reference
+server, next to `python -c pass` for the interpreter's own start-up.
+
+Exits with status 1 if a module's median import time exceeds its budget, so
+the check can run in CI after changes that add imports.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTS_DIR = os.path.join(BENCHMARKS_DIR, os.pardir, "tests")
+TOOLS_DIR = os.path.join(BENCHMARKS_DIR, os.pardir, "tools")
+sys.path.insert(0, TESTS_DIR)
+
+from bench_suite import ReferenceServer  # noqa: E402
+
+
+# Module -> import-time budget in milliseconds, measured with -X importtime.
+# About 25% over the single-CPU baseline in README.md, to absorb noise.
+BUDGETS = {
+    "api_conformance_test": 50.0,
+    "trqp_transport": 35.0,
+    "did_peer_utils": 20.0,
+}
+
+
+def import_profile(module):
+    """Imports `module` in a fresh interpreter.
+
+    Returns its cumulative import time and {direct import: cumulative time},
+    in microseconds. Modules the interpreter imported at start-up are not
+    counted, as the module did not pay for them.
+    """
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join((TESTS_DIR, TOOLS_DIR))}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    # Each import is reported after its own imports, nested two spaces deeper.
+    entries = []
+    for line in result.stderr.splitlines():
+        _, total, name = line.split("|")
+        if total.strip().isdigit():
+            entries.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(total)))
+    position = next(index for index, (depth, name, _) in enumerate(entries) if depth == 0 and name == module)
+    children = {}
+    for depth, name, total in reversed(entries[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children[name] = total
+    return entries[position][2], children
+
+
+def wall_time(argv, runs):
+    """Median wall-clock seconds of running `argv`."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=TESTS_DIR, check=False)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and probe start-up time against budgets.")
+    parser.add_argument("--runs", type=int, default=15, help="Fresh interpreters per measurement.")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest imports to list per module.")
+    parser.add_argument("--port", type=int, default=8938, help="Port for the reference server.")
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="MODULE=MS",
+        help="Override a module's import budget, in milliseconds. May be repeated.",
+    )
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS)
+    for value in args.budget:
+        module, _, milliseconds = value.partition("=")
+        budgets[module] = float(milliseconds)
+
+    over_budget = []
+    for module, budget in budgets.items():
+        import_profile(module)  # Compile the bytecode caches first.
+        runs = [import_profile(module) for _ in range(args.runs)]
+        median = statistics.median(total for total, _ in runs) / 1000
+        verdict = "ok" if median <= budget else "OVER BUDGET"
+        print(f"import {module}: {median:.1f} ms (budget {budget:g} ms) {verdict}")
+        _, last = runs[-1]
+        heaviest = sorted(((total, name) for name, total in last.items()), reverse=True)[: args.top]
+        for total, name in heaviest:
+            print(f"    {total / 1000:6.1f} ms  {name}")
+        if median > budget:
+            over_budget.append(module)
+
+    interpreter = wall_time([sys.executable, "-c", "pass"], args.runs)
+    print(f"python -c pass: {interpreter * 1000:.1f} ms")
+    with ReferenceServer(args.port) as base_url:
+        probe = wall_time(
+            [sys.executable, "api_conformance_test.py", "--base-url", base_url, "--only", "metadata"], args.runs
+        )
+    print(
+        f"api_conformance_test.py --only metadata: {probe * 1000:.1f} ms "
+        f"({(probe - interpreter) * 1000:.1f} ms over the interpreter)"
+    )
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""Regression benchmark suite for the TRQP client path.
+
+`run` times each case and writes the results to a JSON file. The cases are:
+JSON encoding and decoding of the profile request and response bodies,
+`resolve_did_peer2` on DIDs with 0 to 20 service segments,
+`generate_did_peer2`, the instrumentation hooks, and `POST /authorization`
+round trips through `TrqpClient` to a local reference server, with and
+without metrics. No network is used beyond loopback.
+
+`compare` reads two result files. It exits with status 1 if any case in the
+second file is slower than in the first by more than `--threshold` percent,
+comparing the median of each case's timed runs, or the fastest with
+`--statistic min`.
+
+    python bench_suite.py run --output baseline.json
+    python bench_suite.py run --output current.json
+    python bench_suite.py compare baseline.json current.json --threshold 10
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+TESTS_DIR = os.path.join(BENCHMARKS_DIR, os.pardir, "tests")
+sys.path.insert(0, TESTS_DIR)
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, os.pardir, "tools"))
+
+from bench_did_bulk import TRQP_CONFIG  # noqa: E402
+from bench_reference_server import wait_for_server  # noqa: E402
+from bench_schema_validation import (  # noqa: E402
+    AUTHORIZATION_RESPONSE,
+    ENTITY_LIST_RESPONSE,
+    METADATA_RESPONSE,
+    RECOGNITION_RESPONSE,
+)
+from did_peer_utils import generate_did_peer2, resolve_did_peer2  # noqa: E402
+from trqp_client import TrqpAuthorizationQuery, TrqpClient, build_parc_payload  # noqa: E402
+from trqp_instrument import NO_INSTRUMENTATION, MetricsExporter, RequestTiming  # noqa: E402
+from trqp_transport import TrqpTransport  # noqa: E402
+
+FORMAT_VERSION = 1
+SERVICE_COUNTS = (0, 1, 5, 20)
+
+
+def did_with_services(count):
+    services = [{**TRQP_CONFIG["services"][0], "id": f"#tr-{index + 1}"} for index in range(count)]
+    return generate_did_peer2({"services": services})[0]
+
+
+def json_cases():
+    request = build_parc_payload(
+        "did:example:entity123", "did:example:ecosystem", "issue", "credential", {"time": "2025-01-01T00:00:00Z"}
+    )
+    cases = {"json.encode authorization request": lambda: json.dumps(request)}
+    for name, body in (
+        ("authorization response", AUTHORIZATION_RESPONSE),
+        ("recognition response", RECOGNITION_RESPONSE),
+        ("metadata response", METADATA_RESPONSE),
+        ("entities page (100 items)", ENTITY_LIST_RESPONSE),
+    ):
+        encoded = json.dumps(body)
+        cases[f"json.decode {name}"] = lambda encoded=encoded: json.loads(encoded)
+    return cases
+
+
+def did_cases():
+    cases = {"did_peer2.generate (services=1)": lambda: generate_did_peer2(TRQP_CONFIG)}
+    for count in SERVICE_COUNTS:
+        did = did_with_services(count)
+        cases[f"did_peer2.resolve (services={count})"] = lambda did=did: resolve_did_peer2(did)
+    return cases
+
+
+def instrumentation_cases():
+    timing = RequestTiming(
+        "POST /authorization", "post", "http://127.0.0.1/authorization", 200, None, time.time_ns(), 0.0012,
+        False, None, None, None, 0.0011, 0.0001,
+    )
+    exporter = MetricsExporter()
+    return {
+        "instrumentation.request_finished (no-op)": lambda: NO_INSTRUMENTATION.request_finished(timing),
+        "instrumentation.request_finished (metrics)": lambda: exporter.request_finished(timing),
+    }
+
+
+class ReferenceServer:
+    """The reference server in a subprocess, for the duration of a `with` block."""
+
+    def __init__(self, port, entities=1000, extra_args=()):
+        self.port = port
+        self.entities = entities
+        self.extra_args = list(extra_args)
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.join(TESTS_DIR, "trqp_reference_server.py"),
+                "--port",
+                str(self.port),
+                "--synthetic",
+                str(self.entities),
+            ]
+            + self.extra_args,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        wait_for_server(self.process)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+
+def round_trip_cases(base_url):
+    query = TrqpAuthorizationQuery("did:example:entity123", "did:example:ecosystem", "issue", "credential")
+
+    def round_trip(client):
+        result = client.query(query)
+        if result.status != 200:
+            raise RuntimeError(f"POST /authorization returned {result.status}: {result.error}")
+
+    plain = TrqpClient(base_url, transport=TrqpTransport(pool_size=1))
+    instrumented = TrqpClient(base_url, transport=TrqpTransport(pool_size=1, instrumentation=MetricsExporter()))
+    return {
+        "round_trip POST /authorization": lambda: round_trip(plain),
+        "round_trip POST /authorization (metrics)": lambda: round_trip(instrumented),
+    }
+
+
+def measure(func, repeat, min_time):
+    """Seconds per call for each of `repeat` runs. Each run is at least `min_time` seconds long."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+    runs = [elapsed / number]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - started) / number)
+    return number, runs
+
+
+def run(args):
+    def selected(name):
+        return not args.cases or any(pattern in name for pattern in args.cases)
+
+    results = {}
+    print(f"{'case':<44} {'median us':>11} {'min us':>10} {'calls/run':>10}")
+
+    def record(cases):
+        for name, func in cases.items():
+            if not selected(name):
+                continue
+            number, runs = measure(func, args.repeat, args.min_time)
+            results[name] = {
+                "median_seconds": statistics.median(runs),
+                "min_seconds": min(runs),
+                "runs_seconds": runs,
+                "calls_per_run": number,
+            }
+            print(f"{name:<44} {statistics.median(runs) * 1e6:>11.2f} {min(runs) * 1e6:>10.2f} {number:>10}")
+
+    record(json_cases())
+    record(did_cases())
+    record(instrumentation_cases())
+    if selected("round_trip"):
+        with ReferenceServer(args.port) as base_url:
+            record(round_trip_cases(base_url))
+
+    report = {
+        "format_version": FORMAT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {"repeat": args.repeat, "min_time": args.min_time},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    print(f"Results written to {args.output}")
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as source:
+        report = json.load(source)
+    if report.get("format_version") != FORMAT_VERSION:
+        raise SystemExit(f"{path}: unsupported results format {report.get('format_version')!r}")
+    return report
+
+
+def compare(args):
+    baseline, current = load_report(args.baseline), load_report(args.current)
+    if baseline["host"] != current["host"]:
+        print("Warning: the results come from different hosts or Python versions.")
+        for key in sorted(set(baseline["host"]) | set(current["host"])):
+            if baseline["host"].get(key) != current["host"].get(key):
+                print(f"  {key}: {baseline['host'].get(key)} -> {current['host'].get(key)}")
+
+    regressions = []
+    print(f"{'case':<44} {'baseline us':>12} {'current us':>11} {'change':>8}")
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<44} {'-':>12} {result[f'{args.statistic}_seconds'] * 1e6:>11.2f} {'new':>8}")
+            continue
+        before = baseline["results"][name][f"{args.statistic}_seconds"]
+        after = result[f"{args.statistic}_seconds"]
+        change = (after / before - 1) * 100
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<44} {before * 1e6:>12.2f} {after * 1e6:>11.2f} {change:>+7.1f}%{flag}")
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:<44} {'(not run)':>12}")
+
+    if regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {args.threshold}%.")
+        return 1
+    print(f"No case is slower than the baseline by more than {args.threshold}%.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Time the cases and write the results as JSON.")
+    run_parser.add_argument("--output", default="bench_results.json", help="Results file to write.")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case.")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per timed run.")
+    run_parser.add_argument(
+        "--cases", nargs="+", help="Only run cases whose name contains one of these strings, e.g. json or did_peer2."
+    )
+    run_parser.add_argument("--port", type=int, default=8941, help="Local port for the reference server.")
+
+    compare_parser = subparsers.add_parser("compare", help="Fail if a case regressed against a baseline.")
+    compare_parser.add_argument("baseline", help="Results file from the baseline run.")
+    compare_parser.add_argument("current", help="Results file from the run to check.")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=10.0, help="Allowed slow-down of a case, in percent."
+    )
+    compare_parser.add_argument(
+        "--statistic",
+        choices=["median", "min"],
+        default="median",
+        help="Per-case timing to compare. `min` is steadier on a busy host.",
+    )
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Tests for the benchmark suite's runner and its regression check."""
+
+import argparse
+import json
+import socket
+
+import pytest
+
+import bench_suite
+
+
+def report(results, host=None):
+    return {
+        "format_version": bench_suite.FORMAT_VERSION,
+        "host": host or {"python": "3.11.7", "cpu_count": 1},
+        "results": {
+            name: {"median_seconds": median, "min_seconds": minimum} for name, (median, minimum) in results.items()
+        },
+    }
+
+
+def compare(tmp_path, baseline, current, threshold=10.0, statistic="median"):
+    (tmp_path / "baseline.json").write_text(json.dumps(baseline))
+    (tmp_path / "current.json").write_text(json.dumps(current))
+    args = argparse.Namespace(
+        baseline=tmp_path / "baseline.json", current=tmp_path / "current.json", threshold=threshold, statistic=statistic
+    )
+    return bench_suite.compare(args)
+
+
+def test_measure_calibrates_the_calls_per_run():
+    calls = []
+    number, runs = bench_suite.measure(lambda: calls.append(None), repeat=3, min_time=0.01)
+    assert len(runs) == 3 and number > 1
+    assert len(calls) >= 3 * number
+    assert all(seconds > 0 for seconds in runs)
+
+
+def test_compare_flags_cases_slower_than_the_threshold(tmp_path, capsys):
+    baseline = report({"fast": (1e-6, 1e-6), "slow": (1e-6, 1e-6), "dropped": (1e-6, 1e-6)})
+    current = report({"fast": (1.05e-6, 1e-6), "slow": (1.2e-6, 1.01e-6), "added": (1e-6, 1e-6)})
+    assert compare(tmp_path, baseline, current) == 1
+    output = capsys.readouterr().out
+    assert "slow" in output.split("REGRESSION")[0].splitlines()[-1]
+    assert output.count("REGRESSION") == 1
+    assert "new" in output and "(not run)" in output
+    assert "1 case(s) slower than the baseline by more than 10.0%." in output
+
+    assert compare(tmp_path, baseline, current, threshold=25) == 0
+    assert compare(tmp_path, baseline, current, statistic="min") == 0
+
+
+def test_compare_warns_about_different_hosts(tmp_path, capsys):
+    baseline = report({"case": (1e-6, 1e-6)})
+    current = report({"case": (1e-6, 1e-6)}, host={"python": "3.12.1", "cpu_count": 1})
+    assert compare(tmp_path, baseline, current) == 0
+    assert "python: 3.11.7 -> 3.12.1" in capsys.readouterr().out
+
+
+def test_compare_rejects_other_formats(tmp_path):
+    with pytest.raises(SystemExit, match="unsupported results format 0"):
+        compare(tmp_path, {**report({}), "format_version": 0}, report({}))
+
+
+def test_run_writes_the_selected_cases(tmp_path, capsys):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    output = tmp_path / "results.json"
+    args = argparse.Namespace(
+        cases=["json.decode authorization", "resolve (services=1)", "round_trip"],
+        repeat=2,
+        min_time=0.005,
+        port=port,
+        output=output,
+    )
+    bench_suite.run(args)
+    results = bench_suite.load_report(output)["results"]
+    assert sorted(results) == [
+        "did_peer2.resolve (services=1)",
+        "json.decode authorization response",
+        "round_trip POST /authorization",
+        "round_trip POST /authorization (metrics)",
+    ]
+    for result in results.values():
+        assert len(result["runs_seconds"]) == 2 and result["min_seconds"] <= result["median_seconds"]
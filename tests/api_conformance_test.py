@@ -1,21 +1,50 @@
 #!/usr/bin/env python3
-"""Ayra TRQP profile smoke test.
-
-This script is intentionally small. It checks that a Trust Registry exposes the
-current Ayra profile surface for a quick implementer sanity check. It is not the
-Ayra Conformance Test Suite and should not be used to certify advanced protocol,
+"""Ayra TRQP profile smoke test, with load, capacity and batch replay modes.
+
+By default it checks that a Trust Registry exposes the current Ayra profile
+surface, one request per endpoint, for a quick implementer sanity check. The
+other modes measure a registry with the client tooling in the trqp_* modules
+next to this script. Keep the smoke checks themselves at that level; see
+"Contributing New Tests" in README.md. None of this is the Ayra Conformance
+Test Suite, and it should not be used to certify advanced protocol,
 credential, or interoperability behavior.
 """
 
 import argparse
+import functools
 import sys
+import time
+
+from trqp_instrument import NO_INSTRUMENTATION, MetricsExporter
+from trqp_schema import get_schema_registry
+from trqp_transport import TrqpTransport
 
-import requests
+# The other trqp_* modules are imported by the modes and options that use
+# them, so a `--only` probe starts without loading what it does not run.
 
 
+SMOKE_CHECK_NAMES = (
+    "metadata",
+    "authorization",
+    "recognition",
+    "assurance-levels",
+    "lookup-authorizations",
+    "did-methods",
+    "entities",
+)
 CORE_EXPECTED_STATUSES = {200, 400, 401, 404}
 OPTIONAL_EXPECTED_STATUSES = {200, 401, 404, 501}
 
+# Pooled transport shared by every mode; replaced by main() from CLI options.
+transport = None
+
+
+def get_transport():
+    global transport
+    if transport is None:
+        transport = TrqpTransport()
+    return transport
+
 
 def build_headers(bearer_token):
     headers = {"Accept": "application/json"}
@@ -24,25 +53,12 @@ def build_headers(bearer_token):
     return headers
 
 
-def validate_required_fields(data, required_fields, response_name):
-    if not isinstance(data, dict):
-        print(f"    Expected JSON object for {response_name}.")
-        return False
-    for field in required_fields:
-        if field not in data:
-            print(f"    Missing '{field}' in {response_name}.")
-            return False
-    return True
-
-
-def validate_list_items(data, required_fields, response_name):
-    if not isinstance(data, list):
-        print(f"    Expected a list for {response_name}.")
-        return False
-    for item in data:
-        if not validate_required_fields(item, required_fields, response_name):
-            return False
-    return True
+def validate_response(data, operation_id, response_name):
+    """Validates a 200 response body against the operation's schema in the Ayra profile."""
+    errors = get_schema_registry().response_validator(operation_id)(data)
+    for error in errors:
+        print(f"    Invalid {response_name}: {error}")
+    return not errors
 
 
 def request_json(method, url, headers, expected_statuses, **kwargs):
@@ -52,8 +68,13 @@ def request_json(method, url, headers, expected_statuses, **kwargs):
     if kwargs.get("json"):
         print(f"    json={kwargs['json']}")
 
-    response = requests.request(method, url, headers=headers, timeout=15, **kwargs)
-    print(f"    Status: {response.status_code}")
+    try:
+        response = get_transport().request(method, url, headers=headers, **kwargs)
+    except get_transport().errors as ex:
+        print(f"    Request failed: {type(ex).__name__}: {ex}")
+        return False, None
+    cache_outcome = getattr(response, "cache_outcome", None)
+    print(f"    Status: {response.status_code}" + (f" (cache {cache_outcome})" if cache_outcome else ""))
 
     if response.status_code not in expected_statuses:
         print("    Unexpected status code.")
@@ -67,206 +88,385 @@ def request_json(method, url, headers, expected_statuses, **kwargs):
     return True, None
 
 
-def smoke_get_metadata(base_url, headers):
+def smoke_check(label, method, url, headers, expected_statuses, operation_id, response_name, **kwargs):
+    """Sends one request, then checks its status and, for a 200, its body against the profile."""
+    print(f"\n=== Smoke: {label} ===")
+    ok, data = request_json(method, url, headers, expected_statuses, **kwargs)
+    if not ok or data is None:
+        return ok
+    return validate_response(data, operation_id, response_name)
+
+
+def smoke_get_metadata(base_url, headers, args):
     """GET /metadata should be reachable or explicitly unavailable."""
-    print("\n=== Smoke: GET /metadata ===")
-    ok, data = request_json(
+    return smoke_check(
+        "GET /metadata",
         "get",
         f"{base_url}/metadata",
         headers,
         OPTIONAL_EXPECTED_STATUSES,
+        "getTrustRegistryMetadata",
+        "metadata response",
     )
-    if not ok or data is None:
-        return ok
-    return validate_required_fields(data, ["id", "name", "description"], "metadata response")
 
 
-def smoke_post_authorization(base_url, headers, entity_id, authority_id, action, resource):
+def smoke_post_authorization(base_url, headers, args):
     """POST /authorization should accept the current TrqpAuthorizationQuery shape."""
-    print("\n=== Smoke: POST /authorization ===")
-    payload = {
-        "entity_id": entity_id,
-        "authority_id": authority_id,
-        "action": action,
-        "resource": resource,
-        "context": {},
-    }
-    ok, data = request_json(
+    from trqp_client import build_parc_payload
+
+    return smoke_check(
+        "POST /authorization",
         "post",
         f"{base_url}/authorization",
         {**headers, "Content-Type": "application/json"},
         CORE_EXPECTED_STATUSES,
-        json=payload,
-    )
-    if not ok or data is None:
-        return ok
-    return validate_required_fields(
-        data,
-        ["entity_id", "authority_id", "action", "resource", "time_evaluated", "authorized"],
+        "queryAuthorization",
         "authorization response",
+        json=build_parc_payload(
+            args.entity_id, args.authority_id, args.authorization_action, args.authorization_resource
+        ),
     )
 
 
-def smoke_post_recognition(base_url, headers, entity_id, authority_id, action, resource):
+def smoke_post_recognition(base_url, headers, args):
     """POST /recognition should accept the current TrqpRecognitionQuery shape."""
-    print("\n=== Smoke: POST /recognition ===")
-    payload = {
-        "entity_id": entity_id,
-        "authority_id": authority_id,
-        "action": action,
-        "resource": resource,
-        "context": {},
-    }
-    ok, data = request_json(
+    from trqp_client import build_parc_payload
+
+    return smoke_check(
+        "POST /recognition",
         "post",
         f"{base_url}/recognition",
         {**headers, "Content-Type": "application/json"},
         CORE_EXPECTED_STATUSES,
-        json=payload,
-    )
-    if not ok or data is None:
-        return ok
-    return validate_required_fields(
-        data,
-        ["entity_id", "authority_id", "action", "resource", "time_evaluated", "recognized"],
+        "queryRecognition",
         "recognition response",
+        json=build_parc_payload(
+            args.recognition_entity_id, args.authority_id, args.recognition_action, args.recognition_resource
+        ),
     )
 
 
-def smoke_lookup_assurance_levels(base_url, headers, authority_id):
+def smoke_lookup_assurance_levels(base_url, headers, args):
     """GET /lookups/assuranceLevels should use the top-level Ayra profile path."""
-    print("\n=== Smoke: GET /lookups/assuranceLevels ===")
-    ok, data = request_json(
+    return smoke_check(
+        "GET /lookups/assuranceLevels",
         "get",
         f"{base_url}/lookups/assuranceLevels",
         headers,
         OPTIONAL_EXPECTED_STATUSES,
-        params={"authority_id": authority_id},
+        "lookupSupportedAssuranceLevels",
+        "assurance levels response",
+        params={"authority_id": args.authority_id},
     )
-    if not ok or data is None:
-        return ok
-    return validate_list_items(data, ["assurance_level", "description"], "assurance levels response")
 
 
-def smoke_lookup_authorizations(base_url, headers, authority_id):
+def smoke_lookup_authorizations(base_url, headers, args):
     """GET /lookups/authorizations should use the top-level Ayra profile path."""
-    print("\n=== Smoke: GET /lookups/authorizations ===")
-    ok, data = request_json(
+    return smoke_check(
+        "GET /lookups/authorizations",
         "get",
         f"{base_url}/lookups/authorizations",
         headers,
         OPTIONAL_EXPECTED_STATUSES,
-        params={"authority_id": authority_id},
+        "lookupAuthorizations",
+        "authorizations lookup response",
+        params={"authority_id": args.authority_id},
     )
-    if not ok or data is None:
-        return ok
-    return validate_list_items(data, ["action", "resource"], "authorizations lookup response")
 
 
-def smoke_list_entities(base_url, headers, authority_id):
+def smoke_list_entities(base_url, headers, args):
     """GET /entities should list entities or signal non-support (optional endpoint)."""
-    print("\n=== Smoke: GET /entities ===")
-    ok, data = request_json(
+    return smoke_check(
+        "GET /entities",
         "get",
         f"{base_url}/entities",
         headers,
         OPTIONAL_EXPECTED_STATUSES,
-        params={"authority_id": authority_id, "limit": 10},
+        "listEntities",
+        "entities list response",
+        params={"authority_id": args.authority_id, "limit": 10},
     )
-    if not ok or data is None:
-        return ok
-    if not validate_required_fields(data, ["items", "pagination"], "entities list response"):
-        return False
-    return validate_list_items(data["items"], ["entity_id"], "entities list items")
 
 
-def smoke_lookup_did_methods(base_url, headers, authority_id):
+def smoke_lookup_did_methods(base_url, headers, args):
     """GET /lookups/didMethods should use the top-level Ayra profile path."""
-    print("\n=== Smoke: GET /lookups/didMethods ===")
-    ok, data = request_json(
+    return smoke_check(
+        "GET /lookups/didMethods",
         "get",
         f"{base_url}/lookups/didMethods",
         headers,
         OPTIONAL_EXPECTED_STATUSES,
-        params={"authority_id": authority_id},
+        "lookupSupportedDIDMethods",
+        "DID methods response",
+        params={"authority_id": args.authority_id},
     )
-    if not ok or data is None:
-        return ok
-    return validate_list_items(data, ["identifier"], "DID methods response")
+
+
+# (--only name, report label, check), run in this order.
+SMOKE_CHECKS = (
+    ("metadata", "GET /metadata", smoke_get_metadata),
+    ("authorization", "POST /authorization", smoke_post_authorization),
+    ("recognition", "POST /recognition", smoke_post_recognition),
+    ("assurance-levels", "GET /lookups/assuranceLevels", smoke_lookup_assurance_levels),
+    ("lookup-authorizations", "GET /lookups/authorizations", smoke_lookup_authorizations),
+    ("did-methods", "GET /lookups/didMethods", smoke_lookup_did_methods),
+    ("entities", "GET /entities", smoke_list_entities),
+)
 
 
 def run_smoke_tests(args):
-    """Runs quick Ayra TRQP profile smoke checks."""
+    """Runs quick Ayra TRQP profile smoke checks, one after another."""
     base_url = args.base_url.rstrip("/")
     headers = build_headers(args.bearer_token)
+    checks = []
+    for name, label, check in SMOKE_CHECKS:
+        if not args.only or name in args.only:
+            checks.append((label, check(base_url, headers, args)))
+    get_transport().print_latency_report()
+
+    overall_success = True
+    print("\n==================== Smoke Test Results ====================")
+    for check_name, result in checks:
+        status = "PASS" if result else "FAIL"
+        print(f"{check_name}: {status}")
+        overall_success = overall_success and result
+
+    print("============================================================")
+    if overall_success:
+        print("SMOKE TESTS PASSED.")
+        return 0
+
+    print("ONE OR MORE SMOKE TESTS FAILED.")
+    return 1
+
 
-    checks = [
-        ("GET /metadata", smoke_get_metadata(base_url, headers)),
-        (
+def load_targets(args):
+    """The smoke checks' requests as LoadTargets, by --only name."""
+    from trqp_client import build_parc_payload
+    from trqp_load import LoadTarget
+
+    base_url = args.base_url.rstrip("/")
+    headers = build_headers(args.bearer_token)
+    post_headers = {**headers, "Content-Type": "application/json"}
+    schemas = get_schema_registry()
+    lookup = {"authority_id": args.authority_id}
+
+    return {
+        "metadata": LoadTarget(
+            "GET /metadata",
+            "get",
+            f"{base_url}/metadata",
+            headers,
+            None,
+            OPTIONAL_EXPECTED_STATUSES,
+            schemas.response_validator("getTrustRegistryMetadata"),
+        ),
+        "authorization": LoadTarget(
             "POST /authorization",
-            smoke_post_authorization(
-                base_url,
-                headers,
+            "post",
+            f"{base_url}/authorization",
+            post_headers,
+            build_parc_payload(
                 args.entity_id,
                 args.authority_id,
                 args.authorization_action,
                 args.authorization_resource,
             ),
+            CORE_EXPECTED_STATUSES,
+            schemas.response_validator("queryAuthorization"),
         ),
-        (
+        "recognition": LoadTarget(
             "POST /recognition",
-            smoke_post_recognition(
-                base_url,
-                headers,
+            "post",
+            f"{base_url}/recognition",
+            post_headers,
+            build_parc_payload(
                 args.recognition_entity_id,
                 args.authority_id,
                 args.recognition_action,
                 args.recognition_resource,
             ),
+            CORE_EXPECTED_STATUSES,
+            schemas.response_validator("queryRecognition"),
         ),
-        (
+        "assurance-levels": LoadTarget(
             "GET /lookups/assuranceLevels",
-            smoke_lookup_assurance_levels(base_url, headers, args.authority_id),
+            "get",
+            f"{base_url}/lookups/assuranceLevels",
+            headers,
+            None,
+            OPTIONAL_EXPECTED_STATUSES,
+            schemas.response_validator("lookupSupportedAssuranceLevels"),
+            lookup,
         ),
-        (
+        "lookup-authorizations": LoadTarget(
             "GET /lookups/authorizations",
-            smoke_lookup_authorizations(base_url, headers, args.authority_id),
+            "get",
+            f"{base_url}/lookups/authorizations",
+            headers,
+            None,
+            OPTIONAL_EXPECTED_STATUSES,
+            schemas.response_validator("lookupAuthorizations"),
+            lookup,
         ),
-        (
+        "did-methods": LoadTarget(
             "GET /lookups/didMethods",
-            smoke_lookup_did_methods(base_url, headers, args.authority_id),
+            "get",
+            f"{base_url}/lookups/didMethods",
+            headers,
+            None,
+            OPTIONAL_EXPECTED_STATUSES,
+            schemas.response_validator("lookupSupportedDIDMethods"),
+            lookup,
         ),
-        (
+        "entities": LoadTarget(
             "GET /entities",
-            smoke_list_entities(base_url, headers, args.authority_id),
+            "get",
+            f"{base_url}/entities",
+            headers,
+            None,
+            OPTIONAL_EXPECTED_STATUSES,
+            schemas.response_validator("listEntities"),
+            {**lookup, "limit": 10},
         ),
-    ]
+    }
 
-    overall_success = True
-    print("\n==================== Smoke Test Results ====================")
-    for check_name, result in checks:
-        status = "PASS" if result else "FAIL"
-        print(f"{check_name}: {status}")
-        overall_success = overall_success and result
 
-    print("============================================================")
-    if overall_success:
-        print("SMOKE TESTS PASSED.")
+def load_runner():
+    """Runs load through the shared transport: from asyncio tasks for the asyncio transport, else from threads."""
+    from trqp_load import AsyncLoadRunner, run_load
+
+    if hasattr(get_transport(), "aclose"):
+        return AsyncLoadRunner(get_transport())
+    return functools.partial(run_load, get_transport())
+
+
+def run_load_test(args):
+    """Drives the POST /authorization and POST /recognition smoke payloads concurrently."""
+    from trqp_load import print_load_report
+
+    base_url = args.base_url.rstrip("/")
+    all_targets = load_targets(args)
+    targets = [all_targets["authorization"], all_targets["recognition"]]
+
+    target_rate = f"{args.rate:g} req/s" if args.rate else "unthrottled"
+    print(f"Load testing {base_url} for {args.duration:g}s with {args.concurrency} workers ({target_rate})...")
+    results, elapsed = load_runner()(targets, args.concurrency, args.duration, args.rate)
+    get_transport().print_latency_report()
+    if print_load_report(results, elapsed, args.concurrency, args.rate):
+        print("LOAD TEST COMPLETED WITHOUT ERRORS.")
         return 0
 
-    print("ONE OR MORE SMOKE TESTS FAILED.")
+    print("LOAD TEST RECORDED ERRORS.")
+    return 1
+
+
+def run_capacity_test(args):
+    """Runs a capacity profile over a mix of the smoke checks' requests and checks each stage against the SLOs."""
+    from trqp_capacity import capacity_plan, load_profile, parse_settings, print_capacity_report, run_capacity
+    from trqp_capacity import write_report
+
+    try:
+        profile = load_profile(args.capacity, args.rate, args.duration)
+        if args.mix:
+            profile["mix"] = parse_settings(args.mix, "--mix")
+        if args.slo:
+            profile["slo"] = {**(profile.get("slo") or {}), **parse_settings(args.slo, "--slo")}
+        plan = capacity_plan(profile, load_targets(args))
+    except (OSError, ValueError) as ex:
+        print(f"--capacity: {ex}", file=sys.stderr)
+        return 2
+
+    print(f"Capacity testing {args.base_url} with a {profile['shape']} profile and {args.concurrency} workers...")
+    report = run_capacity(load_runner(), plan, args.concurrency)
+    report["base_url"] = args.base_url
+    get_transport().print_latency_report()
+    print_capacity_report(report)
+    if args.capacity_report:
+        write_report(report, args.capacity_report)
+        print(f"Wrote the capacity report to {args.capacity_report}")
+
+    if report["passed"]:
+        print("CAPACITY TEST MET THE SLOS.")
+        return 0
+
+    print("CAPACITY TEST BROKE THE SLOS.")
     return 1
 
 
+def run_batch_file(args):
+    """Replays a JSON Lines query file against the registry and writes JSON Lines results."""
+    from trqp_client import TrqpClient
+    from trqp_replay import replay_file
+
+    client = TrqpClient(args.base_url, build_headers(args.bearer_token), transport=get_transport())
+    source = sys.stdin if args.batch_file == "-" else open(args.batch_file, encoding="utf-8")
+    output = sys.stdout if args.batch_output == "-" else open(args.batch_output, "w", encoding="utf-8")
+
+    started = time.monotonic()
+    try:
+        outcomes = replay_file(client, source, output, args.concurrency, ordered=args.batch_order == "input")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.monotonic() - started
+
+    # Results may be going to stdout, so the summary goes to stderr.
+    total = sum(outcomes.values())
+    print(f"Replayed {total} queries in {elapsed:.1f}s ({total / elapsed:.1f} queries/s).", file=sys.stderr)
+    for outcome, count in outcomes.most_common():
+        print(f"    {outcome}: {count}", file=sys.stderr)
+
+    failures = sum(
+        count for outcome, count in outcomes.items()
+        if outcome in ("error", "schema-invalid") or int(outcome) not in CORE_EXPECTED_STATUSES
+    )
+    return 1 if failures else 0
+
+
+def build_transport(args, pool_size, instrumentation):
+    """The blocking TrqpTransport, wrapped by the resilience and HTTP cache options that are set."""
+    concurrent = args.load or args.capacity or args.batch_file
+    result = TrqpTransport(
+        pool_size=pool_size,
+        keep_alive=not args.no_keep_alive,
+        http2=args.http2,
+        timeout=args.timeout,
+        instrumentation=instrumentation,
+        # A probe makes a request or two: importing requests would take longer.
+        stdlib=bool(args.only) and not concurrent and not args.http2 and not instrumentation.active,
+    )
+    if args.retries or args.hedge_percentile or args.circuit_breaker:
+        from trqp_resilience import ResilientTransport
+
+        result = ResilientTransport(
+            result,
+            max_attempts=args.retries + 1,
+            hedge_percentile=args.hedge_percentile,
+            failure_threshold=args.circuit_breaker,
+        )
+    if args.http_cache:
+        from trqp_http_cache import CachingTransport, HttpCache
+
+        result = CachingTransport(result, HttpCache(args.http_cache))
+    return result
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Ayra TRQP Profile smoke test. Use the full Ayra CTS for conformance certification."
     )
-    parser.add_argument(
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument(
         "--base-url",
-        required=True,
         help="Base URL of the Trust Registry API (for example, https://example-trust-registry.com)",
     )
+    target.add_argument(
+        "--registry-did",
+        help="Registry or ecosystem DID whose TRQP service gives the base URL, instead of --base-url.",
+    )
     parser.add_argument(
         "--bearer-token",
         default="",
@@ -287,9 +487,155 @@ def main():
     parser.add_argument("--authorization-resource", default="credential", help="Resource for /authorization.")
     parser.add_argument("--recognition-action", default="recognize", help="Action for /recognition.")
     parser.add_argument("--recognition-resource", default="trust-registry", help="Resource for /recognition.")
+    parser.add_argument(
+        "--load",
+        action="store_true",
+        help="Drive the POST /authorization and POST /recognition payloads concurrently instead of the smoke checks.",
+    )
+    parser.add_argument(
+        "--capacity",
+        metavar="PROFILE",
+        help="Run a capacity profile instead of the smoke checks: a JSON or YAML profile file, or one of "
+        "ramp, step, soak and spike, which peak at --rate and last --duration seconds.",
+    )
+    parser.add_argument(
+        "--mix",
+        help="Endpoint weights for --capacity, e.g. authorization=80,recognition=15,lookups=5.",
+    )
+    parser.add_argument(
+        "--slo",
+        help="SLO limits for --capacity, e.g. p99_ms=50,error_rate=0.01,required_rate=500.",
+    )
+    parser.add_argument("--capacity-report", metavar="FILE", help="Write the --capacity results to this JSON file.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Requests in flight for --load and --capacity, and worker threads for --batch-file.",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds to run --load, or a built-in --capacity shape, for."
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=0,
+        help="Target total requests per second for --load (0 sends as fast as the workers allow), "
+        "or the peak rate of a built-in --capacity shape.",
+    )
+    parser.add_argument(
+        "--batch-file",
+        help="Replay a JSON Lines file of authorization/recognition queries ('-' for stdin) instead of the smoke checks.",
+    )
+    parser.add_argument(
+        "--batch-output",
+        default="-",
+        help="JSON Lines file for --batch-file results (default: stdout).",
+    )
+    parser.add_argument(
+        "--batch-order",
+        choices=["input", "completion"],
+        default="input",
+        help="Write --batch-file results in input order or as they complete.",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=10,
+        help="Maximum pooled connections per host (--load uses at least --concurrency).",
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        action="store_true",
+        help="Close the connection after every request, to measure full handshake cost.",
+    )
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 (requires httpx[http2]).")
+    parser.add_argument(
+        "--metrics-file",
+        help="Write per-endpoint request metrics, with DNS/connect/TLS/TTFB/body phases, as OpenMetrics text.",
+    )
+    parser.add_argument("--spans-file", help="Write an OpenTelemetry-style span per request as JSON Lines.")
+    parser.add_argument("--timeout", type=float, default=15, help="Seconds to wait for each request attempt.")
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="Retry transient failures (connection errors, 429, 502, 503, 504) this many times, with backoff.",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        help="Send a duplicate of requests slower than this latency percentile of their endpoint, e.g. 95.",
+    )
+    parser.add_argument(
+        "--circuit-breaker",
+        type=int,
+        default=0,
+        metavar="FAILURES",
+        help="Fail fast for 10s on an endpoint after this many consecutive failures (0 disables).",
+    )
+    parser.add_argument(
+        "--http-cache",
+        metavar="FILE",
+        help="Cache GET /metadata and the lookups in this SQLite file, honoring Cache-Control and ETag across runs.",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        choices=SMOKE_CHECK_NAMES,
+        help="Run only this smoke check, for example as a health probe. May be repeated. "
+        "Uses the standard library HTTP client unless an option needs requests or httpx.",
+    )
     args = parser.parse_args()
+    if args.registry_did:
+        from trqp_discovery import DiscoveryError, EndpointDiscovery
 
-    sys.exit(run_smoke_tests(args))
+        try:
+            args.base_url = EndpointDiscovery().discover(args.registry_did)
+        except DiscoveryError as ex:
+            parser.error(str(ex))
+        print(f"Discovered {args.base_url} from {args.registry_did}")
+
+    global transport
+    concurrent = args.load or args.capacity or args.batch_file
+    pool_size = max(args.pool_size, args.concurrency) if concurrent else args.pool_size
+    spans = open(args.spans_file, "w", encoding="utf-8") if args.spans_file else None
+    instrumentation = MetricsExporter(spans=spans) if args.metrics_file or spans else NO_INSTRUMENTATION
+    # --load and --capacity drive the asyncio transport from tasks on one event
+    # loop. Retries, hedging, circuit breaking and the HTTP cache wrap the
+    # blocking transport, so with those they drive it from threads.
+    threaded = args.retries or args.hedge_percentile or args.circuit_breaker or args.http_cache
+    try:
+        if (args.load or args.capacity) and not threaded:
+            from trqp_async_transport import AsyncTrqpTransport
+
+            transport = AsyncTrqpTransport(
+                max_per_host=pool_size,
+                keep_alive=not args.no_keep_alive,
+                http2=args.http2,
+                timeout=args.timeout,
+                instrumentation=instrumentation,
+            )
+        else:
+            transport = build_transport(args, pool_size, instrumentation)
+    except ImportError as ex:
+        parser.error(str(ex))
+
+    try:
+        if args.load:
+            status = run_load_test(args)
+        elif args.capacity:
+            status = run_capacity_test(args)
+        elif args.batch_file:
+            status = run_batch_file(args)
+        else:
+            status = run_smoke_tests(args)
+    finally:
+        if spans is not None:
+            spans.close()
+        if args.metrics_file:
+            instrumentation.write_openmetrics(args.metrics_file)
+    sys.exit(status)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,56 @@
+"""Fixtures shared by the pytest modules in this directory."""
+
+import argparse
+import asyncio
+import socket
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+from trqp_reference_server import ReferenceRegistry, build_metadata, build_store, serve
+
+# Entities in the reference registry fixture: did:example:entity0 to did:example:entity249.
+REFERENCE_ENTITIES = 250
+
+
+@contextmanager
+def serve_in_background(registry):
+    """Serves a ReferenceRegistry from a background thread. Yields its base URL."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(128)
+    loop = asyncio.new_event_loop()
+    server = loop.create_task(serve(registry, listener))
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(server)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # Connections still open are served by their own tasks, which must finish before the loop closes.
+            connections = asyncio.all_tasks(loop)
+            for task in connections:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*connections, return_exceptions=True))
+            loop.close()
+
+    thread = threading.Thread(target=run, name="reference-registry", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{listener.getsockname()[1]}"
+    finally:
+        loop.call_soon_threadsafe(server.cancel)
+        thread.join(5)
+        listener.close()
+
+
+@pytest.fixture(scope="session")
+def reference_registry():
+    """Base URL of a reference Trust Registry with synthetic entities, served from a background thread."""
+    store = build_store([], REFERENCE_ENTITIES)
+    metadata = build_metadata(argparse.Namespace(registry_id="did:example:trust-registry"), store)
+    with serve_in_background(ReferenceRegistry(store, metadata)) as base_url:
+        yield base_url
@@ -0,0 +1,46 @@
+"""Tests for the smoke test's `--only` probe mode and its lazy imports."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+
+
+def run_python(*args, cwd=HERE):
+    return subprocess.run([sys.executable, *args], cwd=cwd, capture_output=True, text=True, timeout=60)
+
+
+def test_probe_runs_only_the_selected_checks(reference_registry):
+    result = run_python(
+        "api_conformance_test.py", "--base-url", reference_registry, "--only", "metadata", "--only", "did-methods"
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "Protocol: HTTP/1.1 (http.client)" in result.stdout
+    assert "GET /metadata: PASS" in result.stdout and "GET /lookups/didMethods: PASS" in result.stdout
+    assert "/authorization" not in result.stdout and "/entities" not in result.stdout
+
+
+def test_probe_fails_when_the_registry_is_unreachable():
+    result = run_python("api_conformance_test.py", "--base-url", "http://127.0.0.1:9", "--only", "metadata")
+    assert result.returncode == 1
+    assert "Request failed: ConnectionRefusedError" in result.stdout
+    assert "ONE OR MORE SMOKE TESTS FAILED." in result.stdout
+
+
+def test_probe_rejects_unknown_checks():
+    result = run_python("api_conformance_test.py", "--base-url", "http://127.0.0.1:9", "--only", "health")
+    assert result.returncode == 2 and "invalid choice: 'health'" in result.stderr
+
+
+def imported_modules(module, cwd):
+    result = run_python("-c", f"import sys, {module}; print(' '.join(sys.modules))", cwd=cwd)
+    assert result.returncode == 0, result.stderr
+    return set(result.stdout.split())
+
+
+def test_heavy_modules_are_imported_lazily():
+    smoke = imported_modules("api_conformance_test", HERE)
+    assert not smoke & {"requests", "urllib3", "yaml", "asyncio", "trqp_load", "trqp_client", "trqp_discovery"}
+    did_tools = imported_modules("did_peer_utils", HERE.parent / "tools")
+    assert not {module for module in did_tools if module.split(".")[0] in ("cryptography", "concurrent")}
@@ -0,0 +1,132 @@
+"""Tests for the streaming JSON array parser and the asyncio client."""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from conftest import REFERENCE_ENTITIES
+from trqp_async_client import AsyncTrqpClient, JsonArrayParser, TrqpConnectionError
+
+ITEMS = [{"name": "café ☕", "n": 12345}, [1, 2.5, -3e2], "], [", 1234567890, None, True, {}]
+
+
+def parse_in_chunks(data, size):
+    parser = JsonArrayParser()
+    items = []
+    for start in range(0, len(data), size):
+        items += parser.feed(data[start : start + size])
+    parser.close()
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_parser_yields_items_whatever_the_chunking(size):
+    data = json.dumps(ITEMS, ensure_ascii=False, indent=1).encode()
+    assert parse_in_chunks(data, size) == ITEMS
+
+
+def test_parser_waits_for_the_delimiter():
+    parser = JsonArrayParser()
+    assert parser.feed(b"[12") == []
+    assert parser.feed(b"34, 5") == [1234]
+    assert parser.feed(b"6]") == [56]
+    parser.close()
+
+
+@pytest.mark.parametrize("size", [1, 2, 5])
+def test_parser_tracks_strings_and_escapes_across_chunks(size):
+    items = ['a "quoted" \\', "\\\"]", {"nested": [["]", "}"], {"x": ",\\"}]}, "\u00e9\U0001f600"]
+    data = json.dumps(items).encode()
+    assert parse_in_chunks(data, size) == items
+
+
+def test_parser_is_linear_in_the_size_of_an_item():
+    def parse_time(count):
+        data = json.dumps([{"values": list(range(count))}, 1]).encode()
+        started = time.perf_counter()
+        items = parse_in_chunks(data, 64)
+        elapsed = time.perf_counter() - started
+        assert len(items[0]["values"]) == count
+        return elapsed
+
+    # A parser that rescanned the item on every chunk would take about 16 times as long for 4 times the data.
+    assert parse_time(200000) < 8 * max(parse_time(50000), 0.001)
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ] \n"])
+def test_parser_accepts_empty_arrays(data):
+    assert parse_in_chunks(data, 1) == []
+
+
+@pytest.mark.parametrize(
+    "data, message",
+    [
+        (b'{"a": 1}', "Expected a JSON array"),
+        (b"[1 2]", "Expected ',' or ']'"),
+        (b"[1, 2] 3", "Extra data"),
+        (b"[1, 2", "ended early"),
+        (b"[1, {", "Expecting property name"),
+        (b"", "ended early"),
+        (b"[1,]", "Expecting value at character 3"),
+        (b"[1}]", "Unexpected '}'"),
+    ],
+)
+def test_parser_rejects_malformed_arrays(data, message):
+    with pytest.raises(ValueError, match=message):
+        parse_in_chunks(data, 2)
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_every_operation_against_the_reference_registry(reference_registry):
+    async def calls():
+        async with AsyncTrqpClient(reference_registry) as client:
+            return await asyncio.gather(
+                client.query_authorization("did:example:entity1", "did:example:ecosystem", "issue", "credential"),
+                client.query_recognition(
+                    "did:example:trust-registry", "did:example:ecosystem", "recognize", "trust-registry"
+                ),
+                client.get_metadata(),
+                client.get_entity("did:example:entity1"),
+                client.list_entity_authorizations("did:example:entity1"),
+                client.list_entities(limit=5),
+                client.get_ecosystem("did:example:ecosystem"),
+                client.list_ecosystem_recognitions("did:example:ecosystem"),
+                client.lookup_assurance_levels(),
+                client.lookup_authorizations(),
+                client.lookup_did_methods(),
+                client.get_entity("did:example:nobody"),
+            )
+
+    replies = run(calls())
+    assert [reply.status for reply in replies] == [200] * 11 + [404]
+    assert replies[0].data["authorized"] is True
+    assert replies[1].data["recognized"] is True
+    assert len(replies[5].data["items"]) == 5
+    assert replies[5].data["pagination"]["total"] == REFERENCE_ENTITIES
+
+
+def test_iterators_against_the_reference_registry(reference_registry):
+    async def collect():
+        async with AsyncTrqpClient(reference_registry, max_per_host=2) as client:
+            entities = [entity["entity_id"] async for entity in client.iter_entities(page_size=40)]
+            recognitions = [item async for item in client.iter_ecosystem_recognitions("did:example:ecosystem")]
+            return entities, recognitions
+
+    entities, recognitions = run(collect())
+    assert len(entities) == len(set(entities)) == REFERENCE_ENTITIES
+    assert entities == sorted(entities)
+    assert [item["entity_id"] for item in recognitions] == ["did:example:trust-registry"]
+
+
+def test_connection_errors_are_wrapped():
+    async def call():
+        async with AsyncTrqpClient("http://127.0.0.1:9", timeout=2) as client:
+            await client.get_metadata()
+
+    with pytest.raises(TrqpConnectionError, match="GET /metadata failed"):
+        run(call())
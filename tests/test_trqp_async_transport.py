@@ -0,0 +1,76 @@
+"""Tests for the asyncio HTTP transport's request framing and its handling of malformed responses."""
+
+import asyncio
+import http.client
+
+import pytest
+
+from trqp_async_transport import AsyncTrqpTransport
+
+
+async def exchange(reply, method="GET", path="/metadata", headers=None):
+    """Sends one request to a server that answers with the raw bytes `reply`. Returns (response, request bytes)."""
+    received = []
+
+    async def handle(reader, writer):
+        received.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(reply)
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    transport = AsyncTrqpTransport(timeout=5)
+    try:
+        async with server:
+            response = await transport.request(method, f"http://127.0.0.1:{port}{path}", headers=headers)
+    finally:
+        await transport.aclose()
+    return response, received[0] if received else None
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_sends_a_well_formed_request():
+    response, request = run(exchange(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}", headers={"X-Trace": 7}))
+    assert response.status_code == 200 and response.content == b"{}"
+    assert request.startswith(b"GET /metadata HTTP/1.1\r\nHost: 127.0.0.1:")
+    assert b"\r\nX-Trace: 7\r\n" in request
+
+
+@pytest.mark.parametrize(
+    "headers, message",
+    [
+        ({"Authorization": "Bearer abc\r\nX-Admin: 1"}, "Invalid header value"),
+        ({"Authorization": "Bearer abc\nX-Admin: 1"}, "Invalid header value"),
+        ({"X-Admin: 1\r\nAuthorization": "Bearer abc"}, "Invalid header name"),
+        ({"Bad Name": "1"}, "Invalid header name"),
+    ],
+)
+def test_rejects_headers_that_would_inject_lines(headers, message):
+    with pytest.raises(ValueError, match=message):
+        run(exchange(b"", headers=headers))
+
+
+def test_rejects_urls_with_control_characters():
+    transport = AsyncTrqpTransport()
+    with pytest.raises(http.client.InvalidURL):
+        run(transport.request("GET", "http://127.0.0.1:9/metadata HTTP/1.1\r\nX-Admin: 1"))
+    assert issubclass(http.client.InvalidURL, transport.errors)
+
+
+@pytest.mark.parametrize(
+    "reply",
+    [
+        # Response headers longer than the stream limit.
+        b"HTTP/1.1 200 OK\r\nX-Padding: " + b"a" * 70000 + b"\r\n\r\n",
+        b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n",
+        b"HTTP/1.1 200 OK\r\nContent-Length: 10\r\n\r\n{}",
+        b"SSH-2.0-OpenSSH\r\n\r\n",
+    ],
+)
+def test_malformed_responses_raise_transport_errors(reply):
+    with pytest.raises(AsyncTrqpTransport().errors):
+        run(exchange(reply))
@@ -0,0 +1,82 @@
+"""Tests for the in-process TTL/LRU response cache and its use by TrqpClient."""
+
+from trqp_cache import MISSING, TrqpResponseCache, cache_key, historical_time
+from trqp_client import TrqpAuthorizationQuery, TrqpClient
+from trqp_transport import TrqpTransport
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def query(entity_id="did:example:entity1", **context):
+    return TrqpAuthorizationQuery(
+        entity_id, "did:example:ecosystem", "issue", "credential", tuple(sorted(context.items()))
+    )
+
+
+def test_entries_expire_after_their_ttl():
+    clock = Clock()
+    cache = TrqpResponseCache(ttl=60, clock=clock)
+    cache.put("live", 1, 60)
+    cache.put("pinned", 2, None)
+    clock.now = 59.9
+    assert cache.get("live") == 1
+    clock.now = 60
+    assert cache.get("live") is MISSING
+    clock.now = 10**9
+    assert cache.get("pinned") == 2
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1, "evictions": 0, "expirations": 1}
+
+
+def test_evicts_the_least_recently_used_entry():
+    cache = TrqpResponseCache(max_entries=2)
+    cache.put("a", 1, None)
+    cache.put("b", 2, None)
+    assert cache.get("a") == 1
+    cache.put("c", 3, None)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_depends_on_the_answer_and_the_query_time():
+    cache = TrqpResponseCache(ttl=60, negative_ttl=10)
+    assert cache.ttl_for(query(), 200) == 60
+    assert cache.ttl_for(query(), 404) == 10
+    assert cache.ttl_for(query(), 500) is MISSING
+    assert cache.ttl_for(query(time="2020-01-01T00:00:00Z"), 200) is None
+    assert cache.ttl_for(query(time="2999-01-01T00:00:00Z"), 200) == 60
+    assert not historical_time(query(time="2020-01-01T00:00:00"))  # no offset, so not an instant
+
+
+def test_keys_separate_registries_and_contexts():
+    assert cache_key(query(), "http://a") != cache_key(query(), "http://b")
+    reordered = TrqpAuthorizationQuery.from_payload({**query().payload(), "context": {"b": "2", "a": "1"}})
+    assert cache_key(query(a="1", b="2")) == cache_key(reordered)
+    assert cache_key(query(a="1")) != cache_key(query(a="2"))
+
+
+def test_invalidate_entities():
+    cache = TrqpResponseCache()
+    for entity_id in ("did:example:a", "did:example:b"):
+        cache.put(cache_key(query(entity_id)), (200, {}), None)
+    assert cache.invalidate_entities(["did:example:a"]) == 1
+    assert cache.get(cache_key(query("did:example:a"))) is MISSING
+    assert cache.get(cache_key(query("did:example:b"))) == (200, {})
+
+
+def test_client_answers_repeated_queries_from_the_cache(reference_registry):
+    cache = TrqpResponseCache()
+    client = TrqpClient(reference_registry, transport=TrqpTransport(stdlib=True), cache=cache)
+    first = client.query(query())
+    second = client.query(query())
+    unknown = [client.query(query("did:example:nobody")) for _ in range(2)]
+    assert (first.status, first.data["authorized"]) == (200, True)
+    assert second.data == first.data
+    assert [result.status for result in unknown] == [404, 404]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 2
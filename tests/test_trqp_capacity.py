@@ -0,0 +1,106 @@
+"""Tests for the capacity mode's schedule and the load driver's use of it."""
+
+from collections import Counter
+
+import pytest
+
+from trqp_capacity import DEFAULT_MIX, SCHEDULE_LENGTH, capacity_plan, default_profile, mix_schedule, profile_stages
+from trqp_load import LoadTarget, run_load
+from trqp_transport import HttpClientResponse
+
+CHECKS = ("authorization", "recognition", "assurance-levels", "lookup-authorizations", "did-methods", "entities")
+TARGETS = {name: LoadTarget(name, "get", f"http://registry.test/{name}", {}, None, {200}) for name in CHECKS}
+DEFAULT_SHARES = {
+    "authorization": 0.80,
+    "recognition": 0.15,
+    "assurance-levels": 0.05 / 3,
+    "lookup-authorizations": 0.05 / 3,
+    "did-methods": 0.05 / 3,
+}
+
+
+class CountingTransport:
+    """Answers every request with an empty 200 and counts requests per endpoint."""
+
+    errors = (OSError,)
+
+    def __init__(self):
+        self.sent = Counter()
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        self.sent[endpoint] += 1
+        return HttpClientResponse(200, {}, b"{}", url)
+
+
+def test_schedule_follows_the_mix():
+    counts = Counter(target.name for target in mix_schedule(TARGETS, DEFAULT_MIX))
+    assert counts["authorization"] == 80
+    assert counts["recognition"] == 15
+    assert sum(counts[name] for name in ("assurance-levels", "lookup-authorizations", "did-methods")) == 5
+    assert min(counts[name] for name in ("assurance-levels", "lookup-authorizations", "did-methods")) >= 1
+
+
+def test_schedule_spreads_light_endpoints():
+    schedule = [target.name for target in mix_schedule(TARGETS, DEFAULT_MIX)]
+    # Every lookup endpoint appears within the first half of a pass, not in one burst at the end.
+    for name in ("assurance-levels", "lookup-authorizations", "did-methods"):
+        assert schedule.index(name) < SCHEDULE_LENGTH // 2
+
+
+def test_schedule_rejects_unknown_endpoints():
+    with pytest.raises(ValueError, match="bogus"):
+        mix_schedule(TARGETS, {"bogus": 1})
+
+
+@pytest.mark.parametrize(
+    "settings, message",
+    [
+        ({"mix": ["authorization"]}, "The mix must map endpoint names to weights"),
+        ({"mix": {"authorization": "most"}}, "The mix weight of 'authorization' must be a number"),
+        ({"slo": 50}, "The SLO must map limit names to numbers"),
+        ({"slo": {"endpoints": ["authorization"]}}, "The SLO 'endpoints' must map endpoint names to limits"),
+        ({"slo": {"endpoints": {"authorization": 50}}}, "The SLO limits for authorization must map"),
+        ({"slo": {"p99": 50}}, "Unknown SLO limit 'p99'"),
+        ({"stop_on_violation": "yes"}, "'stop_on_violation' must be true or false"),
+    ],
+)
+def test_malformed_profiles_are_rejected_before_the_run(settings, message):
+    with pytest.raises(ValueError, match=message):
+        capacity_plan({**default_profile("soak", 100, 10), **settings}, TARGETS)
+
+
+def test_empty_mix_and_slo_fall_back_to_the_defaults():
+    plan = capacity_plan({**default_profile("soak", 100, 10), "mix": None, "slo": None}, TARGETS)
+    assert len(plan.schedule) == SCHEDULE_LENGTH and plan.slo["p99_ms"] == 50.0
+
+
+@pytest.mark.parametrize("concurrency", [1, 8, 32])
+def test_run_load_honours_the_mix_across_workers(concurrency):
+    transport = CountingTransport()
+    schedule = mix_schedule(TARGETS, DEFAULT_MIX)
+    results, _ = run_load(transport, schedule, concurrency, duration=0.5, rate=2 * SCHEDULE_LENGTH * 2)
+    total = sum(transport.sent.values())
+    assert total >= SCHEDULE_LENGTH
+    # Whole passes of the schedule are sent in order, so each share is off by at most one pass's rounding.
+    for name, share in DEFAULT_SHARES.items():
+        assert transport.sent[name] > 0
+        assert abs(transport.sent[name] / total - share) < 0.02 + 1 / total
+    assert sum(stats.count for stats in results.values()) == total
+
+
+def test_stages_of_each_shape():
+    assert [stage.rate for stage in profile_stages({"shape": "step", "peak_rate": 100, "steps": 5, "step_duration": 1})] == [
+        20,
+        40,
+        60,
+        80,
+        100,
+    ]
+    ramp = profile_stages({"shape": "ramp", "start_rate": 10, "peak_rate": 110, "duration": 10, "windows": 10})
+    assert [round(stage.rate) for stage in ramp] == [15, 25, 35, 45, 55, 65, 75, 85, 95, 105]
+    spike = profile_stages(
+        {"shape": "spike", "baseline_rate": 5, "peak_rate": 50, "baseline_duration": 2, "spike_duration": 1}
+    )
+    assert [(stage.name, stage.rate) for stage in spike] == [("baseline", 5), ("spike", 50), ("recovery", 5)]
+    with pytest.raises(ValueError, match="needs 'rate'"):
+        profile_stages({"shape": "soak", "duration": 1})
@@ -0,0 +1,115 @@
+"""Tests for the batch query client."""
+
+import threading
+import time
+
+from trqp_client import TrqpAuthorizationQuery, TrqpClient, TrqpRecognitionQuery, map_bounded
+
+
+class CountingTransport:
+    """Answers every query with 200 after `delay`, recording the requests and the most in flight at once."""
+
+    errors = (ConnectionError,)
+
+    def __init__(self, delay=0.01, fail_entity=None):
+        self.delay = delay
+        self.fail_entity = fail_entity
+        self.requests = []
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, endpoint=None, json=None):
+        with self.lock:
+            self.requests.append((url, json["entity_id"]))
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if json["entity_id"] == self.fail_entity:
+                raise ConnectionError("refused")
+            return Response({"entity_id": json["entity_id"], "authorized": True})
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class Response:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def query(index):
+    return TrqpAuthorizationQuery(f"did:example:entity{index}", "did:example:ecosystem", "issue", "credential")
+
+
+def test_batch_collapses_duplicate_tuples():
+    transport = CountingTransport(delay=0)
+    client = TrqpClient("https://registry.example", transport=transport)
+    queries = [query(1), query(2), query(1), TrqpRecognitionQuery(*query(1)[:4]), query(2)]
+    results = list(client.batch(queries))
+    assert sorted((result.query.path, result.query) for result in results) == [
+        ("/authorization", query(1)),
+        ("/authorization", query(2)),
+        ("/recognition", query(1)),
+    ]
+    assert sorted(transport.requests) == [
+        ("https://registry.example/authorization", "did:example:entity1"),
+        ("https://registry.example/authorization", "did:example:entity2"),
+        ("https://registry.example/recognition", "did:example:entity1"),
+    ]
+
+
+def test_batch_bounds_the_requests_in_flight():
+    transport = CountingTransport()
+    client = TrqpClient("https://registry.example", transport=transport)
+    results = list(client.batch((query(index) for index in range(40)), max_in_flight=4))
+    assert len(results) == 40 and all(result.status == 200 for result in results)
+    assert transport.most_in_flight == 4
+
+
+def test_batch_reports_failures_in_the_result():
+    transport = CountingTransport(delay=0, fail_entity="did:example:entity2")
+    client = TrqpClient("https://registry.example", transport=transport)
+    results = {result.query.entity_id: result for result in client.batch([query(1), query(2)])}
+    assert results["did:example:entity1"].data["authorized"] is True
+    failed = results["did:example:entity2"]
+    assert failed.status is None and isinstance(failed.error, ConnectionError)
+
+
+def test_results_come_in_completion_order():
+    def finish_after(delay):
+        time.sleep(delay)
+        return delay
+
+    assert list(map_bounded(finish_after, [0.06, 0.0, 0.03], 3)) == [0.0, 0.03, 0.06]
+    assert list(map_bounded(finish_after, [0.06, 0.0, 0.03], 3, ordered=True)) == [0.06, 0.0, 0.03]
+
+
+def test_queries_are_read_lazily():
+    consumed = []
+
+    def queries():
+        for index in range(100):
+            consumed.append(index)
+            yield query(index)
+
+    client = TrqpClient("https://registry.example", transport=CountingTransport(delay=0), max_in_flight=2)
+    results = client.batch(queries())
+    next(results)
+    assert len(consumed) <= 3
+    results.close()
+
+
+def test_batch_against_the_reference_registry(reference_registry):
+    client = TrqpClient(reference_registry)
+    queries = [query(index % 5) for index in range(20)] + [query(999)]
+    results = {result.query.entity_id: result for result in client.batch(queries)}
+    assert len(results) == 6
+    assert all(results[f"did:example:entity{index}"].data["authorized"] is True for index in range(5))
+    assert results["did:example:entity999"].status == 404
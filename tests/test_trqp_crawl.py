@@ -0,0 +1,102 @@
+"""Tests for the paginated, resumable entity crawl."""
+
+import json
+import threading
+from urllib.parse import unquote, urlsplit
+
+import pytest
+
+from conftest import REFERENCE_ENTITIES
+from trqp_crawl import CrawlError, EntityCrawler, crawl
+from trqp_transport import HttpClientResponse, TrqpTransport
+
+AUTHORIZATION = {
+    "authority_id": "did:example:eco",
+    "action": "issue",
+    "resource": "vc",
+    "authorized": True,
+    "time_evaluated": "2026-01-01T00:00:00Z",
+}
+
+
+class ListingTransport:
+    """A registry listing `count` entities, clamping page sizes to `max_limit`.
+
+    `reported_limit` overrides the limit a page reports, and `empty_from`
+    makes every page from that offset on come back empty.
+    """
+
+    errors = (OSError,)
+
+    def __init__(self, count, max_limit=10, reported_limit=None, empty_from=None):
+        self.entities = [{"entity_id": f"did:example:{index:04}"} for index in range(count)]
+        self.max_limit = max_limit
+        self.reported_limit = reported_limit
+        self.empty_from = empty_from
+        self.pages = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, endpoint=None, params=None, **kwargs):
+        path = urlsplit(url).path
+        if path.endswith("/authorizations"):
+            body = [{**AUTHORIZATION, "entity_id": unquote(path.split("/")[-2])}]
+            return HttpClientResponse(200, {}, json.dumps(body).encode(), url)
+        with self.lock:
+            self.pages += 1
+            if self.pages > 100:
+                raise OSError("The crawler kept asking for pages")
+        offset, limit = params["offset"], min(params["limit"], self.max_limit)
+        items = self.entities[offset : offset + limit]
+        if self.empty_from is not None and offset >= self.empty_from:
+            items = []
+        reported = limit if self.reported_limit is None else self.reported_limit
+        page = {"items": items, "pagination": {"limit": reported, "offset": offset, "total": len(self.entities)}}
+        return HttpClientResponse(200, {}, json.dumps(page).encode(), url)
+
+
+def crawler(transport, **options):
+    return EntityCrawler("http://registry.test", transport=transport, page_size=1000, authorizations=False, **options)
+
+
+def test_steps_by_the_applied_page_size():
+    transport = ListingTransport(25)
+    entities = [record["entity"]["entity_id"] for record in crawler(transport).records()]
+    assert entities == [entity["entity_id"] for entity in transport.entities]
+    assert transport.pages == 3
+
+
+def test_records_include_authorizations():
+    records = list(EntityCrawler("http://registry.test", transport=ListingTransport(3), max_in_flight=2).records())
+    assert [record["status"] for record in records] == [200, 200, 200]
+    assert records[0]["authorizations"][0]["authorized"] is True
+
+
+def test_rejects_a_zero_page_limit():
+    with pytest.raises(CrawlError, match="page limit of 0"):
+        list(crawler(ListingTransport(25, reported_limit=0)).records())
+
+
+def test_rejects_an_empty_page_before_the_total():
+    with pytest.raises(CrawlError, match="returned no items before the reported total of 25"):
+        list(crawler(ListingTransport(25, empty_from=10)).records())
+
+
+def test_resumes_from_the_checkpoint(tmp_path):
+    output, checkpoint = tmp_path / "entities.jsonl", tmp_path / "entities.jsonl.checkpoint"
+    with pytest.raises(CrawlError):
+        crawl(crawler(ListingTransport(25, empty_from=20)), output, checkpoint, checkpoint_every=5)
+    assert json.loads(checkpoint.read_text())["written"] == 20
+
+    outcomes = crawl(crawler(ListingTransport(25)), output, checkpoint, checkpoint_every=5)
+    assert outcomes == {"listed": 5}
+    lines = [json.loads(line)["entity"]["entity_id"] for line in output.read_text().splitlines()]
+    assert lines == [f"did:example:{index:04}" for index in range(25)]
+
+
+def test_crawls_the_reference_registry(reference_registry, tmp_path):
+    output = tmp_path / "entities.jsonl"
+    crawler = EntityCrawler(reference_registry, transport=TrqpTransport(pool_size=8, stdlib=True), page_size=40)
+    outcomes = crawl(crawler, output, tmp_path / "entities.jsonl.checkpoint", checkpoint_every=50)
+    assert outcomes == {"200": REFERENCE_ENTITIES}
+    entity_ids = [json.loads(line)["entity"]["entity_id"] for line in output.read_text().splitlines()]
+    assert entity_ids == sorted(f"did:example:entity{index}" for index in range(REFERENCE_ENTITIES))
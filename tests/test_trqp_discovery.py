@@ -0,0 +1,101 @@
+"""Tests for TRQP endpoint discovery from DIDs."""
+
+import threading
+
+import pytest
+
+from trqp_discovery import DiscoveryError, EndpointDiscovery
+
+
+def document(*uris):
+    return {"service": [{"type": "TRQP", "serviceEndpoint": {"uri": uri}} for uri in uris]}
+
+
+DOCUMENTS = {
+    "did:test:ecosystem": document("did:test:registry"),
+    "did:test:registry": document("https://registry.example/"),
+    "did:test:loop-a": document("did:test:loop-b"),
+    "did:test:loop-b": document("did:test:loop-a"),
+    "did:test:no-service": {"service": []},
+}
+
+
+def test_follows_ecosystem_to_registry():
+    discovery = EndpointDiscovery(resolvers={"did:test:": DOCUMENTS.get})
+    assert discovery.discover("did:test:ecosystem") == "https://registry.example"
+    assert discovery.discover("did:test:ecosystem") == "https://registry.example"
+    assert discovery.resolutions == 2
+
+
+def test_registries_bypass_resolution():
+    discovery = EndpointDiscovery(registries={"did:test:other": "http://other.example/"})
+    assert discovery.discover("did:test:other") == "http://other.example"
+    assert discovery.resolutions == 0
+
+
+@pytest.mark.parametrize(
+    "did, message",
+    [
+        ("did:test:loop-a", "form a cycle"),
+        ("did:test:no-service", "No TRQP service"),
+        ("did:test:missing", "No TRQP service"),
+        ("did:unknown:x", "No DID resolver"),
+    ],
+)
+def test_failures(did, message):
+    discovery = EndpointDiscovery(resolvers={"did:test:": DOCUMENTS.get})
+    with pytest.raises(DiscoveryError, match=message):
+        discovery.discover(did)
+
+
+def test_cached_failures_raise_fresh_exceptions():
+    discovery = EndpointDiscovery(resolvers={"did:test:": DOCUMENTS.get})
+    raised = []
+    for _ in range(100):
+        try:
+            discovery.discover("did:test:no-service")
+        except DiscoveryError as ex:
+            raised.append(ex)
+    assert discovery.resolutions == 1
+    assert len({id(ex) for ex in raised}) == len(raised)
+    depth = 0
+    traceback = raised[-1].__traceback__
+    while traceback is not None:
+        depth, traceback = depth + 1, traceback.tb_next
+    assert depth <= 2
+
+
+def test_resolver_errors_are_not_cached_and_keep_their_cause():
+    calls = []
+
+    def broken(did):
+        calls.append(did)
+        raise RuntimeError("resolver down")
+
+    discovery = EndpointDiscovery(resolvers={"did:test:": broken})
+    for _ in range(2):
+        with pytest.raises(DiscoveryError, match="resolver down") as raised:
+            discovery.discover("did:test:ecosystem")
+        assert isinstance(raised.value.__cause__, RuntimeError)
+    assert len(calls) == 2
+
+
+def test_concurrent_lookups_resolve_once():
+    release = threading.Event()
+
+    def slow(did):
+        release.wait(5)
+        return DOCUMENTS.get(did)
+
+    discovery = EndpointDiscovery(resolvers={"did:test:": slow})
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(discovery.discover("did:test:registry"))) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["https://registry.example"] * 8
+    assert discovery.resolutions == 1
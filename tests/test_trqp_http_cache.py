@@ -0,0 +1,127 @@
+"""Tests for the HTTP cache of metadata and lookups."""
+
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from http.client import HTTPMessage
+
+from trqp_http_cache import CachingTransport, HttpCache, freshness_lifetime
+from trqp_instrument import Instrumentation
+from trqp_transport import HttpClientResponse
+
+URL = "http://registry.test/lookups/didMethods"
+
+
+class RecordingInstrumentation(Instrumentation):
+    active = True
+
+    def __init__(self):
+        self.outcomes = Counter()
+
+    def cache_outcome(self, endpoint, outcome):
+        self.outcomes[outcome] += 1
+
+
+class OriginTransport:
+    """A registry answering lookups with an ETag, logging one line per request to `log`."""
+
+    errors = (OSError,)
+
+    def __init__(self, log, delay=0.0, max_age=60):
+        self.log = log
+        self.delay = delay
+        self.max_age = max_age
+        self.instrumentation = RecordingInstrumentation()
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        with open(self.log, "a") as log:
+            log.write(f"{os.getpid()}\n")
+        time.sleep(self.delay)
+        if (headers or {}).get("If-None-Match") == '"v1"':
+            return HttpClientResponse(304, message(ETag='"v1"', Cache_Control=f"max-age={self.max_age}"), b"", url)
+        headers = message(ETag='"v1"', Cache_Control=f"max-age={self.max_age}", Content_Type="application/json")
+        return HttpClientResponse(200, headers, b'["did:web"]', url)
+
+    def close(self):
+        pass
+
+
+def message(**headers):
+    """Case-insensitive response headers, as http.client returns them."""
+    result = HTTPMessage()
+    for name, value in headers.items():
+        result[name.replace("_", "-")] = value
+    return result
+
+
+def fetches(log):
+    with open(log) as lines:
+        return len(lines.readlines())
+
+
+def test_freshness_lifetime():
+    assert freshness_lifetime({"cache-control": "max-age=60", "age": "10"}, 0, 300) == 50
+    assert freshness_lifetime({"cache-control": "no-store"}, 0, 300) is None
+    assert freshness_lifetime({"cache-control": "no-cache"}, 0, 300) == 0
+    headers = {"date": "Thu, 01 Jan 2026 00:00:00 GMT", "last-modified": "Wed, 31 Dec 2025 23:00:00 GMT"}
+    assert freshness_lifetime(headers, 0, 300) == 300
+
+
+def test_hit_then_revalidate(tmp_path):
+    log = tmp_path / "log"
+    clock = [1000.0]
+    origin = OriginTransport(log)
+    transport = CachingTransport(origin, HttpCache(clock=lambda: clock[0]))
+    assert transport.request("GET", URL).status_code == 200
+    assert transport.request("GET", URL).cache_outcome == "hit"
+    clock[0] += 61
+    response = transport.request("GET", URL)
+    assert (response.status_code, response.cache_outcome, response.content) == (200, "revalidated", b'["did:web"]')
+    assert fetches(log) == 2
+    assert origin.instrumentation.outcomes == {"miss": 1, "hit": 1, "revalidated": 1}
+
+
+def test_tokens_do_not_share_entries(tmp_path):
+    log = tmp_path / "log"
+    transport = CachingTransport(OriginTransport(log))
+    transport.request("GET", URL, headers={"Authorization": "Bearer a"})
+    transport.request("GET", URL, headers={"Authorization": "Bearer b"})
+    transport.request("GET", URL, headers={"Authorization": "Bearer a"})
+    assert fetches(log) == 2
+
+
+def test_waiting_requests_are_coalesced(tmp_path):
+    log = tmp_path / "log"
+    origin = OriginTransport(log, delay=0.2)
+    transport = CachingTransport(origin)
+    threads = [threading.Thread(target=transport.request, args=("GET", URL)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert fetches(log) == 1
+    assert origin.instrumentation.outcomes == {"miss": 1, "coalesced": 4}
+
+
+def cold_worker(path, log, start):
+    start.wait()
+    transport = CachingTransport(OriginTransport(log, delay=0.2), HttpCache(path))
+    assert transport.request("GET", URL).status_code == 200
+    transport.close()
+
+
+def test_processes_sharing_a_file_fetch_once(tmp_path):
+    log, path = tmp_path / "log", str(tmp_path / "cache.sqlite")
+    HttpCache(path).close()
+    context = multiprocessing.get_context("fork")
+    start = context.Event()
+    workers = [context.Process(target=cold_worker, args=(path, log, start)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(10)
+    assert [worker.exitcode for worker in workers] == [0] * 4
+    assert fetches(log) == 1
@@ -0,0 +1,97 @@
+"""Tests for the OpenMetrics exporter and its spans."""
+
+import io
+import json
+
+from trqp_cache import TrqpResponseCache
+from trqp_client import TrqpAuthorizationQuery, TrqpClient
+from trqp_instrument import NO_INSTRUMENTATION, MetricsExporter, RequestTiming
+from trqp_transport import TrqpTransport
+
+
+def timing(duration, status=200, error=None, endpoint="POST /authorization", **phases):
+    phases = {phase: phases.get(phase) for phase in ("dns", "connect", "tls", "ttfb", "body")}
+    new_connection = phases["connect"] is not None
+    return RequestTiming(
+        endpoint, "post", "https://registry.example/authorization", status, error, 1_000_000_000, duration,
+        new_connection, *phases.values(),
+    )
+
+
+def test_openmetrics_histograms_and_counters():
+    exporter = MetricsExporter(buckets=(0.01, 0.1))
+    exporter.request_finished(timing(0.01, connect=0.004, ttfb=0.005, body=0.001))
+    exporter.request_finished(timing(0.05, status=404, ttfb=0.05))
+    exporter.request_finished(timing(0.5, status=None, error=TimeoutError()))
+    exporter.cache_outcome('GET /entities/"x"', "hit")
+    exporter.retry("POST /authorization", 1, "503")
+    text = exporter.openmetrics()
+    lines = text.splitlines()
+
+    assert lines[-1] == "# EOF" and text.endswith("\n")
+    name = "trqp_client_request_duration_seconds"
+    assert f'{name}_bucket{{endpoint="POST /authorization",le="0.01"}} 1' in lines
+    assert f'{name}_bucket{{endpoint="POST /authorization",le="0.1"}} 2' in lines
+    assert f'{name}_bucket{{endpoint="POST /authorization",le="+Inf"}} 3' in lines
+    assert f'{name}_count{{endpoint="POST /authorization"}} 3' in lines
+    assert f'{name}_sum{{endpoint="POST /authorization"}} 0.56' in lines
+    phase = "trqp_client_request_phase_duration_seconds"
+    assert f'{phase}_count{{endpoint="POST /authorization",phase="ttfb"}} 2' in lines
+    assert f'{phase}_count{{endpoint="POST /authorization",phase="body"}} 1' in lines
+    assert not any('phase="dns"' in line for line in lines)
+
+    assert 'trqp_client_requests_total{endpoint="POST /authorization",status="200"} 1' in lines
+    assert 'trqp_client_requests_total{endpoint="POST /authorization",status="404"} 1' in lines
+    assert 'trqp_client_request_errors_total{endpoint="POST /authorization",error="TimeoutError"} 1' in lines
+    assert 'trqp_client_connections_opened_total{endpoint="POST /authorization"} 1' in lines
+    assert 'trqp_client_cache_lookups_total{endpoint="GET /entities/\\"x\\"",outcome="hit"} 1' in lines
+    assert 'trqp_client_retries_total{endpoint="POST /authorization",reason="503"} 1' in lines
+
+
+def test_spans_nest_the_phases_under_the_request():
+    spans_file = io.StringIO()
+    exporter = MetricsExporter(spans=spans_file)
+    exporter.request_finished(timing(0.01, connect=0.004, ttfb=0.005, body=0.001))
+    exporter.request_finished(timing(0.5, status=None, error=TimeoutError("slow")))
+    spans = [json.loads(line) for line in spans_file.getvalue().splitlines()]
+
+    request, connect, ttfb, body, failed = spans
+    assert request["kind"] == "CLIENT" and request["parent_span_id"] is None
+    assert request["attributes"]["http.response.status_code"] == 200
+    assert [span["name"] for span in (connect, ttfb, body)] == ["connect", "ttfb", "body"]
+    assert all(span["parent_span_id"] == request["span_id"] for span in (connect, ttfb, body))
+    assert {span["trace_id"] for span in (request, connect, ttfb, body)} == {request["trace_id"]}
+    assert connect["start_time_unix_nano"] == request["start_time_unix_nano"]
+    assert connect["end_time_unix_nano"] == ttfb["start_time_unix_nano"]
+    assert body["end_time_unix_nano"] == request["end_time_unix_nano"] == 1_010_000_000
+    assert failed["status"] == {"code": "ERROR", "message": "TimeoutError('slow')"}
+    assert "http.response.status_code" not in failed["attributes"]
+
+
+def test_transport_reports_phases_and_cache_outcomes(reference_registry, tmp_path):
+    exporter = MetricsExporter()
+    transport = TrqpTransport(instrumentation=exporter)
+    client = TrqpClient(reference_registry, transport=transport, cache=TrqpResponseCache())
+    query = TrqpAuthorizationQuery("did:example:entity1", "did:example:ecosystem", "issue", "credential")
+    assert client.query(query).status == 200
+    assert client.query(query).status == 200
+    transport.request("get", f"{reference_registry}/metadata")
+    transport.close()
+
+    assert sum(exporter.durations["POST /authorization"].counts) == 1
+    assert {phase for endpoint, phase in exporter.phases} == {"dns", "connect", "ttfb", "body"}
+    assert exporter.connections == {"POST /authorization": 1}
+    assert exporter.cache == {("POST /authorization", "miss"): 1, ("POST /authorization", "hit"): 1}
+    assert exporter.requests == {("POST /authorization", "200"): 1, ("GET /metadata", "200"): 1}
+
+    path = tmp_path / "trqp.prom"
+    exporter.write_openmetrics(path)
+    assert path.read_text() == exporter.openmetrics()
+    assert not (tmp_path / "trqp.prom.tmp").exists()
+
+
+def test_no_instrumentation_is_inactive():
+    assert NO_INSTRUMENTATION.active is False
+    NO_INSTRUMENTATION.request_finished(timing(0.01))
+    NO_INSTRUMENTATION.cache_outcome("POST /authorization", "hit")
+    NO_INSTRUMENTATION.retry("POST /authorization", 1, "503")
@@ -0,0 +1,140 @@
+"""Tests for load mode and the smoke test, run against the reference registry."""
+
+import os
+import subprocess
+import sys
+import time
+
+from trqp_async_transport import AsyncTrqpTransport
+from trqp_client import build_parc_payload
+from trqp_load import AsyncLoadRunner, LoadTarget, Pacer, run_load
+from trqp_schema import get_schema_registry
+from trqp_transport import HttpClientResponse, LatencySamples, TrqpTransport
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def targets(base_url):
+    schemas = get_schema_registry()
+    headers = {"Accept": "application/json", "Content-Type": "application/json"}
+    return [
+        LoadTarget(
+            "POST /authorization",
+            "post",
+            f"{base_url}/authorization",
+            headers,
+            build_parc_payload("did:example:entity7", "did:example:ecosystem", "issue", "credential"),
+            {200},
+            schemas.response_validator("queryAuthorization"),
+        ),
+        LoadTarget(
+            "GET /lookups/didMethods",
+            "get",
+            f"{base_url}/lookups/didMethods",
+            {"Accept": "application/json"},
+            None,
+            {200},
+            schemas.response_validator("lookupSupportedDIDMethods"),
+            {"authority_id": "did:example:ecosystem"},
+        ),
+    ]
+
+
+def run_script(*args):
+    return subprocess.run(
+        [sys.executable, "api_conformance_test.py", *args], cwd=HERE, capture_output=True, text=True, timeout=60
+    )
+
+
+class SlowTransport:
+    """Answers every request with a 200 after `delay` seconds."""
+
+    errors = (OSError,)
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def request(self, method, url, **kwargs):
+        time.sleep(self.delay)
+        return HttpClientResponse(200, {}, b"{}", url)
+
+
+def test_pacer_hands_out_sequence_numbers_until_the_deadline():
+    pacer = Pacer(0)
+    assert [pacer.wait(float("inf"))[0] for _ in range(3)] == [0, 1, 2]
+    assert pacer.wait(0) is None
+    assert not pacer.unsent(float("inf"))
+
+
+def test_pacer_never_skips_a_slot():
+    pacer = Pacer(1000)
+    time.sleep(0.02)
+    # Every slot is overdue: they are handed out at once, each with its own due time.
+    slots = [pacer.wait(float("inf")) for _ in range(3)]
+    assert [index for index, _ in slots] == [0, 1, 2]
+    assert [round((due - pacer.started) * 1000) for _, due in slots] == [0, 1, 2]
+    assert len(pacer.unsent(pacer.started + 0.01)) == 7
+
+
+def test_latency_counts_the_time_behind_schedule():
+    # One worker, 50 ms per request, 100 requests due per second: the run falls further behind with each request.
+    results, _ = run_load(SlowTransport(0.05), targets("http://registry.test")[:1], 1, duration=0.5, rate=100)
+    stats = results["POST /authorization"]
+    assert 8 <= stats.count <= 11
+    assert stats.count + stats.unsent == 50
+    assert stats.late >= stats.count - 1 + stats.unsent
+    assert stats.latencies.percentile(100) > 0.3
+
+
+def test_latency_samples_merge_stays_bounded():
+    first, second = LatencySamples(capacity=100), LatencySamples(capacity=100)
+    for value in range(60):
+        first.add(value)
+        second.add(value + 1000)
+    first.merge(second)
+    assert first.count == 120 and first.max == 1059 and len(first.samples) == 100
+    assert 30 <= sum(value >= 1000 for value in first.samples) <= 70
+
+
+def test_paced_load_against_the_reference_registry(reference_registry):
+    transport = TrqpTransport(pool_size=4, stdlib=True)
+    results, elapsed = run_load(transport, targets(reference_registry), concurrency=4, duration=1.0, rate=100)
+    counts = {name: stats.count for name, stats in results.items()}
+    assert 80 <= sum(counts.values()) <= 101
+    assert abs(counts["POST /authorization"] - counts["GET /lookups/didMethods"]) <= 1
+    for stats in results.values():
+        assert set(stats.outcomes) == {"200"} and not stats.errors
+    assert elapsed < 2
+    transport.close()
+
+
+def test_async_load_against_the_reference_registry(reference_registry):
+    runner = AsyncLoadRunner(AsyncTrqpTransport(max_per_host=8))
+    # Two runs on one runner reuse the pooled connections.
+    for _ in range(2):
+        results, elapsed = runner(targets(reference_registry), concurrency=8, duration=0.5, rate=400)
+        assert 180 <= sum(stats.count for stats in results.values()) <= 200
+        for stats in results.values():
+            assert set(stats.outcomes) == {"200"} and not stats.errors
+        assert elapsed < 1.5
+    assert runner.transport.connections_opened <= 8
+    runner.close()
+
+
+def test_smoke_test_passes_against_the_reference_registry(reference_registry):
+    result = run_script("--base-url", reference_registry)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_load_mode_against_the_reference_registry(reference_registry):
+    result = run_script("--base-url", reference_registry, "--load", "--duration", "1", "--concurrency", "4")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "LOAD TEST COMPLETED WITHOUT ERRORS." in result.stdout
+    assert "HTTP/1.1 (asyncio)" in result.stdout
+
+
+def test_threaded_load_mode_with_retries(reference_registry):
+    result = run_script("--base-url", reference_registry, "--load", "--duration", "0.5", "--retries", "1")
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "LOAD TEST COMPLETED WITHOUT ERRORS." in result.stdout
+    assert "HTTP/1.1 (asyncio)" not in result.stdout
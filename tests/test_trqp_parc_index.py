@@ -0,0 +1,114 @@
+"""Tests for the array-backed PARC authorization index, checked against a brute-force scan."""
+
+import random
+
+import pytest
+
+import trqp_parc_index
+from trqp_parc_index import NEG_INF, POS_INF, ParcIndex, merge_intervals
+
+AUTHORITIES = ("did:example:eco-a", "did:example:eco-b")
+SCOPES = [(authority, action, "credential") for authority in AUTHORITIES for action in ("issue", "verify")]
+FILTERS = [(None, None, None), (AUTHORITIES[0], None, None), (None, "issue", "credential"), SCOPES[3]]
+
+
+def random_records(seed, count=400):
+    generator = random.Random(seed)
+    records = []
+    for _ in range(count):
+        method = generator.choice(("example", "web", "key"))
+        entity_id = f"did:{method}:{generator.randrange(60):03}"
+        start = generator.choice((NEG_INF, generator.randrange(100)))
+        end = generator.choice((POS_INF, start + generator.randrange(1, 30) if start != NEG_INF else 50))
+        records.append((entity_id, *generator.choice(SCOPES), start, end))
+    return records
+
+
+def build(records):
+    index = ParcIndex()
+    for record in records:
+        index.add(*record)
+    index.build()
+    return index
+
+
+def expected_entities(records, scope_filter, at):
+    authority_id, action, resource = scope_filter
+    return sorted(
+        {
+            entity_id
+            for entity_id, record_authority, record_action, record_resource, start, end in records
+            if authority_id in (None, record_authority)
+            and action in (None, record_action)
+            and resource in (None, record_resource)
+            and (at is None or start <= at < end)
+        }
+    )
+
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    # Small blocks, so that paging crosses many of them, and small sort chunks, so that build() merges several.
+    monkeypatch.setattr(trqp_parc_index, "BLOCK_SIZE", 8)
+    monkeypatch.setattr(trqp_parc_index, "SORT_CHUNK", 64)
+
+
+def test_merge_intervals():
+    triples = [(1, 0, 5), (1, 5, 8), (1, 10, 12), (2, 0, 3), (2, 1, 2)]
+    assert list(merge_intervals(triples)) == [(1, 0, 8), (1, 10, 12), (2, 0, 3)]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_holds_matches_a_scan(seed):
+    records = random_records(seed)
+    index = build(records)
+    entity_ids = sorted({record[0] for record in records}) + ["did:example:unknown"]
+    for at in (-1, 0, 17, 49.5, 50, 99, 1000):
+        for entity_id in entity_ids:
+            for scope in SCOPES:
+                expected = any(
+                    record[:4] == (entity_id, *scope) and record[4] <= at < record[5] for record in records
+                )
+                assert index.holds(entity_id, *scope, at) == expected, (entity_id, scope, at)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_listings_match_a_scan(seed):
+    records = random_records(seed)
+    index = build(records)
+    for scope_filter in FILTERS:
+        for at in (None, -1, 10, 50, 120):
+            expected = expected_entities(records, scope_filter, at)
+            listed = []
+            for offset in range(0, len(expected) + 7, 7):
+                page, total = index.list_entities(*scope_filter, at=at, limit=7, offset=offset)
+                assert total == len(expected)
+                listed += [summary["entity_id"] for summary in page]
+            assert listed == expected, (scope_filter, at)
+
+
+def test_unknown_filters_and_entities():
+    index = build(random_records(0))
+    assert index.list_entities("did:example:nobody") == ([], 0)
+    assert index.entity_summary("did:example:nobody") is None
+    assert index.entity_scopes("did:example:nobody") == []
+    with pytest.raises(RuntimeError, match="read-only"):
+        index.add("did:example:late", *SCOPES[0])
+
+
+def test_summaries_scopes_and_did_methods():
+    index = ParcIndex()
+    index.add("did:web:b.example", *SCOPES[0], name="B")
+    index.add("did:web:b.example", *SCOPES[1], 0, 10)
+    index.add("did:key:z6Mk", *SCOPES[2])
+    index.add("not-a-did", *SCOPES[2])
+    index.build()
+    assert index.entity_summary("did:web:b.example") == {
+        "entity_id": "did:web:b.example",
+        "authority_id": AUTHORITIES[0],
+        "name": "B",
+    }
+    assert index.entity_scopes("did:web:b.example") == [SCOPES[0], SCOPES[1]]
+    assert index.entity_scopes("did:web:b.example", at=20) == [SCOPES[0]]
+    assert index.entity_count() == 3 and index.entity_count(AUTHORITIES[1]) == 2
+    assert index.did_methods() == {AUTHORITIES[0]: ["did:web"], AUTHORITIES[1]: ["did:key"]}
@@ -0,0 +1,157 @@
+"""Tests for the reference Trust Registry's routes and its HTTP/1.1 server."""
+
+import argparse
+import http.client
+import json
+from urllib.parse import urlsplit
+
+import pytest
+
+from trqp_reference_server import MAX_BODY_SIZE, ReferenceRegistry, build_metadata
+from trqp_store import ParcStore
+
+RECORDS = [
+    {
+        "entity_id": "did:example:issuer",
+        "authority_id": "did:example:eco",
+        "action": "issue",
+        "resource": "credential",
+        "valid_from": "2024-01-01T00:00:00Z",
+        "valid_until": "2025-01-01T00:00:00Z",
+        "name": "Issuer",
+        "assurance_level": "LOA2",
+    },
+    {
+        "entity_id": "did:web:verifier.example",
+        "authority_id": "did:example:eco",
+        "action": "verify",
+        "resource": "credential",
+    },
+    {
+        "type": "recognition",
+        "entity_id": "did:example:trust-registry",
+        "authority_id": "did:example:eco",
+        "action": "recognize",
+        "resource": "trust-registry",
+    },
+]
+
+
+def query(entity_id="did:example:issuer", action="issue", at=None, authority_id="did:example:eco"):
+    body = {"entity_id": entity_id, "authority_id": authority_id, "action": action, "resource": "credential"}
+    if at:
+        body["context"] = {"time": at}
+    return json.dumps(body).encode()
+
+
+@pytest.fixture
+def registry():
+    store = ParcStore()
+    for record in RECORDS:
+        store.add(record)
+    store.build_indexes()
+    metadata = build_metadata(argparse.Namespace(registry_id="did:example:trust-registry"), store)
+    return ReferenceRegistry(store, metadata, loaded_at=1700000000)
+
+
+def test_authorization_is_decided_at_the_query_time(registry):
+    status, body = registry.handle("POST", "/authorization", {}, query(at="2024-06-01T00:00:00Z"))
+    assert status == 200 and body["authorized"] is True
+    assert body["time_requested"] == "2024-06-01T00:00:00Z"
+    status, body = registry.handle("POST", "/authorization", {}, query(at="2025-06-01T00:00:00Z"))
+    assert status == 200 and body["authorized"] is False and body["message"]
+    status, body = registry.handle("POST", "/recognition", {}, query("did:example:trust-registry", "recognize"))
+    assert status == 200 and body["recognized"] is False
+
+
+def test_malformed_queries_are_problems(registry):
+    assert registry.handle("POST", "/authorization", {}, b"{")[0] == 400
+    assert registry.handle("POST", "/authorization", {}, b"[]")[0] == 400
+    status, body = registry.handle("POST", "/authorization", {}, json.dumps({"entity_id": "did:example:issuer"}))
+    assert status == 400 and "'authority_id'" in body["detail"]
+    assert registry.handle("POST", "/authorization", {}, query("did:example:nobody"))[0] == 404
+    assert registry.handle("POST", "/nothing", {}, query())[0] == 404
+    assert registry.handle("DELETE", "/authorization", {}, b"")[0] == 405
+
+
+def test_listings_page_and_filter(registry):
+    status, page = registry.handle("GET", "/entities?limit=1", {}, b"")
+    assert status == 200 and page["pagination"] == {"limit": 1, "offset": 0, "total": 2}
+    assert [item["entity_id"] for item in page["items"]] == ["did:example:issuer"]
+    filters = "authority_id=did:example:eco&action=verify&resource=credential"
+    _, page = registry.handle("GET", f"/entities?{filters}", {}, b"")
+    assert [item["entity_id"] for item in page["items"]] == ["did:web:verifier.example"]
+    assert registry.handle("GET", "/entities?action=issue", {}, b"")[0] == 400
+    assert registry.handle("GET", "/entities?limit=0", {}, b"")[0] == 400
+    assert registry.handle("GET", "/entities?authority_id=did:example:other", {}, b"")[0] == 404
+
+
+def test_entity_and_ecosystem_routes(registry):
+    status, entity = registry.handle("GET", "/entities/did%3Aexample%3Aissuer", {}, b"")
+    assert status == 200 and entity["authorizations"] == [
+        {"authority_id": "did:example:eco", "action": "issue", "resource": "credential"}
+    ]
+    _, held = registry.handle("GET", "/entities/did:example:issuer/authorizations?time=2024-06-01T00:00:00Z", {}, b"")
+    assert [item["action"] for item in held] == ["issue"]
+    assert registry.handle("GET", "/entities/did:example:issuer/authorizations", {}, b"")[1] == []
+    assert registry.handle("GET", "/entities/did:example:nobody", {}, b"")[0] == 404
+
+    _, ecosystem = registry.handle("GET", "/ecosystems/did:example:eco", {}, b"")
+    assert ecosystem["entity_count"] == 2
+    _, recognitions = registry.handle("GET", "/ecosystems/did:example:eco/recognitions", {}, b"")
+    assert [item["entity_id"] for item in recognitions] == ["did:example:trust-registry"]
+    assert registry.handle("GET", "/ecosystems/did:example:other/recognitions", {}, b"")[0] == 404
+
+
+def test_lookups_and_metadata(registry):
+    assert registry.handle("GET", "/metadata", {}, b"")[1]["authority_id"] == "did:example:eco"
+    assert registry.handle("GET", "/lookups/didMethods", {}, b"")[1] == [
+        {"identifier": "did:example", "authority_id": "did:example:eco"},
+        {"identifier": "did:web", "authority_id": "did:example:eco"},
+    ]
+    assert registry.handle("GET", "/lookups/assuranceLevels", {}, b"")[1][0]["assurance_level"] == "LOA2"
+    assert registry.handle("GET", "/lookups/authorizations?authority_id=did:example:eco", {}, b"")[1] == [
+        {"action": "issue", "resource": "credential"},
+        {"action": "verify", "resource": "credential"},
+    ]
+
+
+def test_bearer_token_is_required_when_configured(registry):
+    registry.bearer_token = "secret"
+    assert registry.handle("GET", "/metadata", {}, b"")[0] == 401
+    assert registry.handle("GET", "/metadata", {"authorization": "Bearer secret"}, b"")[0] == 200
+
+
+def test_conditional_requests_get_a_304(registry):
+    status, payload, lines = registry.cache_validators("/metadata", {}, registry.metadata)
+    assert status == 200 and json.loads(payload) == registry.metadata
+    etag = lines.split("ETag: ")[1].split("\r\n")[0]
+    assert registry.cache_validators("/metadata", {"if-none-match": f"W/{etag}"}, registry.metadata)[0] == 304
+    since = {"if-modified-since": "Wed, 15 Nov 2023 00:00:00 GMT"}
+    assert registry.cache_validators("/metadata", since, registry.metadata)[0] == 304
+    assert registry.cache_validators("/entities", since, {})[1] == {}
+
+
+def test_serves_keep_alive_connections(reference_registry):
+    connection = http.client.HTTPConnection(urlsplit(reference_registry).netloc, timeout=5)
+    connection.request("GET", "/metadata")
+    first = connection.getresponse()
+    etag = first.getheader("ETag")
+    assert first.status == 200 and json.loads(first.read())["id"] == "did:example:trust-registry"
+    connection.request("GET", "/metadata", headers={"If-None-Match": etag})
+    second = connection.getresponse()
+    assert second.status == 304 and second.read() == b""
+    connection.request("POST", "/authorization", query("did:example:entity3", authority_id="did:example:ecosystem"))
+    third = connection.getresponse()
+    assert third.status == 200 and json.loads(third.read())["authorized"] is True
+    connection.close()
+
+
+def test_rejects_oversized_bodies(reference_registry):
+    connection = http.client.HTTPConnection(urlsplit(reference_registry).netloc, timeout=5)
+    connection.putrequest("POST", "/authorization")
+    connection.putheader("Content-Length", str(MAX_BODY_SIZE + 1))
+    connection.endheaders()
+    response = connection.getresponse()
+    assert response.status == 413 and response.getheader("Connection") == "close"
+    connection.close()
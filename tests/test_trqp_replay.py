@@ -0,0 +1,71 @@
+"""Tests for JSON Lines query replay and PARC query parsing."""
+
+import io
+import json
+
+import pytest
+
+from trqp_client import TrqpAuthorizationQuery, TrqpClient
+from trqp_replay import parse_query_line, replay_file
+from trqp_transport import HttpClientResponse
+
+
+class EchoTransport:
+    """Answers every query with a positive TRQP response for the same PARC tuple."""
+
+    errors = (OSError,)
+
+    class instrumentation:
+        active = False
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        body = {key: value for key, value in kwargs["json"].items() if key != "context"}
+        body["recognized" if url.endswith("/recognition") else "authorized"] = True
+        body["time_evaluated"] = "2026-01-01T00:00:00Z"
+        return HttpClientResponse(200, {}, json.dumps(body).encode(), url)
+
+
+QUERY = {"entity_id": "did:example:a", "authority_id": "did:example:eco", "action": "issue", "resource": "vc"}
+
+
+def test_from_payload_sorts_context():
+    query = TrqpAuthorizationQuery.from_payload({**QUERY, "context": {"time": "t", "a": "b"}})
+    assert query.context == (("a", "b"), ("time", "t"))
+    assert query.payload()["context"] == {"a": "b", "time": "t"}
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("[1, 2]", "Expected a JSON object"),
+        (json.dumps({**QUERY, "type": "bogus"}), "Unknown query type"),
+        (json.dumps({**QUERY, "type": ["authorization"]}), "Unknown query type"),
+        (json.dumps({**QUERY, "context": "x"}), "'context' must be an object"),
+        (json.dumps({**QUERY, "context": {"time": 5}}), "'context' must be an object"),
+        (json.dumps({**QUERY, "entity_id": {"id": 1}}), "must be strings"),
+        (json.dumps({key: value for key, value in QUERY.items() if key != "action"}), "Missing 'action'"),
+        ("{not json", "Expecting property name"),
+    ],
+)
+def test_parse_query_line_rejects_bad_lines(line, message):
+    with pytest.raises(ValueError, match=message):
+        parse_query_line(line)
+
+
+def test_bad_lines_become_error_records():
+    lines = [
+        json.dumps(QUERY),
+        json.dumps({**QUERY, "context": "x"}),
+        "",
+        json.dumps({**QUERY, "type": "recognition", "entity_id": "did:example:b"}),
+    ]
+    output = io.StringIO()
+    client = TrqpClient("http://registry.test", transport=EchoTransport())
+    outcomes = replay_file(client, io.StringIO("\n".join(lines) + "\n"), output, max_in_flight=2)
+
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [record["line"] for record in records] == [1, 2, 4]
+    assert records[0]["status"] == 200 and "error" not in records[0]
+    assert records[1]["error"].startswith("Invalid query: 'context' must be an object")
+    assert records[2]["type"] == "recognition"
+    assert outcomes["200"] == 2
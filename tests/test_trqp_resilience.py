@@ -0,0 +1,203 @@
+"""Tests for retries, hedging and circuit breaking in ResilientTransport."""
+
+import threading
+import time
+
+import pytest
+
+from trqp_instrument import NO_INSTRUMENTATION
+from trqp_resilience import CircuitBreaker, CircuitOpenError, ResilientTransport, retry_after
+from trqp_transport import HttpClientResponse
+
+URL = "http://registry.test/authorization"
+
+
+class ScriptedTransport:
+    """Answers each request with the next status, response or exception of a script."""
+
+    errors = (OSError,)
+    instrumentation = NO_INSTRUMENTATION
+
+    def __init__(self, *script, delay=0):
+        self.script = list(script)
+        self.delay = delay
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        with self.lock:
+            self.sent += 1
+            outcome = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        delay = outcome[1] if isinstance(outcome, tuple) else self.delay
+        outcome = outcome[0] if isinstance(outcome, tuple) else outcome
+        time.sleep(delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        if isinstance(outcome, int):
+            return HttpClientResponse(outcome, {}, b"{}", url)
+        return outcome
+
+    def close(self):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def resilient(transport, **options):
+    sleeps = []
+    options.setdefault("failure_threshold", 0)
+    return ResilientTransport(transport, sleep=sleeps.append, **options), sleeps
+
+
+def test_retries_until_success():
+    transport, sleeps = resilient(ScriptedTransport(503, OSError("reset"), 200))
+    assert transport.request("POST", URL).status_code == 200
+    assert len(sleeps) == 2
+    assert transport.stats()["retries"] == 2
+
+
+def test_gives_up_after_max_attempts():
+    transport, _ = resilient(ScriptedTransport(503), max_attempts=3)
+    assert transport.request("POST", URL).status_code == 503
+    assert transport.transport.sent == 3
+
+    transport, _ = resilient(ScriptedTransport(OSError("down")), max_attempts=2)
+    with pytest.raises(OSError):
+        transport.request("POST", URL)
+    assert transport.transport.sent == 2
+
+
+@pytest.mark.parametrize("status", [200, 400, 404, 500, 501])
+def test_does_not_retry_other_statuses(status):
+    transport, sleeps = resilient(ScriptedTransport(status))
+    assert transport.request("POST", URL).status_code == status
+    assert transport.transport.sent == 1 and sleeps == []
+
+
+def test_retry_after_sets_the_wait():
+    limited = HttpClientResponse(429, {"Retry-After": "2"}, b"", URL)
+    transport, sleeps = resilient(ScriptedTransport(limited, 200), base_delay=0.001)
+    assert transport.request("POST", URL).status_code == 200
+    assert sleeps == [2.0]
+
+    too_long = HttpClientResponse(429, {"Retry-After": "120"}, b"", URL)
+    transport, sleeps = resilient(ScriptedTransport(too_long, 200))
+    assert transport.request("POST", URL).status_code == 429
+    assert sleeps == []
+
+
+def test_retry_after_parses_http_dates():
+    response = HttpClientResponse(503, {"Retry-After": "Thu, 01 Jan 2026 00:00:10 GMT"}, b"", URL)
+    assert retry_after(response, now=1767225600.0) == 10.0
+    assert retry_after(HttpClientResponse(503, {"Retry-After": "soon"}, b"", URL)) is None
+
+
+def test_breaker_opens_then_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record(False)
+    assert breaker.state == "closed"
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow() and breaker.state == "half-open"
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_breaker_counts_only_failures():
+    transport, _ = resilient(ScriptedTransport(501), max_attempts=1, failure_threshold=2)
+    for _ in range(5):
+        assert transport.request("GET", URL).status_code == 501
+    assert transport.stats()["open circuits"] == 0
+
+    transport, _ = resilient(ScriptedTransport(500), max_attempts=1, failure_threshold=2)
+    for _ in range(2):
+        transport.request("GET", URL)
+    with pytest.raises(CircuitOpenError):
+        transport.request("GET", URL)
+    assert transport.transport.sent == 2
+    assert transport.stats()["circuit-open rejections"] == 1
+
+
+def test_breaker_counts_requests_not_attempts():
+    transport, _ = resilient(ScriptedTransport(503, 503, 200), max_attempts=3, failure_threshold=2)
+    for _ in range(3):
+        transport.transport.script = [503, 503, 200]
+        assert transport.request("GET", URL).status_code == 200
+    assert transport.stats()["open circuits"] == 0
+
+    # Each request uses up its three attempts, but counts as one failure.
+    transport.transport.script = [OSError("down")]
+    with pytest.raises(OSError):
+        transport.request("GET", URL)
+    assert transport.stats()["open circuits"] == 0
+    with pytest.raises(OSError):
+        transport.request("GET", URL)
+    assert transport.stats()["open circuits"] == 1
+    assert transport.transport.sent == 9 + 6
+
+
+def test_half_open_trial_keeps_its_retries():
+    transport, _ = resilient(ScriptedTransport(500), max_attempts=3, failure_threshold=1, reset_timeout=0.05)
+    transport.request("GET", URL)
+    breaker = next(iter(transport.breakers.values()))
+    assert breaker.state == "open"
+
+    # The trial's failed first attempt must not reopen the circuit under its own retry.
+    time.sleep(0.05)
+    transport.transport.script = [503, 200]
+    assert transport.request("GET", URL).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_unexpected_error_does_not_wedge_the_trial():
+    transport, _ = resilient(ScriptedTransport(OSError("down")), max_attempts=1, failure_threshold=1, reset_timeout=0)
+    with pytest.raises(OSError):
+        transport.request("GET", URL)
+    breaker = next(iter(transport.breakers.values()))
+
+    transport.transport.script = [ValueError("bug"), 200]
+    with pytest.raises(ValueError):
+        transport.request("GET", URL)
+    assert not breaker.trial
+    assert transport.request("GET", URL).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_hedges_slow_requests():
+    transport, _ = resilient(ScriptedTransport(200), hedge_percentile=50, hedge_min_samples=16, max_hedge_ratio=1)
+    for _ in range(16):
+        transport.request("POST", URL)
+    # The next request stalls; the hedge behind it answers at once.
+    transport.transport.script = [(200, 1.0), 200]
+    started = time.perf_counter()
+    assert transport.request("POST", URL).status_code == 200
+    assert time.perf_counter() - started < 0.5
+    assert transport.stats()["hedges"] == 1
+    assert transport.stats()["hedge wins"] == 1
+    transport.close()
+
+
+def test_hedges_are_capped():
+    transport, _ = resilient(
+        ScriptedTransport(200, delay=0.01), hedge_percentile=1, hedge_min_samples=16, max_hedge_ratio=0.1
+    )
+    for _ in range(116):
+        transport.request("POST", URL)
+    # One token to start with, plus a tenth of a token per request; only the last 100 can be hedged.
+    assert transport.stats()["hedges"] <= 11
+    transport.close()
@@ -0,0 +1,100 @@
+"""Tests for the schema compiler, against the schemas of the Ayra profile."""
+
+import argparse
+import json
+import sys
+
+import pytest
+
+from trqp_reference_server import ReferenceRegistry, build_metadata
+from trqp_schema import NO_ERRORS, SchemaRegistry
+from trqp_store import ParcStore
+
+AUTHORIZATION = {
+    "entity_id": "did:example:issuer",
+    "authority_id": "did:example:eco",
+    "action": "issue",
+    "resource": "credential",
+    "authorized": True,
+    "time_requested": "2024-06-01T00:00:00Z",
+    "time_evaluated": "2024-06-01T00:00:01.5+02:00",
+}
+
+
+@pytest.fixture(scope="module")
+def schemas():
+    return SchemaRegistry()
+
+
+def test_every_profile_schema_compiles(schemas):
+    for name in schemas.schemas:
+        assert schemas.validator(name) is schemas.validator(name)
+    for operation_id, operation in schemas.operations.items():
+        for status, response in operation["responses"].items():
+            if "application/json" in response.get("content", {}):
+                assert callable(schemas.response_validator(operation_id, int(status)))
+
+
+def test_reference_registry_responses_are_valid(schemas):
+    store = ParcStore()
+    store.add({"entity_id": "did:example:issuer", "authority_id": "did:example:eco", "action": "issue",
+               "resource": "credential", "name": "Issuer", "assurance_level": "LOA2"})
+    store.build_indexes()
+    metadata = build_metadata(argparse.Namespace(registry_id="did:example:trust-registry"), store)
+    registry = ReferenceRegistry(store, metadata, loaded_at=1700000000)
+    query = {"entity_id": "did:example:issuer", "authority_id": "did:example:eco", "action": "issue",
+             "resource": "credential"}
+    requests = [
+        ("queryAuthorization", "POST", "/authorization", json.dumps(query).encode()),
+        ("getTrustRegistryMetadata", "GET", "/metadata", b""),
+        ("listEntities", "GET", "/entities", b""),
+        ("getEntityInformation", "GET", "/entities/did:example:issuer", b""),
+        ("lookupSupportedAssuranceLevels", "GET", "/lookups/assuranceLevels", b""),
+        ("lookupSupportedDIDMethods", "GET", "/lookups/didMethods", b""),
+    ]
+    for operation_id, method, path, body in requests:
+        status, data = registry.handle(method, path, {}, body)
+        assert status == 200
+        assert schemas.response_validator(operation_id)(data) == NO_ERRORS, operation_id
+
+
+def test_errors_name_the_offending_path(schemas):
+    validate = schemas.response_validator("queryAuthorization")
+    assert validate(AUTHORIZATION) == NO_ERRORS
+    errors = validate({**AUTHORIZATION, "authorized": "yes", "time_evaluated": "yesterday"})
+    assert "$.authorized: expected boolean, got str" in errors
+    assert "$.time_evaluated: 'yesterday' is not a valid date-time" in errors
+    assert validate({key: value for key, value in AUTHORIZATION.items() if key != "action"}) == [
+        "$: missing required property 'action'"
+    ]
+    assert validate([]) == ["$: expected object, got list"]
+
+    page = {"items": [{"entity_id": 7}], "pagination": {"limit": 10, "offset": 0, "total": True}}
+    errors = schemas.response_validator("listEntities")(page)
+    assert "$.items[0].entity_id: expected string, got int" in errors
+    assert "$.pagination.total: expected integer, got bool" in errors
+
+
+def test_unsupported_keywords_are_rejected(tmp_path):
+    (tmp_path / "schema").mkdir()
+    schema = {"type": "string", "pattern": "^did:"}
+    (tmp_path / "schema" / "did.schema.json").write_text(json.dumps(schema))
+    with pytest.raises(ValueError, match="Unsupported schema keywords: \\['pattern'\\]"):
+        SchemaRegistry(tmp_path).validator("did")
+
+
+def test_validation_is_skipped_without_the_profile(tmp_path, capsys):
+    schemas = SchemaRegistry(tmp_path)
+    assert schemas.response_validator("queryAuthorization")({"authorized": "yes"}) == NO_ERRORS
+    assert schemas.response_validator("listEntities")([]) == NO_ERRORS
+    warning = capsys.readouterr().err
+    assert warning.count("Warning:") == 1 and "trqp_ayra_profile_swagger.yaml was not found" in warning
+
+
+def test_validation_is_skipped_without_pyyaml(monkeypatch, capsys):
+    monkeypatch.setitem(sys.modules, "yaml", None)
+    schemas = SchemaRegistry()
+    assert schemas.response_validator("queryAuthorization")({}) == NO_ERRORS
+    assert "requires PyYAML" in capsys.readouterr().err
+    # The JSON schemas in the repository need no PyYAML.
+    assert schemas.validator("trqp_authorization_response")({}) != NO_ERRORS
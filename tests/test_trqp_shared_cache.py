@@ -0,0 +1,141 @@
+"""Tests for the memory-mapped response cache shared between processes."""
+
+import multiprocessing
+
+import pytest
+
+from trqp_cache import MISSING
+from trqp_shared_cache import SEQUENCE, SLOT_HEADER, SharedResponseCache, key_bytes, key_hash, shared_resolver
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def key(entity_id):
+    return ("http://registry.test", "/authorization", entity_id, "did:example:eco", "issue", "credential", ())
+
+
+def slot_of(cache, cache_key):
+    encoded = key_bytes(cache_key)
+    hashed = key_hash(encoded)
+    return next(offset for offset in cache.bucket(hashed) if cache.read(offset, hashed, encoded) is not None)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "responses.cache")
+
+
+def test_processes_opening_one_file_share_entries(path):
+    writer, reader = SharedResponseCache(path, slots=64), SharedResponseCache(path, slots=64)
+    writer.put(key("did:example:a"), (200, {"authorized": True}), 60)
+    assert reader.get(key("did:example:a")) == (200, {"authorized": True})
+    assert reader.get(key("did:example:b")) is MISSING
+    assert reader.invalidate_entities(["did:example:a"]) == 1
+    assert writer.get(key("did:example:a")) is MISSING
+    writer.close()
+    reader.close()
+
+
+def test_entries_expire(path):
+    clock = Clock()
+    cache = SharedResponseCache(path, slots=64, clock=clock)
+    cache.put(key("did:example:a"), (200, {}), 60)
+    cache.put(key("did:example:b"), (200, {}), None)
+    clock.now += 60
+    assert cache.get(key("did:example:a")) is MISSING
+    assert cache.get(key("did:example:b")) == (200, {})
+    assert cache.stats()["expirations"] == 1 and cache.stats()["entries"] == 1
+
+
+def test_full_buckets_evict_the_oldest_entry(path):
+    clock = Clock()
+    cache = SharedResponseCache(path, slots=8, clock=clock)
+    for index in range(9):
+        clock.now += 1
+        cache.put(key(f"did:example:{index}"), (200, index), 60)
+    assert cache.get(key("did:example:0")) is MISSING
+    assert [cache.get(key(f"did:example:{index}")) for index in range(1, 9)] == [(200, index) for index in range(1, 9)]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_values_that_cannot_be_stored_are_rejected(path):
+    cache = SharedResponseCache(path, slots=8, slot_size=128)
+    cache.put(key("did:example:big"), (200, "x" * 200), 60)
+    cache.put(key("did:example:object"), (200, object()), 60)
+    assert cache.get(key("did:example:big")) is MISSING
+    assert cache.stats()["rejected"] == 2
+
+
+def test_geometry_must_match(path):
+    SharedResponseCache(path, slots=64).close()
+    with pytest.raises(ValueError, match="not a shared cache with 128 slots"):
+        SharedResponseCache(path, slots=128)
+    with pytest.raises(ValueError, match="multiple of 8"):
+        SharedResponseCache(path, slots=12)
+
+
+def test_slots_being_written_or_corrupted_read_as_misses(path):
+    cache = SharedResponseCache(path, slots=64)
+    cache.put(key("did:example:a"), (200, {"authorized": True}), 60)
+    offset = slot_of(cache, key("did:example:a"))
+    sequence = SEQUENCE.unpack_from(cache.map, offset)[0]
+
+    # An odd sequence number means a writer is part way through the slot.
+    SEQUENCE.pack_into(cache.map, offset, sequence + 1)
+    assert cache.get(key("did:example:a")) is MISSING
+    SEQUENCE.pack_into(cache.map, offset, sequence)
+    assert cache.get(key("did:example:a")) == (200, {"authorized": True})
+
+    # A torn value fails its checksum.
+    last = offset + SLOT_HEADER.size + len(key_bytes(key("did:example:a")))
+    cache.map[last] ^= 0xFF
+    assert cache.get(key("did:example:a")) is MISSING
+
+    # The next write recovers a slot left odd by a writer that died.
+    SEQUENCE.pack_into(cache.map, offset, sequence + 1)
+    cache.put(key("did:example:a"), (200, {"authorized": False}), 60)
+    assert cache.get(key("did:example:a")) == (200, {"authorized": False})
+    assert SEQUENCE.unpack_from(cache.map, offset)[0] % 2 == 0
+
+
+def rewrite(path, rounds):
+    cache = SharedResponseCache(path, slots=64)
+    for index in range(rounds):
+        cache.put(key("did:example:hot"), (index, str(index) * (index % 50)), 60)
+    cache.close()
+
+
+def test_readers_never_see_a_torn_entry(path):
+    cache = SharedResponseCache(path, slots=64)
+    writer = multiprocessing.get_context("fork").Process(target=rewrite, args=(path, 20000))
+    writer.start()
+    seen = 0
+    while writer.is_alive() or not seen:
+        value = cache.get(key("did:example:hot"))
+        if value is not MISSING:
+            index, text = value
+            assert text == str(index) * (index % 50)
+            seen += 1
+    writer.join()
+    assert writer.exitcode == 0
+    assert cache.get(key("did:example:hot"))[0] == 19999
+
+
+def test_shared_resolver_resolves_each_did_once(path):
+    calls = []
+
+    def resolve(did):
+        calls.append(did)
+        return {"id": did, "service": ({"type": "TRQP"},)} if did != "did:example:missing" else None
+
+    first = shared_resolver(resolve, SharedResponseCache(path, slots=64))
+    second = shared_resolver(resolve, SharedResponseCache(path, slots=64))
+    assert first("did:example:a") == second("did:example:a") == {"id": "did:example:a", "service": [{"type": "TRQP"}]}
+    assert first("did:example:missing") is None and second("did:example:missing") is None
+    assert calls == ["did:example:a", "did:example:missing", "did:example:missing"]
@@ -0,0 +1,95 @@
+"""Tests for crawl snapshots and the streaming diff between two of them."""
+
+import json
+
+import pytest
+
+import trqp_snapshot
+from trqp_snapshot import Snapshot, build_snapshot, diff_snapshots, snapshot_line
+
+
+def authorization(action, authorized=True, evaluated="2026-01-01T00:00:00Z"):
+    return {
+        "authority_id": "did:example:eco",
+        "action": action,
+        "resource": "credential",
+        "authorized": authorized,
+        "time_evaluated": evaluated,
+    }
+
+
+def record(entity_id, *authorizations, status=200, name=None):
+    entity = {"entity_id": entity_id, **({"name": name} if name else {})}
+    return {"entity": entity, "status": status, "authorizations": list(authorizations)}
+
+
+def write_crawl(path, records):
+    with open(path, "w", encoding="utf-8") as crawl:
+        for item in records:
+            crawl.write(json.dumps(item) + "\n")
+    return path
+
+
+@pytest.fixture(autouse=True)
+def small_index_stride(monkeypatch):
+    monkeypatch.setattr(trqp_snapshot, "INDEX_STRIDE", 4)
+
+
+def test_volatile_fields_and_order_do_not_change_the_digest():
+    first = snapshot_line(record("did:example:a", authorization("issue"), authorization("verify")))
+    second = snapshot_line(
+        record("did:example:a", authorization("verify", evaluated="2027-01-01T00:00:00Z"), authorization("issue"))
+    )
+    assert first == second
+    assert snapshot_line(record("did:example:a", authorization("issue", False))) != first
+    with pytest.raises(ValueError, match="control character"):
+        snapshot_line(record("did:example:\n"))
+
+
+def test_build_sorts_deduplicates_and_indexes(tmp_path):
+    entity_ids = [f"did:example:{index:03}" for index in range(30)]
+    # Out of order, with one entity listed twice, and more lines than one sort run holds.
+    records = [record(entity_id) for entity_id in reversed(entity_ids)] + [record(entity_ids[5])]
+    crawl = write_crawl(tmp_path / "crawl.jsonl", records)
+    path = str(tmp_path / "snapshot.tsv")
+    assert build_snapshot(crawl, path, run_size=7) == 30
+    snapshot = Snapshot(path)
+    assert [entry.entity_id for entry in snapshot] == entity_ids
+    for entity_id in (entity_ids[0], entity_ids[13], entity_ids[-1]):
+        assert snapshot.get(entity_id)["entity"]["entity_id"] == entity_id
+    assert snapshot.get("did:example:0005") is None
+    assert snapshot.get("did:aaa") is None
+    assert snapshot.get("did:zzz") is None
+
+
+def test_diff_reports_added_removed_and_changed_entities(tmp_path):
+    old = [
+        record("did:example:a", authorization("issue")),
+        record("did:example:b", authorization("issue"), authorization("verify")),
+        record("did:example:c", authorization("issue")),
+        record("did:example:d", authorization("issue")),
+        record("did:example:e", authorization("issue")),
+    ]
+    new = [
+        record("did:example:a", authorization("issue", evaluated="2030-01-01T00:00:00Z")),
+        record("did:example:b", authorization("issue", False), authorization("revoke")),
+        record("did:example:d", authorization("issue"), name="D"),
+        record("did:example:e", status=503),
+        record("did:example:f", authorization("issue")),
+    ]
+    snapshots = []
+    for name, records in (("old", old), ("new", new)):
+        path = str(tmp_path / f"{name}.tsv")
+        build_snapshot(write_crawl(tmp_path / f"{name}.jsonl", records), path)
+        snapshots.append(Snapshot(path))
+
+    changes = {change["entity_id"]: change for change in diff_snapshots(*snapshots)}
+    assert list(changes) == ["did:example:b", "did:example:c", "did:example:d", "did:example:e", "did:example:f"]
+    assert changes["did:example:c"]["change"] == "removed"
+    assert changes["did:example:f"]["change"] == "added"
+    b = changes["did:example:b"]["authorizations"]
+    assert [item["action"] for item in b["added"]] == ["revoke"]
+    assert [item["action"] for item in b["removed"]] == ["verify"]
+    assert b["changed"][0]["new"]["authorized"] is False
+    assert changes["did:example:d"]["entity"]["new"]["name"] == "D"
+    assert changes["did:example:e"]["authorizations_unknown"] == "new"
@@ -0,0 +1,88 @@
+"""Tests for loading PARC records into the reference server's store."""
+
+import json
+
+import pytest
+
+from trqp_store import ParcStore, parse_time
+
+RECORDS = [
+    {
+        "entity_id": "did:example:issuer",
+        "authority_id": "did:example:eco",
+        "action": "issue",
+        "resource": "credential",
+        "valid_from": "2024-01-01T00:00:00Z",
+        "valid_until": "2025-01-01T00:00:00Z",
+        "assurance_level": "LOA2",
+    },
+    {
+        "entity_id": "did:example:issuer",
+        "authority_id": "did:example:eco",
+        "action": "issue",
+        "resource": "credential",
+        "valid_from": "2026-01-01T00:00:00+00:00",
+    },
+    {
+        "type": "recognition",
+        "entity_id": "did:example:partner",
+        "authority_id": "did:example:eco",
+        "action": "recognize",
+        "resource": "trust-registry",
+        "valid_until": "2025-01-01T00:00:00Z",
+    },
+]
+
+
+def write_jsonl(path, records):
+    path.write_text("".join(json.dumps(record) + "\n\n" for record in records), encoding="utf-8")
+    return path
+
+
+def test_loads_records_from_json_lines(tmp_path):
+    store = ParcStore()
+    assert store.load_jsonl(write_jsonl(tmp_path / "records.jsonl", RECORDS)) == 3
+    store.build_indexes()
+    key = ("did:example:issuer", "did:example:eco", "issue", "credential")
+    assert [store.authorized(*key, parse_time(f"{year}-06-01T00:00:00Z")) for year in (2023, 2024, 2025, 2026)] == [
+        False,
+        True,
+        False,
+        True,
+    ]
+    assert store.authority_pairs == {"did:example:eco": [("issue", "credential")]}
+    assert store.assurance_levels == {"did:example:eco": {"LOA2"}}
+    assert store.knows("did:example:partner", "did:example:eco")
+    assert not store.knows("did:example:eco", "did:example:partner")
+
+    recognition = ("did:example:partner", "did:example:eco", "recognize", "trust-registry")
+    assert store.recognized(*recognition, parse_time("2024-06-01T00:00:00Z"))
+    assert store.active_recognitions("did:example:eco", parse_time("2025-06-01T00:00:00Z")) == []
+
+
+@pytest.mark.parametrize(
+    "record, message",
+    [
+        ({**RECORDS[0], "type": "revocation"}, "Unknown record type 'revocation'"),
+        ({key: value for key, value in RECORDS[0].items() if key != "resource"}, "Missing 'resource'"),
+        ({**RECORDS[0], "action": ""}, "non-empty strings"),
+        ({**RECORDS[0], "valid_from": "2024-01-01"}, "without a UTC offset"),
+        ({**RECORDS[0], "valid_from": "2025-01-01T00:00:00Z"}, "'valid_from' must be before 'valid_until'"),
+    ],
+)
+def test_invalid_records_name_the_line(tmp_path, record, message):
+    path = write_jsonl(tmp_path / "records.jsonl", [RECORDS[1], record])
+    with pytest.raises(ValueError, match=message) as raised:
+        ParcStore().load_jsonl(path)
+    assert str(raised.value).startswith(f"{path}:3: ")
+
+
+def test_synthetic_entities():
+    store = ParcStore()
+    store.add_synthetic(10)
+    store.build_indexes()
+    items, total = store.list_entities("did:example:ecosystem", limit=3, offset=8)
+    assert total == 10 and [item["entity_id"] for item in items] == ["did:example:entity8", "did:example:entity9"]
+    assert store.active_recognitions("did:example:ecosystem", parse_time("2024-01-01T00:00:00Z")) == [
+        ("did:example:trust-registry", "did:example:ecosystem", "recognize", "trust-registry")
+    ]
@@ -0,0 +1,67 @@
+"""Tests for the pooled transport's cold and warm latency split."""
+
+import pytest
+
+from trqp_transport import LatencySamples, TrqpTransport
+
+
+@pytest.mark.parametrize("stdlib", [False, True])
+def test_requests_after_the_first_reuse_the_connection(reference_registry, stdlib):
+    transport = TrqpTransport(stdlib=stdlib)
+    for _ in range(3):
+        assert transport.request("get", f"{reference_registry}/metadata").status_code == 200
+    transport.close()
+    assert transport.cold["GET /metadata"].count == 1
+    assert transport.warm["GET /metadata"].count == 2
+
+
+@pytest.mark.parametrize("stdlib", [False, True])
+def test_without_keep_alive_every_request_is_cold(reference_registry, stdlib):
+    transport = TrqpTransport(keep_alive=False, stdlib=stdlib)
+    for _ in range(3):
+        transport.request("get", f"{reference_registry}/metadata", endpoint="metadata")
+    transport.close()
+    assert transport.cold["metadata"].count == 3
+    assert transport.warm["metadata"].count == 0
+
+
+def test_stdlib_session_sends_json_and_params(reference_registry):
+    transport = TrqpTransport(stdlib=True)
+    query = {
+        "entity_id": "did:example:entity1",
+        "authority_id": "did:example:ecosystem",
+        "action": "issue",
+        "resource": "credential",
+    }
+    response = transport.request("post", f"{reference_registry}/authorization", json=query)
+    assert response.status_code == 200 and response.json()["authorized"] is True
+    response = transport.request("get", f"{reference_registry}/entities", params={"limit": 2, "action": None})
+    assert [item["entity_id"] for item in response.json()["items"]] == ["did:example:entity0", "did:example:entity1"]
+    assert response.url == f"{reference_registry}/entities?limit=2"
+    transport.close()
+
+
+def test_http2_cannot_use_the_stdlib_transport():
+    with pytest.raises(ValueError, match="HTTP/2 needs httpx"):
+        TrqpTransport(http2=True, stdlib=True)
+
+
+def test_latency_report(reference_registry, capsys):
+    transport = TrqpTransport(stdlib=True)
+    transport.request("get", f"{reference_registry}/metadata")
+    transport.request("get", f"{reference_registry}/metadata")
+    transport.close()
+    transport.print_latency_report()
+    report = capsys.readouterr().out
+    assert "Protocol: HTTP/1.1 (http.client)" in report
+    assert "GET /metadata: cold n=1 p50=" in report and " warm n=1 p50=" in report
+
+
+def test_latency_samples_stay_bounded():
+    samples = LatencySamples(capacity=100)
+    for value in range(50):
+        samples.add(value / 1000)
+    assert samples.percentile(50) == 0.024 and samples.percentile(100) == 0.049
+    for value in range(50, 10000):
+        samples.add(value / 1000)
+    assert samples.count == 10000 and samples.max == 9.999 and len(samples.samples) == 100
@@ -0,0 +1,112 @@
+"""Tests for trust-chain resolution, against reference registries."""
+
+import argparse
+
+import pytest
+
+from conftest import serve_in_background
+from trqp_discovery import EndpointDiscovery
+from trqp_reference_server import ReferenceRegistry, build_metadata, parc_response
+from trqp_store import ParcStore
+from trqp_trust_chain import TrustChainResolver
+from trqp_transport import TrqpTransport
+
+ANCHOR = "did:example:anchor"
+PARTNER = "did:example:partner"
+SPOOFED = "did:example:spoofed"
+
+
+def recognition(authority_id, entity_id, **validity):
+    return {
+        "type": "recognition",
+        "entity_id": entity_id,
+        "authority_id": authority_id,
+        "action": "recognize",
+        "resource": "trust-registry",
+        **validity,
+    }
+
+
+RECORDS = [
+    recognition(ANCHOR, PARTNER),
+    recognition(PARTNER, ANCHOR),
+    {"entity_id": "did:example:member", "authority_id": ANCHOR, "action": "issue", "resource": "credential"},
+    {
+        "entity_id": "did:example:issuer",
+        "authority_id": PARTNER,
+        "action": "issue",
+        "resource": "credential",
+        "valid_until": "2025-01-01T00:00:00Z",
+    },
+    {"entity_id": "did:example:mallory", "authority_id": SPOOFED, "action": "issue", "resource": "credential"},
+]
+
+
+class SpoofedListingRegistry(ReferenceRegistry):
+    """Lists a recognition of SPOOFED by ANCHOR that `POST /recognition` does not confirm."""
+
+    def list_ecosystem_recognitions(self, ecosystem_id, params):
+        listed = super().list_ecosystem_recognitions(ecosystem_id, params)
+        if ecosystem_id == ANCHOR:
+            listed.append(parc_response((SPOOFED, ANCHOR, "recognize", "trust-registry"), "recognized", True, 0))
+        return listed
+
+
+@pytest.fixture(scope="module")
+def registry_url():
+    store = ParcStore()
+    for record in RECORDS:
+        store.add(record)
+    store.build_indexes()
+    metadata = build_metadata(argparse.Namespace(registry_id="did:example:trust-registry"), store)
+    with serve_in_background(SpoofedListingRegistry(store, metadata)) as base_url:
+        yield base_url
+
+
+def resolver_for(registries, **options):
+    return TrustChainResolver(EndpointDiscovery(registries), transport=TrqpTransport(stdlib=True), **options)
+
+
+def requests_sent(resolver):
+    transport = resolver.transport
+    return sum(samples.count for series in (transport.cold, transport.warm) for samples in series.values())
+
+
+def test_resolves_direct_and_recognized_authorizations(registry_url):
+    resolver = resolver_for({ANCHOR: registry_url, PARTNER: registry_url, SPOOFED: registry_url})
+    assert resolver.resolve("did:example:member", "issue", "credential", ANCHOR) == (True, (ANCHOR,), ())
+    chain = resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR, at="2024-06-01T00:00:00Z")
+    assert chain == (True, (ANCHOR, PARTNER), ())
+    # The partner's authorization has expired by now, and the recognition cycle back to the anchor ends the walk.
+    assert resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR) == (False, (), ())
+
+
+def test_repeated_resolutions_are_answered_from_the_cache(registry_url):
+    resolver = resolver_for({ANCHOR: registry_url, PARTNER: registry_url, SPOOFED: registry_url})
+    first = resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR, at="2024-06-01T00:00:00Z")
+    sent = requests_sent(resolver)
+    assert sent > 0
+    assert resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR, at="2024-06-01T00:00:00Z") == first
+    assert requests_sent(resolver) == sent
+
+
+def test_listed_recognitions_are_confirmed_before_they_are_followed(registry_url):
+    resolver = resolver_for({ANCHOR: registry_url, PARTNER: registry_url, SPOOFED: registry_url})
+    assert resolver.fetch_recognitions(registry_url, ANCHOR, None) == (PARTNER,)
+    assert requests_sent(resolver) == 3
+    assert resolver.resolve("did:example:mallory", "issue", "credential", ANCHOR) == (False, (), ())
+
+
+def test_unreachable_registries_make_the_answer_inconclusive(registry_url):
+    resolver = resolver_for({ANCHOR: registry_url, PARTNER: "http://127.0.0.1:9"}, max_depth=2)
+    chain = resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR, at="2024-06-01T00:00:00Z")
+    assert chain.trusted is False and chain.path == ()
+    assert {ecosystem_id for ecosystem_id, _ in chain.errors} == {PARTNER}
+    assert "POST /authorization to http://127.0.0.1:9 failed" in chain.errors[0][1]
+
+
+def test_undiscoverable_ecosystems_are_reported(registry_url):
+    resolver = resolver_for({ANCHOR: registry_url})
+    chain = resolver.resolve("did:example:issuer", "issue", "credential", ANCHOR)
+    assert chain.trusted is False
+    assert [ecosystem_id for ecosystem_id, _ in chain.errors] == [PARTNER]
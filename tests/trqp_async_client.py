@@ -0,0 +1,385 @@
+"""asyncio client for every operation in the Ayra TRQP profile.
+
+`AsyncTrqpClient` has one coroutine per operation in
+trqp_ayra_profile_swagger.yaml, listed in `OPERATIONS`. Each one returns a
+`TrqpResponse` with the status and the decoded JSON body, whatever the status,
+so callers decide which statuses they accept. Requests go through an
+`AsyncTrqpTransport`, which pools connections and limits the requests in
+flight to each host, so many calls can be gathered at once.
+
+The two collection endpoints also have async iterators:
+
+- `iter_entities` pages through `GET /entities`, fetching the next page while
+  the caller works through the current one.
+- `iter_ecosystem_recognitions` parses the `GET
+  /ecosystems/{ecosystem_id}/recognitions` array as it arrives, since that
+  endpoint is not paginated.
+
+Connection failures raise `TrqpConnectionError`. A 200 response that is not
+JSON, and a non-200 response to an iterator, raise `TrqpResponseError`.
+"""
+
+import asyncio
+import codecs
+import json
+import re
+from collections import namedtuple
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+from trqp_async_transport import AsyncTrqpTransport
+from trqp_client import build_parc_payload
+
+
+# operationId: (method, path template, client method)
+OPERATIONS: Dict[str, Tuple[str, str, str]] = {
+    "queryAuthorization": ("POST", "/authorization", "query_authorization"),
+    "queryRecognition": ("POST", "/recognition", "query_recognition"),
+    "getTrustRegistryMetadata": ("GET", "/metadata", "get_metadata"),
+    "getEntityInformation": ("GET", "/entities/{entity_id}", "get_entity"),
+    "listEntityAuthorizations": ("GET", "/entities/{entity_id}/authorizations", "list_entity_authorizations"),
+    "listEntities": ("GET", "/entities", "list_entities"),
+    "getEcosystemInformation": ("GET", "/ecosystems/{ecosystem_id}", "get_ecosystem"),
+    "listEcosystemRecognitions": ("GET", "/ecosystems/{ecosystem_id}/recognitions", "list_ecosystem_recognitions"),
+    "lookupSupportedAssuranceLevels": ("GET", "/lookups/assuranceLevels", "lookup_assurance_levels"),
+    "lookupAuthorizations": ("GET", "/lookups/authorizations", "lookup_authorizations"),
+    "lookupSupportedDIDMethods": ("GET", "/lookups/didMethods", "lookup_did_methods"),
+}
+
+# `data` is the decoded JSON body, or None if there was none. `response` is the transport's response.
+TrqpResponse = namedtuple("TrqpResponse", "operation_id method url status data response")
+
+# Outside strings, the characters that change the nesting or end an item; commas only end an item at the top
+# level. Inside strings, those that end or escape the string.
+STRUCTURE = re.compile(r'["\[\]{},]')
+NESTED_STRUCTURE = re.compile(r'["\[\]{}]')
+STRING_SPECIALS = re.compile(r'["\\]')
+
+
+class TrqpError(Exception):
+    """A TRQP request that did not produce a usable response."""
+
+
+class TrqpConnectionError(TrqpError):
+    """The request failed before a response arrived."""
+
+
+class TrqpResponseError(TrqpError):
+    """The registry answered, but not with what the operation promises."""
+
+    def __init__(self, message: str, status: Optional[int] = None, data: Any = None) -> None:
+        super().__init__(message)
+        self.status = status
+        self.data = data
+
+
+class JsonArrayParser:
+    """Parses a JSON array fed in chunks of bytes, returning each item once it is complete.
+
+    Each character is scanned once, tracking nesting and strings across
+    chunks, and an item is decoded once its closing ',' or ']' has arrived. An
+    item split over many chunks therefore costs time linear in its size.
+    """
+
+    def __init__(self) -> None:
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.scan = json.JSONDecoder().raw_decode
+        self.pieces: List[str] = []
+        self.offset = 0
+        self.item_offset = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+        self.finished = False
+        self.empty = True
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Any]:
+        """Adds a chunk of the body. Returns the items it completed.
+
+        An item cannot be decoded until its delimiter arrives, so malformed JSON
+        inside an item raises ValueError at the latest when `final` is set.
+        """
+        text = self.decoder.decode(chunk, final)
+        items: List[Any] = []
+        position = 0
+        if not self.started:
+            position = skip_whitespace(text, 0)
+            if position < len(text):
+                if text[position] != "[":
+                    raise ValueError("Expected a JSON array")
+                self.started = True
+                position += 1
+                self.item_offset = self.offset + position
+        item_start = position
+        while self.started and position < len(text):
+            if self.finished:
+                if text[position:].strip(" \t\r\n"):
+                    raise ValueError("Extra data after the JSON array")
+                break
+            if self.in_string:
+                if self.escaped:
+                    position, self.escaped = position + 1, False
+                    continue
+                match = STRING_SPECIALS.search(text, position)
+                if match is None:
+                    break
+                position = match.end()
+                if match.group() == '"':
+                    self.in_string = False
+                elif position == len(text):
+                    self.escaped = True
+                else:
+                    position += 1
+                continue
+            match = (NESTED_STRUCTURE if self.depth else STRUCTURE).search(text, position)
+            if match is None:
+                break
+            token, position = match.group(), match.end()
+            if token == '"':
+                self.in_string = True
+            elif token in "[{":
+                self.depth += 1
+            elif self.depth:
+                self.depth -= 1
+            elif token == "}":
+                raise ValueError(f"Unexpected '}}' at character {self.offset + position - 1}")
+            else:
+                self.pieces.append(text[item_start : position - 1])
+                items += self.end_item(token)
+                item_start = position
+                self.item_offset = self.offset + position
+        if self.started and not self.finished:
+            self.pieces.append(text[item_start:])
+        self.offset += len(text)
+        if final and self.started and not self.finished:
+            pending = "".join(self.pieces)
+            if pending.strip(" \t\r\n"):
+                # Raises the decoder's own error for an item that is malformed rather than cut short.
+                self.scan(pending, skip_whitespace(pending, 0))
+        return items
+
+    def end_item(self, delimiter: str) -> List[Any]:
+        """Decodes the item collected in `pieces`, which `delimiter` has just closed."""
+        text = "".join(self.pieces)
+        self.pieces = []
+        start = skip_whitespace(text, 0)
+        if start == len(text):
+            if delimiter == "]" and self.empty:
+                self.finished = True
+                return []
+            raise ValueError(f"Expecting value at character {self.item_offset + start}")
+        item, end = self.scan(text, start)
+        if skip_whitespace(text, end) != len(text):
+            raise ValueError(f"Expected ',' or ']' at character {self.item_offset + skip_whitespace(text, end)}")
+        self.empty = False
+        self.finished = delimiter == "]"
+        return [item]
+
+    def close(self) -> None:
+        """Checks that the whole array was fed. Raises ValueError if it was cut short."""
+        self.feed(b"", final=True)
+        if not self.finished:
+            raise ValueError("The JSON array ended early")
+
+
+def json_or_none(response: Any) -> Any:
+    """The decoded JSON body of a response, or None if it has no JSON body."""
+    try:
+        return response.json() if response.content else None
+    except ValueError:
+        return None
+
+
+def skip_whitespace(text: str, position: int) -> int:
+    while position < len(text) and text[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+class AsyncTrqpClient:
+    """Calls one Trust Registry's TRQP and Ayra extension endpoints from asyncio.
+
+    Use it as `async with AsyncTrqpClient(base_url) as client:`, or call
+    `aclose()`. Pass a `transport` to share connections or instrumentation
+    between clients; it is closed with the client either way.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Mapping[str, str]] = None,
+        bearer_token: Optional[str] = None,
+        transport: Optional[AsyncTrqpTransport] = None,
+        max_per_host: int = 10,
+        timeout: float = 15,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Accept": "application/json", **(headers or {})}
+        if bearer_token:
+            self.headers["Authorization"] = f"Bearer {bearer_token}"
+        self.transport = transport or AsyncTrqpTransport(max_per_host=max_per_host, timeout=timeout)
+
+    async def __aenter__(self) -> "AsyncTrqpClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def prepare(
+        self, operation_id: str, path_params: Mapping[str, str], params: Optional[Mapping[str, Any]]
+    ) -> Tuple[str, str, str, Optional[Dict[str, Any]]]:
+        """The (method, url, endpoint label, query parameters) for a call to `operation_id`."""
+        method, template, _ = OPERATIONS[operation_id]
+        path = template.format(**{name: quote(value, safe="") for name, value in path_params.items()})
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        return method, f"{self.base_url}{path}", f"{method} {template}", params or None
+
+    async def call(
+        self,
+        operation_id: str,
+        path_params: Optional[Mapping[str, str]] = None,
+        params: Optional[Mapping[str, Any]] = None,
+        json: Any = None,
+    ) -> TrqpResponse:
+        """Sends one operation and returns a TrqpResponse."""
+        method, url, endpoint, params = self.prepare(operation_id, path_params or {}, params)
+        try:
+            response = await self.transport.request(
+                method, url, headers=self.headers, endpoint=endpoint, params=params, json=json
+            )
+        except self.transport.errors as ex:
+            raise TrqpConnectionError(f"{endpoint} failed: {ex}") from ex
+        try:
+            data = response.json() if response.content else None
+        except ValueError as ex:
+            if response.status_code == 200:
+                raise TrqpResponseError(f"Expected JSON response: {ex}", response.status_code) from ex
+            data = None
+        return TrqpResponse(operation_id, method, response.url, response.status_code, data, response)
+
+    async def query(self, query: Any) -> TrqpResponse:
+        """Sends a TrqpAuthorizationQuery or TrqpRecognitionQuery from trqp_client."""
+        operation_id = "queryAuthorization" if query.path == "/authorization" else "queryRecognition"
+        return await self.call(operation_id, json=query.payload())
+
+    async def query_authorization(
+        self, entity_id: str, authority_id: str, action: str, resource: str, context: Optional[Mapping[str, Any]] = None
+    ) -> TrqpResponse:
+        payload = build_parc_payload(entity_id, authority_id, action, resource, context)
+        return await self.call("queryAuthorization", json=payload)
+
+    async def query_recognition(
+        self, entity_id: str, authority_id: str, action: str, resource: str, context: Optional[Mapping[str, Any]] = None
+    ) -> TrqpResponse:
+        payload = build_parc_payload(entity_id, authority_id, action, resource, context)
+        return await self.call("queryRecognition", json=payload)
+
+    async def get_metadata(self, authority_id: Optional[str] = None) -> TrqpResponse:
+        return await self.call("getTrustRegistryMetadata", params={"authority_id": authority_id})
+
+    async def get_entity(self, entity_id: str) -> TrqpResponse:
+        return await self.call("getEntityInformation", {"entity_id": entity_id})
+
+    async def list_entity_authorizations(self, entity_id: str, time: Optional[str] = None) -> TrqpResponse:
+        return await self.call("listEntityAuthorizations", {"entity_id": entity_id}, {"time": time})
+
+    async def list_entities(
+        self,
+        authority_id: Optional[str] = None,
+        action: Optional[str] = None,
+        resource: Optional[str] = None,
+        time: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+    ) -> TrqpResponse:
+        params = {
+            "authority_id": authority_id,
+            "action": action,
+            "resource": resource,
+            "time": time,
+            "limit": limit,
+            "offset": offset,
+        }
+        return await self.call("listEntities", params=params)
+
+    async def iter_entities(
+        self,
+        authority_id: Optional[str] = None,
+        action: Optional[str] = None,
+        resource: Optional[str] = None,
+        time: Optional[str] = None,
+        page_size: int = 100,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yields every matching EntitySummary, one page of `page_size` at a time.
+
+        The next page is requested as soon as the current one arrives.
+        Raises TrqpResponseError if a page is not a 200 entity list.
+        """
+        def fetch(offset: int) -> "asyncio.Future[TrqpResponse]":
+            return asyncio.ensure_future(self.list_entities(authority_id, action, resource, time, page_size, offset))
+
+        offset, pending = 0, fetch(0)
+        try:
+            while pending is not None:
+                reply = await pending
+                pending = None
+                if reply.status != 200 or not isinstance(reply.data, dict):
+                    raise TrqpResponseError(f"GET /entities returned {reply.status}", reply.status, reply.data)
+                items = reply.data.get("items") or []
+                offset += len(items)
+                if items and offset < reply.data.get("pagination", {}).get("total", 0):
+                    pending = fetch(offset)
+                for item in items:
+                    yield item
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def get_ecosystem(self, ecosystem_id: str) -> TrqpResponse:
+        return await self.call("getEcosystemInformation", {"ecosystem_id": ecosystem_id})
+
+    async def list_ecosystem_recognitions(self, ecosystem_id: str, time: Optional[str] = None) -> TrqpResponse:
+        return await self.call("listEcosystemRecognitions", {"ecosystem_id": ecosystem_id}, {"time": time})
+
+    async def iter_ecosystem_recognitions(
+        self, ecosystem_id: str, time: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yields each TrqpRecognitionResponse of an ecosystem as soon as it has been received.
+
+        Raises TrqpResponseError if the response is not a 200 JSON array.
+        """
+        method, url, endpoint, params = self.prepare(
+            "listEcosystemRecognitions", {"ecosystem_id": ecosystem_id}, {"time": time}
+        )
+        try:
+            async with self.transport.stream(
+                method, url, headers=self.headers, endpoint=endpoint, params=params
+            ) as response:
+                if response.status_code != 200:
+                    await response.read()
+                    data = json_or_none(response)
+                    raise TrqpResponseError(f"{endpoint} returned {response.status_code}", response.status_code, data)
+                parser = JsonArrayParser()
+                try:
+                    async for chunk in response.aiter_bytes():
+                        for item in parser.feed(chunk):
+                            yield item
+                    parser.close()
+                except ValueError as ex:
+                    raise TrqpResponseError(f"Expected a JSON array: {ex}", response.status_code) from ex
+        except self.transport.errors as ex:
+            raise TrqpConnectionError(f"{endpoint} failed: {ex}") from ex
+
+    async def lookup_assurance_levels(self, authority_id: Optional[str] = None) -> TrqpResponse:
+        return await self.call("lookupSupportedAssuranceLevels", params={"authority_id": authority_id})
+
+    async def lookup_authorizations(self, authority_id: Optional[str] = None) -> TrqpResponse:
+        return await self.call("lookupAuthorizations", params={"authority_id": authority_id})
+
+    async def lookup_did_methods(self, authority_id: Optional[str] = None) -> TrqpResponse:
+        return await self.call("lookupSupportedDIDMethods", params={"authority_id": authority_id})
+
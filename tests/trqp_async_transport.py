@@ -0,0 +1,340 @@
+"""Pooled asyncio HTTP transport for AsyncTrqpClient.
+
+`AsyncTrqpTransport` speaks HTTP/1.1 over asyncio streams, with keep-alive
+connections pooled per host and at most `max_per_host` requests in flight to
+each host. Further requests wait for a slot without blocking the event loop.
+Responses can be read whole with `request` or incrementally with `stream`.
+HTTP/2 is available through the optional `httpx` dependency, as for
+TrqpTransport.
+
+Latency is recorded per endpoint as "cold" when the request opened a
+connection and "warm" when it reused one, and reported to an active
+`Instrumentation` like TrqpTransport does. The `connect` phase covers name
+resolution and the TLS handshake too, since asyncio does them in one call.
+
+`ThreadedTransport` adapts a blocking transport, such as a ResilientTransport
+or CachingTransport, to the same interface by running its requests in
+threads.
+"""
+
+import asyncio
+import http.client
+import io
+import json
+import re
+import ssl
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode, urlsplit
+
+from trqp_instrument import NO_INSTRUMENTATION, RequestTiming
+from trqp_transport import HttpClientResponse, LatencySamples, print_latency_report
+
+
+READ_SIZE = 65536
+# The checks http.client makes before sending, so that a header value or URL
+# taken from input cannot smuggle in extra headers or a second request.
+HEADER_NAME = re.compile(r"[!#$%&'*+\-.^_`|~0-9A-Za-z]+")
+INVALID_HEADER_VALUE = re.compile(r"[\r\n\0]")
+INVALID_TARGET = re.compile(r"[\x00-\x20\x7f]")
+
+
+class AsyncResponse(HttpClientResponse):
+    """A response whose body is read with `await read()` or `async for chunk in aiter_bytes()`.
+
+    `content` is None until the body has been read whole.
+    """
+
+    def __init__(self, status_code, headers, url, chunks):
+        super().__init__(status_code, headers, None, url)
+        self._chunks = chunks
+
+    async def aiter_bytes(self):
+        async for chunk in self._chunks:
+            yield chunk
+
+    async def read(self):
+        if self.content is None:
+            self.content = b"".join([chunk async for chunk in self._chunks])
+        return self.content
+
+
+class Connection:
+    """One HTTP/1.1 connection: its asyncio streams, whether it was reused, and whether its response was read."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+        self.done = False
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncTrqpTransport:
+    """asyncio HTTP client with per-host connection pools and concurrency limits."""
+
+    def __init__(
+        self,
+        max_per_host=10,
+        keep_alive=True,
+        http2=False,
+        timeout=15,
+        instrumentation=NO_INSTRUMENTATION,
+        ssl_context=None,
+    ):
+        self.max_per_host = max_per_host
+        self.keep_alive = keep_alive
+        self.http2 = http2
+        self.timeout = timeout
+        self.instrumentation = instrumentation
+        self.ssl_context = ssl_context
+        self.cold = defaultdict(LatencySamples)
+        self.warm = defaultdict(LatencySamples)
+        self.connections_opened = 0
+        self.idle = defaultdict(list)
+        self.slots = {}
+        self.client = None
+        self.errors = (
+            OSError,
+            asyncio.TimeoutError,
+            http.client.HTTPException,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        )
+
+        if http2:
+            try:
+                import httpx
+            except ImportError as ex:
+                raise ImportError("HTTP/2 support requires httpx: python -m pip install 'httpx[http2]'") from ex
+            limits = httpx.Limits(max_connections=None, max_keepalive_connections=max_per_host if keep_alive else 0)
+            self.client = httpx.AsyncClient(http2=True, limits=limits, timeout=timeout, verify=ssl_context or True)
+            self.errors = (httpx.HTTPError,)
+
+    def slot(self, host):
+        """The semaphore limiting requests in flight to `host`."""
+        semaphore = self.slots.get(host)
+        if semaphore is None:
+            semaphore = self.slots[host] = asyncio.Semaphore(self.max_per_host)
+        return semaphore
+
+    async def request(self, method, url, headers=None, endpoint=None, params=None, json=None):
+        """Sends one request and reads the whole response. Returns an AsyncResponse with `content` set."""
+        async with self.stream(method, url, headers, endpoint, params, json) as response:
+            await response.read()
+        return response
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None, endpoint=None, params=None, json=None):
+        """Sends one request. Yields the AsyncResponse once its headers have arrived.
+
+        The request holds its host's slot until the block exits. If the body
+        was not read to the end by then, the connection is closed rather than
+        drained.
+        """
+        parts = urlsplit(url)
+        endpoint = endpoint or f"{method.upper()} {parts.path}"
+        if params:
+            query = urlencode({name: value for name, value in params.items() if value is not None}, doseq=True)
+            url += ("&" if parts.query else "?") + query
+        body = json_bytes(json) if json is not None else None
+        headers = {**(headers or {})}
+        if body is not None:
+            headers.setdefault("Content-Type", "application/json")
+
+        start_time_ns, started = time.time_ns(), time.perf_counter()
+        timing = {"connect": None, "ttfb": None, "new_connection": False}
+        async with self.slot(parts.netloc):
+            try:
+                if self.client is not None:
+                    async with self.client.stream(method.upper(), url, headers=headers, content=body) as reply:
+                        timing["ttfb"] = time.perf_counter() - started
+                        response = AsyncResponse(reply.status_code, reply.headers, url, reply.aiter_bytes())
+                        yield response
+                else:
+                    connection, response = await self.exchange(method.upper(), url, headers, body, timing)
+                    try:
+                        yield response
+                    finally:
+                        if not connection.done:
+                            await response._chunks.aclose()
+                            connection.close()
+            except self.errors as ex:
+                self.finished(endpoint, method, url, None, ex, start_time_ns, started, timing)
+                raise
+        self.finished(endpoint, method, url, response.status_code, None, start_time_ns, started, timing)
+
+    async def exchange(self, method, url, headers, body, timing):
+        """Sends the request on a pooled or new connection. Returns (connection, response) at the headers."""
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        if INVALID_TARGET.search(target) or INVALID_TARGET.search(parts.netloc):
+            raise http.client.InvalidURL(f"URL can't contain control characters or spaces: {url!r}")
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        if not self.keep_alive:
+            headers.setdefault("Connection", "close")
+        if body is not None:
+            headers["Content-Length"] = str(len(body))
+        for name, value in headers.items():
+            value = str(value)
+            if not HEADER_NAME.fullmatch(name):
+                raise ValueError(f"Invalid header name {name!r}")
+            if INVALID_HEADER_VALUE.search(value):
+                raise ValueError(f"Invalid header value {value!r}")
+            lines.append(f"{name}: {value}")
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+
+        key = (parts.scheme, parts.netloc)
+        while True:
+            connection = await self.connect(key, parts, timing)
+            sent = time.perf_counter()
+            try:
+                connection.writer.write(request)
+                status, response_headers = await asyncio.wait_for(read_head(connection.reader), self.timeout)
+                break
+            except (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError) as ex:
+                connection.close()
+                # The server closed an idle keep-alive connection: retry on another one.
+                if not connection.reused or (isinstance(ex, asyncio.IncompleteReadError) and ex.partial):
+                    raise
+            except BaseException:
+                connection.close()
+                raise
+        timing["ttfb"] = time.perf_counter() - sent
+        chunks = self.body(connection, key, method, status, response_headers)
+        return connection, AsyncResponse(status, response_headers, url, chunks)
+
+    async def connect(self, key, parts, timing):
+        """An idle pooled connection to `key`, or a new one."""
+        idle = self.idle[key]
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof():
+                connection.reused, connection.done = True, False
+                return connection
+            connection.close()
+        began = time.perf_counter()
+        context = None
+        if parts.scheme == "https":
+            context = self.ssl_context = self.ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, parts.port or (443 if context else 80), ssl=context),
+            self.timeout,
+        )
+        self.connections_opened += 1
+        timing["connect"], timing["new_connection"] = time.perf_counter() - began, True
+        return Connection(reader, writer)
+
+    async def body(self, connection, key, method, status, headers):
+        """Yields the body in chunks, then returns the connection to the pool if it can be reused."""
+        reader, timeout = connection.reader, self.timeout
+        reusable = self.keep_alive and "close" not in headers.get("Connection", "").lower()
+        if method == "HEAD" or status in (204, 304) or status < 200:
+            pass
+        elif "chunked" in headers.get("Transfer-Encoding", "").lower():
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), timeout)
+                    size = int(line.split(b";")[0], 16)
+                except ValueError:
+                    # Raised for a size that is not hex, and by readline() for an overlong line.
+                    raise http.client.HTTPException("Invalid chunk size line in the response") from None
+                if size == 0:
+                    # Skip any trailers.
+                    while (await asyncio.wait_for(reader.readline(), timeout)).strip():
+                        pass
+                    break
+                yield await asyncio.wait_for(reader.readexactly(size), timeout)
+                await asyncio.wait_for(reader.readexactly(2), timeout)
+        elif headers.get("Content-Length") is not None:
+            remaining = int(headers["Content-Length"])
+            while remaining:
+                chunk = await asyncio.wait_for(reader.read(min(remaining, READ_SIZE)), timeout)
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            # No framing: the body runs to the end of the connection.
+            reusable = False
+            while chunk := await asyncio.wait_for(reader.read(READ_SIZE), timeout):
+                yield chunk
+        connection.done = True
+        if reusable:
+            self.idle[key].append(connection)
+        else:
+            connection.close()
+
+    def finished(self, endpoint, method, url, status, error, start_time_ns, started, timing):
+        elapsed = time.perf_counter() - started
+        if status is not None:
+            (self.cold if timing["new_connection"] or not self.keep_alive else self.warm)[endpoint].add(elapsed)
+        if self.instrumentation.active:
+            ttfb = timing["ttfb"]
+            body = None if ttfb is None else elapsed - ttfb - (timing["connect"] or 0.0)
+            self.instrumentation.request_finished(
+                RequestTiming(
+                    endpoint, method, url, status, error, start_time_ns, elapsed,
+                    timing["new_connection"], None, timing["connect"], None, ttfb, body,
+                )
+            )  # fmt: skip
+
+    def print_latency_report(self):
+        print_latency_report("HTTP/2" if self.http2 else "HTTP/1.1 (asyncio)", self.cold, self.warm)
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+        for connections in self.idle.values():
+            for connection in connections:
+                connection.close()
+        self.idle.clear()
+
+
+def json_bytes(value):
+    return json.dumps(value).encode()
+
+
+async def read_head(reader):
+    """Reads a response's status line and headers. Returns (status, HTTPMessage)."""
+    head = io.BytesIO(await reader.readuntil(b"\r\n\r\n"))
+    status_line = head.readline().decode("latin-1")
+    version, _, rest = status_line.partition(" ")
+    if not version.startswith("HTTP/") or not rest[:3].isdigit():
+        raise http.client.BadStatusLine(status_line)
+    return int(rest[:3]), http.client.parse_headers(head)
+
+
+class ThreadedTransport:
+    """Runs a blocking transport's requests in threads, behind the AsyncTrqpTransport interface.
+
+    Streamed responses are read whole first.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.errors = transport.errors
+        self.instrumentation = transport.instrumentation
+
+    async def request(self, method, url, headers=None, endpoint=None, params=None, json=None):
+        kwargs = {name: value for name, value in (("params", params), ("json", json)) if value is not None}
+        request = self.transport.request
+        return await asyncio.to_thread(request, method, url, headers=headers, endpoint=endpoint, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, headers=None, endpoint=None, params=None, json=None):
+        response = await self.request(method, url, headers, endpoint, params, json)
+        yield AsyncResponse(response.status_code, response.headers, response.url, single_chunk(response.content))
+
+    def print_latency_report(self):
+        self.transport.print_latency_report()
+
+    async def aclose(self):
+        self.transport.close()
+
+
+async def single_chunk(content):
+    yield content
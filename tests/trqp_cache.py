@@ -0,0 +1,116 @@
+"""In-process TTL/LRU cache for TRQP authorization and recognition results.
+
+Entries are keyed on the registry base URL and the normalized request body:
+the endpoint path plus the `entity_id`, `authority_id`, `action`, `resource`
+and sorted `context` pairs of the request schema. Live answers expire after `ttl` seconds, `404` answers
+after `negative_ttl` seconds, and answers to queries pinned to a historical
+`context.time` never expire because the registry's answer for a past instant
+cannot change. The cache is bounded and evicts the least recently used entry.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+MISSING = object()
+
+
+def cache_key(query, base_url=""):
+    """Normalized cache key for a TrqpAuthorizationQuery or TrqpRecognitionQuery.
+
+    `base_url` keeps answers from different registries apart when one cache is
+    shared by several clients.
+    """
+    return (base_url, query.path) + tuple(query)
+
+
+def historical_time(query, now=None):
+    """Returns True when the query's `context.time` is a valid RFC3339 instant in the past."""
+    value = dict(query.context).get("time")
+    if not value:
+        return False
+    try:
+        evaluated_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if evaluated_at.tzinfo is None:
+        return False
+    return evaluated_at < (now or datetime.now(timezone.utc))
+
+
+class TrqpResponseCache:
+    """Thread-safe bounded LRU with per-entry expiry and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=10000, ttl=60.0, negative_ttl=10.0, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the cached value for `key`, or MISSING."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl):
+        """Stores `value` for `ttl` seconds; `ttl=None` keeps it until evicted."""
+        expires_at = None if ttl is None else self.clock() + ttl
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def ttl_for(self, query, status):
+        """TTL to cache a `status` answer to `query` with, or MISSING if it must not be cached."""
+        if status == 404:
+            return self.negative_ttl
+        if status != 200:
+            return MISSING
+        if historical_time(query):
+            return None
+        return self.ttl
+
+    def invalidate_entities(self, entity_ids):
+        """Drops every entry about one of `entity_ids`. Returns the number of entries dropped."""
+        entity_ids = set(entity_ids)
+        with self.lock:
+            stale = [key for key in self.entries if key[2] in entity_ids]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
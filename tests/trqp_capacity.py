@@ -0,0 +1,343 @@
+"""Capacity runs for the smoke test's `--capacity` mode.
+
+A capacity profile describes a load shape, an endpoint mix and SLO limits:
+
+- `ramp` raises the request rate from `start_rate` to `peak_rate` over
+  `duration` seconds, in `windows` windows of constant rate.
+- `step` raises it from `start_rate` to `peak_rate` in `steps` steps of
+  `step_duration` seconds each.
+- `soak` holds `rate` for `duration` seconds.
+- `spike` holds `baseline_rate` for `baseline_duration` seconds, jumps to
+  `peak_rate` for `spike_duration` seconds, then returns to the baseline for
+  another `baseline_duration` seconds.
+
+Every shape runs as a list of constant-rate stages, driven by trqp_load. Each
+stage is checked against the SLO limits on its own. The report names the
+highest throughput a stage sustained within the limits, so a `step` or `ramp`
+profile finds a registry's capacity.
+
+`mix` weighs the smoke checks' names, plus `lookups` for the three lookup
+endpoints together. Requests follow a smooth weighted round-robin, so every
+stretch of a run has about the same mix.
+"""
+
+import json
+import time
+from collections import namedtuple
+
+from trqp_load import EndpointStats
+
+
+SHAPES = ("ramp", "step", "soak", "spike")
+LOOKUP_CHECKS = ("assurance-levels", "lookup-authorizations", "did-methods")
+DEFAULT_MIX = {"authorization": 80, "recognition": 15, "lookups": 5}
+
+# Limits a stage is checked against. `rate_ratio` is the least share of the
+# stage's target rate that must be achieved: a registry that cannot keep up
+# queues requests, and the run falls behind its schedule.
+SLO_LIMITS = {
+    "p50_ms": "p50 latency (ms)",
+    "p95_ms": "p95 latency (ms)",
+    "p99_ms": "p99 latency (ms)",
+    "max_ms": "maximum latency (ms)",
+    "error_rate": "error rate",
+    "rate_ratio": "achieved share of the target rate",
+}
+DEFAULT_SLO = {"p99_ms": 50.0, "error_rate": 0.01, "rate_ratio": 0.95}
+
+# The number of requests one pass of the mix schedule holds.
+SCHEDULE_LENGTH = 100
+
+Stage = namedtuple("Stage", "name rate duration")
+
+
+def default_profile(shape, peak_rate, duration):
+    """The built-in profile for `shape`, peaking at `peak_rate` req/s and lasting `duration` seconds in all."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown load shape '{shape}'; expected one of {', '.join(SHAPES)}")
+    if peak_rate <= 0:
+        raise ValueError("A capacity run needs a peak request rate: set --rate")
+    profile = {"shape": shape, "mix": dict(DEFAULT_MIX), "slo": dict(DEFAULT_SLO)}
+    if shape == "ramp":
+        profile.update(start_rate=peak_rate / 10, peak_rate=peak_rate, duration=duration, windows=10)
+    elif shape == "step":
+        profile.update(start_rate=peak_rate / 5, peak_rate=peak_rate, steps=5, step_duration=duration / 5)
+    elif shape == "soak":
+        profile.update(rate=peak_rate, duration=duration)
+    else:
+        profile.update(
+            baseline_rate=peak_rate / 10,
+            peak_rate=peak_rate,
+            baseline_duration=duration * 0.4,
+            spike_duration=duration * 0.2,
+        )
+    return profile
+
+
+def load_profile(source, peak_rate, duration):
+    """A capacity profile from a JSON or YAML file, or the built-in profile when `source` names a shape."""
+    if source in SHAPES:
+        return default_profile(source, peak_rate, duration)
+    with open(source, encoding="utf-8") as profile_file:
+        if source.endswith((".yaml", ".yml")):
+            import yaml
+
+            profile = yaml.safe_load(profile_file)
+        else:
+            profile = json.load(profile_file)
+    if not isinstance(profile, dict):
+        raise ValueError(f"{source} does not hold a capacity profile object")
+    return profile
+
+
+def profile_stages(profile):
+    """The constant-rate stages of a profile. Raises ValueError if a setting is missing or out of range."""
+    shape = profile.get("shape")
+
+    def setting(name, default=None):
+        value = profile.get(name, default)
+        if value is None:
+            raise ValueError(f"A {shape} profile needs '{name}'")
+        if not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"'{name}' must be a positive number, not {value!r}")
+        return value
+
+    if shape == "ramp":
+        peak = setting("peak_rate")
+        start, duration = setting("start_rate", peak / 10), setting("duration")
+        windows = int(setting("windows", 10))
+        # Each window runs at the ramp's rate at its midpoint.
+        return [
+            Stage(f"ramp {index + 1}/{windows}", start + (peak - start) * (index + 0.5) / windows, duration / windows)
+            for index in range(windows)
+        ]
+    if shape == "step":
+        peak = setting("peak_rate")
+        steps = int(setting("steps", 5))
+        start, step_duration = setting("start_rate", peak / steps), setting("step_duration")
+        return [
+            Stage(f"step {index + 1}/{steps}", start + (peak - start) * index / max(steps - 1, 1), step_duration)
+            for index in range(steps)
+        ]
+    if shape == "soak":
+        return [Stage("soak", setting("rate"), setting("duration"))]
+    if shape == "spike":
+        peak = setting("peak_rate")
+        baseline, baseline_duration = setting("baseline_rate", peak / 10), setting("baseline_duration")
+        return [
+            Stage("baseline", baseline, baseline_duration),
+            Stage("spike", peak, setting("spike_duration")),
+            Stage("recovery", baseline, baseline_duration),
+        ]
+    raise ValueError(f"Unknown load shape {shape!r}; expected one of {', '.join(SHAPES)}")
+
+
+def mix_schedule(targets, mix):
+    """One pass of the request schedule: SCHEDULE_LENGTH targets in the ratio `mix` gives.
+
+    `targets` maps smoke check names to LoadTargets. The weight of `lookups`
+    is split evenly between the three lookup endpoints.
+    """
+    if not isinstance(mix, dict):
+        raise ValueError(f"The mix must map endpoint names to weights, not {mix!r}")
+    weights = {}
+    for name, weight in mix.items():
+        if not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"The mix weight of '{name}' must be a number of at least 0, not {weight!r}")
+        names = LOOKUP_CHECKS if name == "lookups" else (name,)
+        for check in names:
+            if check not in targets:
+                raise ValueError(f"Unknown endpoint '{name}' in the mix; expected one of {', '.join(targets)}, lookups")
+            weights[check] = weights.get(check, 0) + weight / len(names)
+    total = sum(weights.values())
+    if not total:
+        raise ValueError("The mix needs at least one endpoint with a positive weight")
+
+    # Whole slots per target, by largest remainder, so one pass matches the mix as closely as it can.
+    shares = {name: weight * SCHEDULE_LENGTH / total for name, weight in weights.items()}
+    slots = {name: int(share) for name, share in shares.items()}
+    by_remainder = sorted(shares, key=lambda name: shares[name] - slots[name], reverse=True)
+    for name in by_remainder[: SCHEDULE_LENGTH - sum(slots.values())]:
+        slots[name] += 1
+
+    # Smooth weighted round-robin: the heaviest target is not sent in one burst.
+    current = dict.fromkeys(slots, 0)
+    schedule = []
+    for _ in range(SCHEDULE_LENGTH):
+        for name, count in slots.items():
+            current[name] += count
+        chosen = max(current, key=current.get)
+        current[chosen] -= SCHEDULE_LENGTH
+        schedule.append(targets[chosen])
+    return schedule
+
+
+def check_slo(profile):
+    """The profile's SLO limits, with the defaults for those it leaves out. Raises ValueError on an unknown limit."""
+    slo = profile.get("slo")
+    if slo is None:
+        slo = {}
+    elif not isinstance(slo, dict):
+        raise ValueError(f"The SLO must map limit names to numbers, not {slo!r}")
+    slo = {**DEFAULT_SLO, **slo}
+    endpoints = slo.get("endpoints")
+    if endpoints is None:
+        endpoints = {}
+    elif not isinstance(endpoints, dict):
+        raise ValueError("The SLO 'endpoints' must map endpoint names to limits")
+    for name, limits in endpoints.items():
+        if not isinstance(limits, dict):
+            raise ValueError(f"The SLO limits for {name} must map limit names to numbers, not {limits!r}")
+    for scope, limits in [("", slo), *((f" for {name}", limits) for name, limits in endpoints.items())]:
+        for name, limit in limits.items():
+            if name == "endpoints" or (name == "required_rate" and not scope):
+                continue
+            if name not in SLO_LIMITS:
+                raise ValueError(f"Unknown SLO limit '{name}'{scope}; expected one of {', '.join(SLO_LIMITS)}")
+            if not isinstance(limit, (int, float)):
+                raise ValueError(f"The SLO limit '{name}'{scope} must be a number, not {limit!r}")
+    if not isinstance(slo.get("required_rate", 0), (int, float)):
+        raise ValueError(f"The SLO 'required_rate' must be a number, not {slo['required_rate']!r}")
+    return slo
+
+
+def parse_settings(text, option):
+    """Parses "name=number,name=number" from the command line into a dict."""
+    settings = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = item.partition("=")
+        try:
+            settings[name.strip()] = float(value)
+        except ValueError:
+            raise ValueError(f"{option} takes name=number pairs, not '{item}'") from None
+    return settings
+
+
+def summarize(stats, elapsed):
+    """The report fields for one EndpointStats."""
+    return {
+        "requests": stats.count,
+        "throughput": stats.count / elapsed if elapsed else 0.0,
+        "errors": stats.errors,
+        "error_rate": stats.errors / stats.count if stats.count else 0.0,
+        "latency_ms": {
+            label: stats.latencies.percentile(pct) * 1000
+            for label, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "late": stats.late,
+        "unsent": stats.unsent,
+        "outcomes": dict(stats.outcomes.most_common()),
+    }
+
+
+def violations(summary, limits, target_rate, scope):
+    """Descriptions of the limits `summary` breaks."""
+    measured = {f"{label}_ms": value for label, value in summary["latency_ms"].items()}
+    measured["error_rate"] = summary["error_rate"]
+    broken = []
+    for name, limit in limits.items():
+        if name == "rate_ratio":
+            if target_rate and summary["throughput"] < limit * target_rate:
+                achieved = summary["throughput"]
+                broken.append(f"{scope}: {achieved:.1f} req/s is under {limit:.0%} of the {target_rate:g} req/s target")
+        elif name in measured and measured[name] > limit:
+            broken.append(f"{scope}: {SLO_LIMITS[name]} {measured[name]:.4g} is over {limit:g}")
+    if not summary["requests"]:
+        broken.append(f"{scope}: no requests completed")
+    return broken
+
+
+def run_stage(load, schedule, stage, concurrency, slo):
+    """Runs one stage and returns its report entry."""
+    started_at = time.time()
+    results, elapsed = load(schedule, concurrency, stage.duration, stage.rate)
+    overall = EndpointStats()
+    for stats in results.values():
+        overall.merge(stats)
+    entry = {"name": stage.name, "target_rate": stage.rate, "duration": stage.duration, "started_at": started_at}
+    entry.update(summarize(overall, elapsed))
+    entry["endpoints"] = {name: summarize(stats, elapsed) for name, stats in results.items()}
+
+    limits = {name: limit for name, limit in slo.items() if name in SLO_LIMITS}
+    broken = violations(entry, limits, stage.rate, "all endpoints")
+    for name, endpoint_limits in (slo.get("endpoints") or {}).items():
+        if name in entry["endpoints"]:
+            # The rate ratio applies to the stage as a whole.
+            endpoint_limits = {key: value for key, value in endpoint_limits.items() if key != "rate_ratio"}
+            broken += violations(entry["endpoints"][name], endpoint_limits, None, name)
+    entry["passed"] = not broken
+    entry["violations"] = broken
+    return entry
+
+
+CapacityPlan = namedtuple("CapacityPlan", "profile stages schedule slo stop_on_violation")
+
+
+def capacity_plan(profile, targets):
+    """Checks a profile and prepares its run. Raises ValueError on a bad setting, before any request is sent.
+
+    `targets` maps smoke check names to LoadTargets. `stop_on_violation`
+    ends the run at the first stage that breaks an SLO limit. It is the
+    default for `ramp` and `step` profiles, whose later stages would only
+    load the registry harder.
+    """
+    stages = profile_stages(profile)
+    mix = profile.get("mix")
+    schedule = mix_schedule(targets, DEFAULT_MIX if mix is None else mix)
+    stop_on_violation = profile.get("stop_on_violation", profile["shape"] in ("ramp", "step"))
+    if not isinstance(stop_on_violation, bool):
+        raise ValueError(f"'stop_on_violation' must be true or false, not {stop_on_violation!r}")
+    return CapacityPlan(profile, stages, schedule, check_slo(profile), stop_on_violation)
+
+
+def run_capacity(load, plan, concurrency, progress=print):
+    """Runs every stage of a CapacityPlan and returns the report.
+
+    `load(targets, concurrency, duration, rate)` runs one stage, as run_load
+    does with its transport bound, or an AsyncLoadRunner.
+    """
+    report = {"profile": plan.profile, "slo": plan.slo, "concurrency": concurrency, "stages": []}
+    for stage in plan.stages:
+        progress(f"{stage.name}: {stage.rate:.1f} req/s for {stage.duration:g}s")
+        entry = run_stage(load, plan.schedule, stage, concurrency, plan.slo)
+        report["stages"].append(entry)
+        if not entry["passed"] and plan.stop_on_violation:
+            break
+
+    sustained = [entry["throughput"] for entry in report["stages"] if entry["passed"]]
+    report["max_sustainable_rate"] = max(sustained, default=None)
+    required_rate = plan.slo.get("required_rate")
+    if required_rate is not None:
+        report["passed"] = (report["max_sustainable_rate"] or 0) >= required_rate
+    else:
+        report["passed"] = len(sustained) == len(plan.stages)
+    return report
+
+
+def print_capacity_report(report):
+    """Prints one line per stage, the SLO violations and the maximum sustainable throughput."""
+    print("\n==================== Capacity Test Results ====================")
+    print(f"Shape: {report['profile']['shape']}  Concurrency: {report['concurrency']}")
+    print(
+        f"{'stage':<12} {'target/s':>9} {'achieved/s':>11} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>8} {'late':>7}  SLO"
+    )
+    for entry in report["stages"]:
+        latency = entry["latency_ms"]
+        print(
+            f"{entry['name']:<12} {entry['target_rate']:>9.1f} {entry['throughput']:>11.1f} "
+            f"{latency['p50']:>8.2f} {latency['p95']:>8.2f} {latency['p99']:>8.2f} "
+            f"{entry['error_rate']:>8.2%} {entry['late']:>7}  {'pass' if entry['passed'] else 'FAIL'}"
+        )
+    for entry in report["stages"]:
+        for violation in entry["violations"]:
+            print(f"  {entry['name']}: {violation}")
+    rate = report["max_sustainable_rate"]
+    print(f"Maximum sustainable throughput: {'none' if rate is None else f'{rate:.1f} req/s'}")
+    print("================================================================")
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as report_file:
+        json.dump(report, report_file, indent=2)
+        report_file.write("\n")
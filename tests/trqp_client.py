@@ -0,0 +1,170 @@
+"""TRQP authorization and recognition query client.
+
+`TrqpClient` sends `POST /authorization` and `POST /recognition` queries over a
+pooled `TrqpTransport`. `TrqpClient.batch` takes an iterable of queries,
+collapses duplicate tuples, and fans the unique ones out concurrently with a
+bounded number of requests in flight, yielding each result as soon as it
+completes. `TrqpClient.stream` does the same without de-duplication, for
+replaying large query files. Pass a `TrqpResponseCache` to answer repeated
+tuples in-process.
+"""
+
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from trqp_cache import MISSING, cache_key
+from trqp_transport import TrqpTransport
+
+
+def build_parc_payload(entity_id, authority_id, action, resource, context=None):
+    """Builds the TrqpAuthorizationQuery/TrqpRecognitionQuery request body."""
+    return {
+        "entity_id": entity_id,
+        "authority_id": authority_id,
+        "action": action,
+        "resource": resource,
+        "context": dict(context or {}),
+    }
+
+
+class ParcQuery(namedtuple("ParcQuery", "entity_id authority_id action resource context", defaults=((),))):
+    """A hashable PARC tuple. `context` holds sorted (key, value) pairs."""
+
+    __slots__ = ()
+    path = None
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Builds a query from a request body. Raises KeyError for a missing field, ValueError for a bad one."""
+        fields = [payload["entity_id"], payload["authority_id"], payload["action"], payload["resource"]]
+        if not all(isinstance(field, str) for field in fields):
+            raise ValueError("'entity_id', 'authority_id', 'action' and 'resource' must be strings")
+        context = payload.get("context") or {}
+        if not isinstance(context, dict) or not all(isinstance(value, str) for value in context.values()):
+            raise ValueError("'context' must be an object with string values")
+        return cls(*fields, tuple(sorted(context.items())))
+
+    def payload(self):
+        return build_parc_payload(self.entity_id, self.authority_id, self.action, self.resource, self.context)
+
+
+class TrqpAuthorizationQuery(ParcQuery):
+    __slots__ = ()
+    path = "/authorization"
+
+
+class TrqpRecognitionQuery(ParcQuery):
+    __slots__ = ()
+    path = "/recognition"
+
+
+TrqpResult = namedtuple("TrqpResult", "query status data error")
+
+
+class TrqpClient:
+    """Queries one Trust Registry's TRQP core endpoints."""
+
+    def __init__(self, base_url, headers=None, transport=None, max_in_flight=16, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Accept": "application/json",
+            **(headers or {}),
+            "Content-Type": "application/json",
+        }
+        self.max_in_flight = max_in_flight
+        self.transport = transport or TrqpTransport(pool_size=max_in_flight)
+        self.cache = cache
+
+    def query(self, query):
+        """Sends one authorization or recognition query and returns a TrqpResult."""
+        if self.cache is not None:
+            key = cache_key(query, self.base_url)
+            cached = self.cache.get(key)
+            self.transport.instrumentation.cache_outcome(f"POST {query.path}", "miss" if cached is MISSING else "hit")
+            if cached is not MISSING:
+                status, data = cached
+                return TrqpResult(query, status, data, None)
+
+        try:
+            response = self.transport.request(
+                "post",
+                f"{self.base_url}{query.path}",
+                headers=self.headers,
+                endpoint=f"POST {query.path}",
+                json=query.payload(),
+            )
+        except self.transport.errors as ex:
+            return TrqpResult(query, None, None, ex)
+
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+
+        if self.cache is not None:
+            ttl = self.cache.ttl_for(query, response.status_code)
+            if ttl is not MISSING:
+                self.cache.put(key, (response.status_code, data), ttl)
+        return TrqpResult(query, response.status_code, data, None)
+
+    def batch(self, queries, max_in_flight=None):
+        """Yields a TrqpResult per unique query, in completion order.
+
+        `queries` is consumed lazily, so at most `max_in_flight` requests are
+        outstanding and only unseen tuples are kept in memory.
+        """
+        # Queries are namedtuples, so an authorization and a recognition of the same tuple compare equal.
+        return self.stream(unique(queries, key=lambda query: (query.path, query)), max_in_flight)
+
+    def stream(self, queries, max_in_flight=None, ordered=False):
+        """Yields a TrqpResult for every query, without de-duplication.
+
+        Results come in completion order, or in input order with `ordered`.
+        Memory is bounded by `max_in_flight` either way.
+        """
+        return map_bounded(self.query, queries, max_in_flight or self.max_in_flight, ordered)
+
+
+def unique(items, key=None):
+    """Yields the items of an iterable that have not been seen before, compared by `key(item)` if given."""
+    seen = set()
+    for item in items:
+        marker = item if key is None else key(item)
+        if marker not in seen:
+            seen.add(marker)
+            yield item
+
+
+def map_bounded(func, items, max_in_flight, ordered=False):
+    """Yields func(item) for each item, running up to `max_in_flight` calls on threads.
+
+    `items` is consumed lazily. In completion order, results are yielded as
+    soon as they are ready. In input order, a slow call holds back the results
+    behind it, and no new work starts while `max_in_flight` results wait.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        if ordered:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_in_flight:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+            return
+
+        pending = set()
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                item = next(items, MISSING)
+                if item is MISSING:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(func, item))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
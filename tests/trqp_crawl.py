@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Parallel, resumable crawl of every entity a Trust Registry lists under `GET /entities`.
+
+The first page tells the crawler the page size the registry applied and the
+total number of entities. The remaining pages are then requested ahead in
+parallel by offset. The total is re-read from every page, so entities added
+during a crawl are still reached. Items are written to a JSON Lines file in
+listing order, one entity per line, together with the result of
+`GET /entities/{entity_id}/authorizations` unless that is switched off.
+
+Progress is saved to a checkpoint file next to the output. After an
+interruption the same command resumes from the last entity written instead of
+starting over. Memory use does not grow with the size of the registry: at most
+`page_concurrency` pages and `max_in_flight` authorization requests are held
+at once.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from urllib.parse import quote
+
+from trqp_client import map_bounded
+from trqp_schema import get_schema_registry
+from trqp_transport import TrqpTransport
+
+
+class CrawlError(Exception):
+    """The listing could not be crawled consistently, or a checkpoint does not match."""
+
+
+class EntityCrawler:
+    """Fetches `GET /entities` pages and per-entity authorizations from one registry."""
+
+    def __init__(
+        self,
+        base_url,
+        headers=None,
+        transport=None,
+        page_size=1000,
+        page_concurrency=4,
+        max_in_flight=16,
+        filters=None,
+        authorizations=True,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"Accept": "application/json", **(headers or {})}
+        self.transport = transport or TrqpTransport(pool_size=page_concurrency + max_in_flight)
+        self.page_size = page_size
+        self.page_concurrency = page_concurrency
+        self.max_in_flight = max_in_flight
+        self.filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        self.authorizations = authorizations
+        self.total = None
+        schemas = get_schema_registry()
+        self.validate_page = schemas.response_validator("listEntities")
+        self.validate_authorizations = schemas.response_validator("listEntityAuthorizations")
+
+    def fetch_page(self, offset, limit):
+        """Returns one `GET /entities` page. Raises CrawlError for anything but a valid 200 page."""
+        try:
+            response = self.transport.request(
+                "get",
+                f"{self.base_url}/entities",
+                headers=self.headers,
+                endpoint="GET /entities",
+                params={**self.filters, "limit": limit, "offset": offset},
+            )
+        except self.transport.errors as ex:
+            raise CrawlError(f"GET /entities at offset {offset} failed: {type(ex).__name__}: {ex}") from ex
+        if response.status_code != 200:
+            raise CrawlError(f"GET /entities at offset {offset} returned {response.status_code}")
+        try:
+            page = response.json()
+        except ValueError:
+            raise CrawlError(f"GET /entities at offset {offset} returned invalid JSON") from None
+        errors = self.validate_page(page)
+        if errors:
+            raise CrawlError(f"GET /entities at offset {offset} returned an invalid page: {errors[0]}")
+
+        pagination = page["pagination"]
+        self.total = pagination["total"]
+        received = len(page["items"])
+        # Pages are requested by stepping the offset by the applied limit, so both must move it forward.
+        if pagination["limit"] < 1:
+            raise CrawlError(f"GET /entities at offset {offset} reported a page limit of {pagination['limit']}")
+        if not received and offset < self.total:
+            raise CrawlError(
+                f"GET /entities at offset {offset} returned no items before the reported total of {self.total}"
+            )
+        if received < pagination["limit"] and offset + received < self.total:
+            raise CrawlError(
+                f"GET /entities at offset {offset} returned {received} of {pagination['limit']} items "
+                f"before the reported total of {self.total}"
+            )
+        return page
+
+    def pages(self, start_offset=0):
+        """Yields pages in listing order from `start_offset`, prefetching up to `page_concurrency` ahead."""
+        first = self.fetch_page(start_offset, self.page_size)
+        yield first
+        # The registry may clamp the requested page size; step by what it applied.
+        limit = first["pagination"]["limit"]
+
+        def offsets():
+            offset = start_offset + limit
+            while offset < self.total:
+                yield offset
+                offset += limit
+
+        yield from map_bounded(lambda offset: self.fetch_page(offset, limit), offsets(), self.page_concurrency, ordered=True)
+
+    def entity_record(self, entity):
+        """The output record for one listed entity, with its authorizations if enabled."""
+        record = {"entity": entity}
+        if not self.authorizations:
+            return record
+
+        params = {"time": self.filters["time"]} if "time" in self.filters else None
+        try:
+            response = self.transport.request(
+                "get",
+                f"{self.base_url}/entities/{quote(entity['entity_id'], safe='')}/authorizations",
+                headers=self.headers,
+                endpoint="GET /entities/{entity_id}/authorizations",
+                params=params,
+            )
+        except self.transport.errors as ex:
+            record["error"] = f"{type(ex).__name__}: {ex}"
+            return record
+
+        record["status"] = response.status_code
+        if response.status_code == 200:
+            try:
+                record["authorizations"] = response.json()
+            except ValueError:
+                record["error"] = "Invalid JSON"
+                return record
+            schema_errors = self.validate_authorizations(record["authorizations"])
+            if schema_errors:
+                record["schema_errors"] = schema_errors
+        return record
+
+    def records(self, start_offset=0):
+        """Yields an output record for every entity from `start_offset`, in listing order."""
+        entities = (entity for page in self.pages(start_offset) for entity in page["items"])
+        if not self.authorizations:
+            return map(self.entity_record, entities)
+        return map_bounded(self.entity_record, entities, self.max_in_flight, ordered=True)
+
+    def checkpoint_key(self):
+        """Settings that must match for a checkpoint to be resumed."""
+        return {"base_url": self.base_url, "filters": self.filters, "authorizations": self.authorizations}
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    """Writes the checkpoint atomically, so an interruption never leaves it half-written."""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(state, checkpoint_file)
+    os.replace(temporary_path, path)
+
+
+def record_outcome(record):
+    if "error" in record:
+        return "error"
+    if "schema_errors" in record:
+        return "schema-invalid"
+    if "status" in record:
+        return str(record["status"])
+    return "listed"
+
+
+def crawl(crawler, output_path, checkpoint_path, checkpoint_every=1000, progress=None):
+    """Crawls into `output_path`, resuming from `checkpoint_path` if it exists. Returns a Counter of outcomes.
+
+    The output is truncated back to the last checkpoint before resuming, so an
+    interruption between checkpoints never duplicates or tears an entity line.
+    """
+    key = crawler.checkpoint_key()
+    state = load_checkpoint(checkpoint_path)
+    if state is not None and state["key"] != key:
+        raise CrawlError(f"Checkpoint {checkpoint_path} belongs to a different crawl: {state['key']}")
+    if state is not None and state["complete"]:
+        return Counter()
+    if state is None:
+        state = {"key": key, "written": 0, "output_bytes": 0, "total": None, "complete": False}
+
+    if state["written"] and not os.path.exists(output_path):
+        raise CrawlError(f"Checkpoint {checkpoint_path} records {state['written']} entities but {output_path} is missing")
+
+    outcomes = Counter()
+    with open(output_path, "r+b" if state["written"] else "wb") as output:
+        output.truncate(state["output_bytes"])
+        output.seek(state["output_bytes"])
+        try:
+            for record in crawler.records(state["written"]):
+                output.write(json.dumps(record).encode() + b"\n")
+                state["written"] += 1
+                outcomes[record_outcome(record)] += 1
+                if state["written"] % checkpoint_every == 0:
+                    output.flush()
+                    state["output_bytes"] = output.tell()
+                    state["total"] = crawler.total
+                    save_checkpoint(checkpoint_path, state)
+                    if progress is not None:
+                        progress(state)
+            state["complete"] = True
+        finally:
+            output.flush()
+            state["output_bytes"] = output.tell()
+            state["total"] = crawler.total
+            save_checkpoint(checkpoint_path, state)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl every entity listed by a Trust Registry into a JSON Lines file.")
+    parser.add_argument("--base-url", required=True, help="Trust Registry base URL.")
+    parser.add_argument("--bearer-token", help="Optional bearer token sent as the Authorization header.")
+    parser.add_argument("--output", required=True, help="JSON Lines file to write, one entity per line.")
+    parser.add_argument("--checkpoint", help="Checkpoint file. Defaults to the output path plus '.checkpoint'.")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint and crawl from the start.")
+    parser.add_argument("--page-size", type=int, default=1000, help="Requested GET /entities page size (max 1000).")
+    parser.add_argument("--page-concurrency", type=int, default=4, help="Pages requested ahead in parallel.")
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Authorization requests in flight at once."
+    )
+    parser.add_argument(
+        "--no-authorizations",
+        action="store_true",
+        help="Only list entities; skip GET /entities/{entity_id}/authorizations.",
+    )
+    parser.add_argument("--authority-id", help="Only list entities within this authority/ecosystem.")
+    parser.add_argument("--action", help="Only list entities holding an authorization for this action.")
+    parser.add_argument("--resource", help="Only list entities holding an authorization for this resource.")
+    parser.add_argument("--time", help="RFC3339 time the listing and authorizations are evaluated at.")
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=1000, help="Entities written between checkpoints."
+    )
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    headers = {"Authorization": f"Bearer {args.bearer_token}"} if args.bearer_token else None
+    crawler = EntityCrawler(
+        args.base_url,
+        headers,
+        page_size=args.page_size,
+        page_concurrency=args.page_concurrency,
+        max_in_flight=args.concurrency,
+        filters={
+            "authority_id": args.authority_id,
+            "action": args.action,
+            "resource": args.resource,
+            "time": args.time,
+        },
+        authorizations=not args.no_authorizations,
+    )
+
+    def progress(state):
+        print(f"{state['written']} of {state['total']} entities written", file=sys.stderr)
+
+    started = time.perf_counter()
+    try:
+        outcomes = crawl(crawler, args.output, checkpoint_path, args.checkpoint_every, progress)
+    except CrawlError as ex:
+        print(f"Crawl stopped: {ex}", file=sys.stderr)
+        print(
+            f"Run the same command again to resume from {checkpoint_path}, or pass --restart to start over.",
+            file=sys.stderr,
+        )
+        return 1
+    except KeyboardInterrupt:
+        print(f"Interrupted. Run the same command again to resume from {checkpoint_path}.", file=sys.stderr)
+        return 130
+    elapsed = time.perf_counter() - started
+
+    count = sum(outcomes.values())
+    if not count:
+        print(f"Nothing to do: {checkpoint_path} records a complete crawl. Use --restart to crawl again.", file=sys.stderr)
+        return 0
+    summary = ", ".join(f"{outcome}: {number}" for outcome, number in sorted(outcomes.items()))
+    print(f"Crawled {count} entities in {elapsed:.1f}s ({count / elapsed:.0f}/s). {summary}", file=sys.stderr)
+    return 1 if outcomes["error"] or outcomes["schema-invalid"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""Discovery of TRQP endpoints from DIDs.
+
+A registry's endpoint is the `serviceEndpoint.uri` of the `TRQP` service in
+its DID document. An ecosystem DID's `TRQP` service may instead name the trust
+registry DID, which is followed in turn. tools/did_creator_ui.py builds DIDs
+this way.
+
+`EndpointDiscovery.discover(did)` returns the base URL. DID documents come
+from pluggable resolvers, keyed by DID method prefix. did:peer:2 is built in,
+using `resolve_did_peer2_cached` from tools/did_peer_utils.py.
+
+Answers are cached with a TTL, and failures with a shorter one. Concurrent
+lookups of the same DID are collapsed into one resolution (single-flight), so
+a burst of queries for one ecosystem resolves its DID once.
+"""
+
+import argparse
+import os
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+from trqp_cache import MISSING, TrqpResponseCache
+
+
+TRQP_SERVICE_TYPE = "TRQP"
+DISCOVERY_PATH = "/discovery"
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tools")
+
+
+class DiscoveryError(Exception):
+    """No TRQP endpoint could be found for a DID."""
+
+
+# A cached failure. discover() raises a new DiscoveryError from it on every
+# lookup: re-raising one shared exception would grow its traceback each time.
+DiscoveryFailure = namedtuple("DiscoveryFailure", "message cause")
+
+
+def resolve_did_peer2_document(did):
+    """Built-in resolver for did:peer:2, which needs no network."""
+    if TOOLS_DIR not in sys.path:
+        sys.path.append(TOOLS_DIR)
+    try:
+        from did_peer_utils import resolve_did_peer2_cached
+    except ImportError as ex:
+        raise ImportError(
+            "did:peer:2 discovery uses tools/did_peer_utils.py: python -m pip install -r tools/requirements.txt"
+        ) from ex
+    try:
+        return resolve_did_peer2_cached(did)
+    except ValueError as ex:
+        raise DiscoveryError(f"Invalid did:peer:2 {did}: {ex}") from ex
+
+
+DEFAULT_RESOLVERS = {"did:peer:2": resolve_did_peer2_document}
+
+
+def trqp_service_uris(document):
+    """Yields the endpoint URIs of the `TRQP` services in a DID document, in order."""
+    for service in document.get("service") or ():
+        types = service.get("type")
+        if TRQP_SERVICE_TYPE not in (types if isinstance(types, list) else [types]):
+            continue
+        endpoints = service.get("serviceEndpoint")
+        for endpoint in endpoints if isinstance(endpoints, list) else [endpoints]:
+            uri = endpoint.get("uri") if isinstance(endpoint, dict) else endpoint
+            if isinstance(uri, str) and uri:
+                yield uri
+
+
+class EndpointDiscovery:
+    """Maps authority and registry DIDs to TRQP base URLs, with caching and single-flight.
+
+    `registries` maps DIDs straight to base URLs, bypassing resolution.
+    `resolvers` maps DID method prefixes, such as `did:web` or `did:peer:2`, to
+    a callable that takes a DID and returns its DID document, or None if the
+    DID does not exist. The longest matching prefix wins, and these are merged
+    over the built-in did:peer:2 resolver. A service naming another DID is
+    followed up to `max_hops` DIDs.
+    """
+
+    def __init__(
+        self,
+        registries=None,
+        resolvers=None,
+        ttl=300.0,
+        negative_ttl=30.0,
+        max_hops=4,
+        cache=None,
+    ):
+        self.registries = dict(registries or {})
+        self.resolvers = {**DEFAULT_RESOLVERS, **(resolvers or {})}
+        self.max_hops = max_hops
+        self.cache = cache or TrqpResponseCache(ttl=ttl, negative_ttl=negative_ttl)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.resolutions = 0
+
+    def key(self, did):
+        # key[2] is the DID, so TrqpResponseCache.invalidate_entities forgets it.
+        return ("", DISCOVERY_PATH, did)
+
+    def discover(self, did):
+        """Returns the TRQP base URL for `did`. Raises DiscoveryError if there is none."""
+        answer = self.cache.get(self.key(did))
+        if answer is MISSING:
+            with self.lock:
+                future = self.in_flight.get(did)
+                leader = future is None
+                if leader:
+                    # A resolution may have finished since the cache was checked.
+                    answer = self.cache.get(self.key(did))
+                    if answer is MISSING:
+                        future = self.in_flight[did] = Future()
+                    else:
+                        leader = False
+            if leader:
+                answer = DiscoveryFailure(f"Resolving {did} was interrupted", None)
+                try:
+                    answer = self.resolve_and_cache(did)
+                finally:
+                    with self.lock:
+                        del self.in_flight[did]
+                    future.set_result(answer)
+            elif answer is MISSING:
+                answer = future.result()
+        if isinstance(answer, DiscoveryFailure):
+            raise DiscoveryError(answer.message) from answer.cause
+        return answer
+
+    def resolve_and_cache(self, did):
+        """Follows `did` to a base URL and caches the URL or the DiscoveryFailure. Returns it."""
+        try:
+            answer = self.follow(did)
+            ttl = self.cache.ttl
+        except DiscoveryError as ex:
+            answer = DiscoveryFailure(str(ex), ex.__cause__)
+            ttl = self.cache.negative_ttl
+        except Exception as ex:
+            # A resolver bug or outage: report it, but do not cache it.
+            return DiscoveryFailure(f"Resolving {did} failed: {ex!r}", ex)
+        self.cache.put(self.key(did), answer, ttl)
+        return answer
+
+    def resolve_document(self, did):
+        prefix = max((prefix for prefix in self.resolvers if did.startswith(prefix)), key=len, default=None)
+        if prefix is None:
+            raise DiscoveryError(f"No DID resolver for {did}")
+        with self.lock:
+            self.resolutions += 1
+        return self.resolvers[prefix](did)
+
+    def follow(self, did):
+        seen = []
+        current = did
+        while True:
+            if current in self.registries:
+                return self.registries[current].rstrip("/")
+            if current.startswith(("https://", "http://")):
+                return current.rstrip("/")
+            if current in seen:
+                raise DiscoveryError(f"TRQP services of {did} form a cycle: {' -> '.join(seen + [current])}")
+            if len(seen) >= self.max_hops:
+                raise DiscoveryError(f"No TRQP endpoint for {did} within {self.max_hops} DIDs")
+            seen.append(current)
+            document = self.resolve_document(current)
+            uri = next(trqp_service_uris(document), None) if document else None
+            if uri is None:
+                raise DiscoveryError(f"No TRQP service in the DID document of {current}")
+            current = uri
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the TRQP endpoint of each DID.")
+    parser.add_argument("dids", nargs="+", help="Authority, ecosystem or registry DIDs.")
+    args = parser.parse_args()
+
+    discovery = EndpointDiscovery()
+    failures = 0
+    for did in args.dids:
+        try:
+            print(f"{did}\t{discovery.discover(did)}")
+        except DiscoveryError as ex:
+            failures += 1
+            print(f"{did}\t{ex}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""HTTP cache for the rarely changing TRQP GETs: `/metadata` and the lookups.
+
+`CachingTransport` wraps a `TrqpTransport` or `ResilientTransport`, keeping
+its interface. GET requests to `/metadata`, `/lookups/assuranceLevels`,
+`/lookups/authorizations` and `/lookups/didMethods` go through an `HttpCache`:
+
+- A fresh entry is returned without a request. Freshness comes from
+  `Cache-Control: max-age`, or from `Expires`, less any `Age`. Without either,
+  an entry with `Last-Modified` stays fresh for a tenth of its age, up to
+  `max_heuristic_ttl`.
+- A stale entry with an `ETag` is revalidated with `If-None-Match`, or, failing
+  that, with `If-Modified-Since` from its `Last-Modified`. A `304` refreshes the
+  entry and returns the cached body as a `200`.
+- `no-store` answers are never stored. `no-cache` answers are stored, but they
+  are revalidated on every use.
+
+Entries are keyed on the URL with its query string and a digest of the
+`Authorization` header, so an answer fetched with one token is never served
+for another. Concurrent requests for one URL share one fetch, and the requests
+that waited for it are reported as `coalesced`.
+
+With a `path`, entries are also kept in a SQLite database. Every process that
+opens the same file shares it. Before fetching, a process takes a lease on the
+URL, a `fcntl` lock on one byte of `<path>.lease`, and looks in the database
+again once it has it. So a fleet of workers starting on one host fetches each
+lookup once per `max-age` rather than once per worker.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from http.client import HTTPMessage
+from urllib.parse import urlencode, urlsplit
+
+from trqp_transport import HttpClientResponse
+
+
+CACHEABLE_PATHS = ("/metadata", "/lookups/assuranceLevels", "/lookups/authorizations", "/lookups/didMethods")
+
+# Response headers kept with an entry. The rest are not needed to serve or revalidate it.
+STORED_HEADERS = ("content-type", "etag", "last-modified", "cache-control", "expires", "date")
+
+HttpCacheEntry = namedtuple("HttpCacheEntry", "status headers body expires_at")
+HttpCacheEntry.__doc__ = """A cached response. `headers` is a dict with lower-case names,
+and `expires_at` is a wall-clock time, so entries can be shared between processes."""
+
+
+def http_date(value):
+    """Seconds since the epoch for an HTTP date, or None if it is missing or invalid."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def cache_directives(value):
+    """Parses a `Cache-Control` header into {directive: argument}, with lower-case names."""
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+
+def freshness_lifetime(headers, now, max_heuristic_ttl):
+    """Seconds a response stays fresh after it is received, or None if it must not be stored."""
+    directives = cache_directives(headers.get("cache-control"))
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    try:
+        age = max(0.0, float(headers.get("age") or 0))
+    except ValueError:
+        age = 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]) - age)
+        except ValueError:
+            return 0.0
+    date = http_date(headers.get("date")) or now
+    expires = http_date(headers.get("expires"))
+    if expires is not None:
+        return max(0.0, expires - date - age)
+    modified = http_date(headers.get("last-modified"))
+    if modified is not None:
+        return min(max_heuristic_ttl, max(0.0, (date - modified) / 10))
+    return 0.0
+
+
+class CachedResponse(HttpClientResponse):
+    """A response served from the cache, with `cache_outcome` set to `hit` or `revalidated`."""
+
+    def __init__(self, entry, url, cache_outcome):
+        headers = HTTPMessage()
+        for name, value in entry.headers.items():
+            headers[name] = value
+        super().__init__(entry.status, headers, entry.body, url)
+        self.cache_outcome = cache_outcome
+
+
+class HttpCache:
+    """Thread-safe LRU of HttpCacheEntry objects, optionally backed by a SQLite file shared between processes."""
+
+    def __init__(self, path=None, max_entries=1000, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        self.lease_fd = None
+        if path:
+            # Not the database file itself: closing any descriptor of it would drop SQLite's own locks.
+            self.lease_fd = os.open(f"{path}.lease", os.O_RDWR | os.O_CREAT, 0o600)
+            self.db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, expires_at REAL)"
+            )
+
+    def get(self, key):
+        """Returns the entry for `key`, fresh or stale, or None.
+
+        A stale entry in memory is checked against the database first, since
+        another process may have refreshed it.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                if entry.expires_at > self.clock() or self.db is None:
+                    return entry
+            if self.db is None:
+                return None
+            row = self.db.execute(
+                "SELECT status, headers, body, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (entry is not None and row[3] <= entry.expires_at):
+                return entry
+            entry = HttpCacheEntry(row[0], json.loads(row[1]), bytes(row[2]), row[3])
+            self._remember(key, entry)
+            return entry
+
+    @contextmanager
+    def lease(self, key):
+        """Holds the fetch lease for `key` across processes, while one of them fetches it.
+
+        The lease is a lock on one byte of the lease file, at an offset taken
+        from the key's hash. Without a path, this does nothing.
+        """
+        fd = self.lease_fd
+        if fd is None:
+            yield
+            return
+        offset = int.from_bytes(hashlib.sha256(key.encode()).digest()[:5], "big")
+        fcntl.lockf(fd, fcntl.LOCK_EX, 1, offset)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, offset)
+
+    def put(self, key, entry):
+        with self.lock:
+            self._remember(key, entry)
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, entry.status, json.dumps(entry.headers), entry.body, entry.expires_at),
+                )
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM entries")
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+            if self.lease_fd is not None:
+                os.close(self.lease_fd)
+                self.lease_fd = None
+
+
+class CachingTransport:
+    """A transport that answers GETs to `paths` from an HttpCache, revalidating stale entries."""
+
+    def __init__(self, transport, cache=None, paths=CACHEABLE_PATHS, max_heuristic_ttl=300.0):
+        self.transport = transport
+        self.cache = cache or HttpCache()
+        self.paths = tuple(paths)
+        self.max_heuristic_ttl = max_heuristic_ttl
+        self.errors = transport.errors
+        self.instrumentation = transport.instrumentation
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def key(self, url, headers, params):
+        if params:
+            url += ("&" if urlsplit(url).query else "?") + urlencode(sorted(params.items()))
+        authorization = (headers or {}).get("Authorization")
+        if not authorization:
+            return url
+        return f"{url} {hashlib.sha256(authorization.encode()).hexdigest()[:32]}"
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        """Sends one request, or answers it from the cache. Returns the response."""
+        path = urlsplit(url).path
+        if method.upper() != "GET" or not path.endswith(self.paths):
+            return self.transport.request(method, url, headers=headers, endpoint=endpoint, **kwargs)
+        endpoint = endpoint or f"GET {path}"
+        key = self.key(url, headers, kwargs.get("params"))
+        entry = self.cache.get(key)
+        if entry is not None and entry.expires_at > self.cache.clock():
+            self.instrumentation.cache_outcome(endpoint, "hit")
+            return CachedResponse(entry, url, "hit")
+
+        # One fetch per URL at a time: the others wait for its answer.
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            self.instrumentation.cache_outcome(endpoint, "coalesced")
+            return future.result()
+        try:
+            response = self.leased_fetch(key, url, headers, endpoint, kwargs)
+        except BaseException as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            future.set_result(response)
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+        return response
+
+    def leased_fetch(self, key, url, headers, endpoint, kwargs):
+        """Fetches one URL under the cache's lease, unless another process stored a fresh answer meanwhile."""
+        with self.cache.lease(key):
+            entry = self.cache.get(key)
+            if entry is not None and entry.expires_at > self.cache.clock():
+                self.instrumentation.cache_outcome(endpoint, "hit")
+                return CachedResponse(entry, url, "hit")
+            return self.fetch(key, entry, url, headers, endpoint, kwargs)
+
+    def fetch(self, key, entry, url, headers, endpoint, kwargs):
+        """Fetches or revalidates one URL and stores the answer if it may be cached."""
+        headers = dict(headers or {})
+        if entry is not None:
+            if "etag" in entry.headers:
+                headers["If-None-Match"] = entry.headers["etag"]
+            elif "last-modified" in entry.headers:
+                headers["If-Modified-Since"] = entry.headers["last-modified"]
+        response = self.transport.request("get", url, headers=headers, endpoint=endpoint, **kwargs)
+        now = self.cache.clock()
+
+        if response.status_code == 304 and entry is not None:
+            stored = {**entry.headers, **self.stored_headers(response)}
+            lifetime = freshness_lifetime({**stored, "age": response.headers.get("Age")}, now, self.max_heuristic_ttl)
+            entry = entry._replace(headers=stored, expires_at=now + (lifetime or 0.0))
+            if lifetime is not None:
+                self.cache.put(key, entry)
+            self.instrumentation.cache_outcome(endpoint, "revalidated")
+            return CachedResponse(entry, url, "revalidated")
+
+        self.instrumentation.cache_outcome(endpoint, "miss")
+        if response.status_code == 200 and "*" not in response.headers.get("Vary", ""):
+            lifetime = freshness_lifetime(response.headers, now, self.max_heuristic_ttl)
+            stored = self.stored_headers(response)
+            if lifetime is not None and (lifetime > 0 or "etag" in stored or "last-modified" in stored):
+                self.cache.put(key, HttpCacheEntry(200, stored, response.content, now + lifetime))
+        return response
+
+    def stored_headers(self, response):
+        return {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+
+    def print_latency_report(self):
+        self.transport.print_latency_report()
+
+    def close(self):
+        self.cache.close()
+        self.transport.close()
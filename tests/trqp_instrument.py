@@ -0,0 +1,261 @@
+"""Instrumentation hooks for the TRQP query client, with an OpenMetrics exporter.
+
+`TrqpTransport` and `TrqpClient` report to an `Instrumentation`:
+
+- `request_finished(timing)` once per HTTP request, with a `RequestTiming`;
+- `cache_outcome(endpoint, outcome)` for each `TrqpResponseCache` or
+  `HttpCache` lookup, with `hit`, `miss`, `revalidated` for an HTTP cache
+  entry confirmed by a `304`, or `coalesced` for a request that waited for
+  another one's fetch;
+- `retry(endpoint, attempt, reason)` when a request is about to be retried.
+
+The default, `NO_INSTRUMENTATION`, does nothing. Its `active` flag is false, so
+the transport does not time request phases or build a `RequestTiming` at all.
+Subclass `Instrumentation` and set `active = True` to receive requests.
+
+`MetricsExporter` is the built-in implementation. It keeps per-endpoint
+counters and histograms of total and per-phase latency, renders them as
+OpenMetrics text for Prometheus, and can write one OpenTelemetry-style span
+per request, with child spans for its phases, as JSON Lines.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+
+PHASES = ("dns", "connect", "tls", "ttfb", "body")
+
+# Upper bounds in seconds, from a loopback round trip to a slow registry.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RequestTiming = namedtuple(
+    "RequestTiming", "endpoint method url status error start_time_ns duration new_connection " + " ".join(PHASES)
+)
+RequestTiming.__doc__ = """One HTTP request as measured by TrqpTransport.
+
+`status` is None and `error` is the exception when no response was received.
+`duration` and the phases are in seconds. A phase is None when it was not
+measured: `dns`, `connect` and `tls` only apply to requests that opened a
+connection, and `tls` only to HTTPS. `ttfb` runs from the connection being
+ready to the response headers, and `body` covers reading the body, so the
+measured phases add up to `duration`.
+"""
+
+
+# The PhaseTimer of the request in progress on this thread, read by the timed connections.
+phase_timers = threading.local()
+
+
+class PhaseTimer:
+    """Collects connection phases for one request. The transport fills it in."""
+
+    __slots__ = ("dns", "connect", "tls", "_started")
+
+    def __init__(self):
+        self.dns = self.connect = self.tls = None
+
+    def trace(self, event_name, info):
+        """httpcore trace callback, used for HTTP/2. httpcore resolves names while connecting."""
+        now = time.perf_counter()
+        if event_name.endswith(".started"):
+            self._started = now
+        elif event_name == "connection.connect_tcp.complete":
+            self.connect = now - self._started
+        elif event_name == "connection.start_tls.complete":
+            self.tls = now - self._started
+
+
+class Instrumentation:
+    """No-op hooks. Subclasses override what they need and set `active = True`."""
+
+    active = False
+
+    def request_finished(self, timing):
+        pass
+
+    def cache_outcome(self, endpoint, outcome):
+        pass
+
+    def retry(self, endpoint, attempt, reason):
+        pass
+
+
+NO_INSTRUMENTATION = Instrumentation()
+
+
+class Histogram:
+    """Fixed-bucket histogram. `counts[i]` holds observations at most `bounds[i]`; the last is +Inf."""
+
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**pairs):
+    return "{" + ",".join(f'{name}="{label_value(value)}"' for name, value in pairs.items()) + "}"
+
+
+class MetricsExporter(Instrumentation):
+    """Thread-safe request metrics with OpenMetrics output and optional span output.
+
+    `spans` is a text file to write spans to, as JSON Lines. Spans cost a JSON
+    encode per request, so leave it unset where the overhead matters.
+    """
+
+    active = True
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, spans=None):
+        self.buckets = tuple(buckets)
+        self.spans = spans
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.phases = {}
+        self.requests = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.connections = defaultdict(int)
+        self.cache = defaultdict(int)
+        self.retries = defaultdict(int)
+
+    def request_finished(self, timing):
+        endpoint = timing.endpoint
+        with self.lock:
+            histogram = self.durations.get(endpoint)
+            if histogram is None:
+                histogram = self.durations[endpoint] = Histogram(self.buckets)
+            histogram.observe(timing.duration)
+            for phase in PHASES:
+                value = getattr(timing, phase)
+                if value is not None:
+                    key = (endpoint, phase)
+                    histogram = self.phases.get(key)
+                    if histogram is None:
+                        histogram = self.phases[key] = Histogram(self.buckets)
+                    histogram.observe(value)
+            if timing.error is None:
+                self.requests[(endpoint, str(timing.status))] += 1
+            else:
+                self.errors[(endpoint, type(timing.error).__name__)] += 1
+            if timing.new_connection:
+                self.connections[endpoint] += 1
+        if self.spans is not None:
+            self.write_spans(timing)
+
+    def cache_outcome(self, endpoint, outcome):
+        with self.lock:
+            self.cache[(endpoint, outcome)] += 1
+
+    def retry(self, endpoint, attempt, reason):
+        with self.lock:
+            self.retries[(endpoint, reason)] += 1
+
+    def write_spans(self, timing):
+        """Writes the request span and one child span per measured phase, in order."""
+        trace_id = f"{random.getrandbits(128):032x}"
+        span_id = f"{random.getrandbits(64):016x}"
+        end_ns = timing.start_time_ns + int(timing.duration * 1e9)
+        attributes = {"http.request.method": timing.method.upper(), "url.full": timing.url}
+        if timing.status is not None:
+            attributes["http.response.status_code"] = timing.status
+        attributes["trqp.connection.new"] = timing.new_connection
+        spans = [
+            {
+                "trace_id": trace_id,
+                "span_id": span_id,
+                "parent_span_id": None,
+                "name": timing.endpoint,
+                "kind": "CLIENT",
+                "start_time_unix_nano": timing.start_time_ns,
+                "end_time_unix_nano": end_ns,
+                "attributes": attributes,
+                "status": {"code": "ERROR", "message": repr(timing.error)} if timing.error else {"code": "UNSET"},
+            }
+        ]
+        phase_start = timing.start_time_ns
+        for phase in PHASES:
+            value = getattr(timing, phase)
+            if value is None:
+                continue
+            phase_end = phase_start + int(value * 1e9)
+            spans.append(
+                {
+                    "trace_id": trace_id,
+                    "span_id": f"{random.getrandbits(64):016x}",
+                    "parent_span_id": span_id,
+                    "name": phase,
+                    "kind": "INTERNAL",
+                    "start_time_unix_nano": phase_start,
+                    "end_time_unix_nano": phase_end,
+                    "attributes": {},
+                    "status": {"code": "UNSET"},
+                }
+            )
+            phase_start = phase_end
+        lines = "".join(json.dumps(span, separators=(",", ":")) + "\n" for span in spans)
+        with self.lock:
+            self.spans.write(lines)
+
+    def openmetrics(self):
+        """The metrics in the OpenMetrics text format, ending with `# EOF`."""
+        with self.lock:
+            lines = []
+            self._histograms(
+                lines,
+                "trqp_client_request_duration_seconds",
+                "Request latency, connection set-up and body included.",
+                {labels(endpoint=endpoint): histogram for endpoint, histogram in self.durations.items()},
+            )
+            self._histograms(
+                lines,
+                "trqp_client_request_phase_duration_seconds",
+                "Request latency by phase: dns, connect, tls, ttfb, body.",
+                {labels(endpoint=endpoint, phase=phase): histogram for (endpoint, phase), histogram in self.phases.items()},
+            )
+            for name, help_text, values, label_names in (
+                ("trqp_client_requests", "Responses received, by status code.", self.requests, ("endpoint", "status")),
+                ("trqp_client_request_errors", "Requests with no response, by error.", self.errors, ("endpoint", "error")),
+                ("trqp_client_connections_opened", "Requests that opened a new connection.", self.connections, None),
+                ("trqp_client_cache_lookups", "Response cache lookups, by outcome.", self.cache, ("endpoint", "outcome")),
+                ("trqp_client_retries", "Retried requests, by reason.", self.retries, ("endpoint", "reason")),
+            ):
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"# HELP {name} {help_text}")
+                for key, count in sorted(values.items()):
+                    label_text = labels(endpoint=key) if label_names is None else labels(**dict(zip(label_names, key)))
+                    lines.append(f"{name}_total{label_text} {count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _histograms(self, lines, name, help_text, histograms):
+        lines.append(f"# TYPE {name} histogram")
+        lines.append(f"# UNIT {name} seconds")
+        lines.append(f"# HELP {name} {help_text}")
+        for label_text, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{label_text[:-1]},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_count{label_text} {cumulative}")
+            lines.append(f"{name}_sum{label_text} {histogram.sum}")
+
+    def write_openmetrics(self, path):
+        """Writes the metrics to `path` atomically, e.g. for the node_exporter textfile collector."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as output:
+            output.write(self.openmetrics())
+        os.replace(temporary, path)
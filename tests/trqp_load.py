@@ -0,0 +1,274 @@
+"""Concurrent load driver used by the smoke test's `--load` mode.
+
+The driver replays the smoke-test POST payloads from concurrent workers
+sharing one pooled transport, optionally paced to a target request rate, and
+reports throughput, latency percentiles, and an outcome histogram per endpoint.
+`run_load` runs the workers as threads over a blocking transport.
+`run_load_async` runs them as tasks over an AsyncTrqpTransport, which costs
+far less CPU per request: use it to reach thousands of requests per second.
+Successful responses can be schema-validated inline; invalid bodies are
+counted as errors.
+
+A paced run is open-loop: request `n` is due at `n / rate` seconds, however
+long earlier requests take. Latency is measured from that due time, so when
+the registry falls behind, the time requests spend waiting for a free worker
+counts against it, rather than the run quietly sending fewer requests
+(coordinated omission). Requests sent well after their due time, and those
+still unsent when the run ends, are reported as late.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from trqp_transport import LatencySamples
+
+
+# `validate`, when set, is a compiled schema validator applied to every 200 response body.
+# `params` is the query string of GET targets.
+LoadTarget = namedtuple(
+    "LoadTarget", "name method url headers payload expected_statuses validate params", defaults=(None, None)
+)
+
+# A request sent this long after its due time is late. Smaller delays are
+# scheduling noise: one GIL switch interval is 5 ms.
+LATE_AFTER = 0.005
+
+
+class EndpointStats:
+    """Latency samples and outcome counts for one endpoint.
+
+    Latencies are kept in a bounded reservoir, so a long run holds constant memory.
+    `late` counts requests sent more than LATE_AFTER behind schedule, and
+    `unsent` those the run ended before sending; the latter are also late.
+    """
+
+    def __init__(self):
+        self.latencies = LatencySamples()
+        self.outcomes = Counter()
+        self.errors = 0
+        self.late = 0
+        self.unsent = 0
+
+    def record(self, latency, outcome, ok, late=False):
+        self.latencies.add(latency)
+        self.outcomes[outcome] += 1
+        if not ok:
+            self.errors += 1
+        if late:
+            self.late += 1
+
+    def merge(self, other):
+        self.latencies.merge(other.latencies)
+        self.outcomes.update(other.outcomes)
+        self.errors += other.errors
+        self.late += other.late
+        self.unsent += other.unsent
+
+    @property
+    def count(self):
+        return self.latencies.count
+
+
+class Pacer:
+    """Hands out send slots on a fixed schedule, and positions in the target list, shared by all workers.
+
+    A slot is never skipped: when every worker was busy at its due time, the
+    next free worker takes it at once. Unthrottled, each slot is due when it is taken.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.started = time.monotonic()
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def take(self, deadline):
+        """The next slot's sequence number and due time, without waiting for it.
+
+        Returns None once the slot or the current time is past `deadline`.
+        """
+        with self.lock:
+            now = time.monotonic()
+            due = self.started + self.sent * self.interval if self.interval else now
+            if due >= deadline or now >= deadline:
+                return None
+            index = self.sent
+            self.sent += 1
+        return index, due
+
+    def wait(self, deadline):
+        """Takes the next slot and sleeps until it is due. Returns None, without sleeping, past `deadline`."""
+        slot = self.take(deadline)
+        if slot is not None:
+            delay = slot[1] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return slot
+
+    def unsent(self, deadline):
+        """Sequence numbers of the slots due before `deadline` that no worker took."""
+        if not self.interval:
+            return range(0)
+        # Rounded so that float error cannot add a slot due exactly at the deadline.
+        return range(self.sent, math.ceil(round((deadline - self.started) / self.interval, 6)))
+
+
+def run_worker(transport, targets, pacer, deadline):
+    stats = {target.name: EndpointStats() for target in targets}
+    while True:
+        slot = pacer.wait(deadline)
+        if slot is None:
+            break
+        index, due = slot
+        # Positions come from one counter, so the run as a whole walks the
+        # target list in order, whatever the number of workers.
+        target = targets[index % len(targets)]
+
+        late = time.monotonic() - due > LATE_AFTER
+        try:
+            response = transport.request(
+                target.method,
+                target.url,
+                headers=target.headers,
+                endpoint=target.name,
+                json=target.payload,
+                params=target.params,
+            )
+            outcome, ok = check_response(target, response)
+        except transport.errors as ex:
+            outcome = type(ex).__name__
+            ok = False
+        stats[target.name].record(time.monotonic() - due, outcome, ok, late)
+    return stats
+
+
+def check_response(target, response):
+    """Returns (outcome, ok) for a response to `target`."""
+    outcome = str(response.status_code)
+    ok = response.status_code in target.expected_statuses
+    if ok and response.status_code == 200 and target.validate is not None:
+        try:
+            valid = not target.validate(response.json())
+        except ValueError:
+            valid = False
+        if not valid:
+            outcome, ok = "200 schema-invalid", False
+    return outcome, ok
+
+
+def run_load(transport, targets, concurrency, duration, rate=0):
+    """Drives `targets` round-robin from `concurrency` threads for `duration` seconds.
+
+    List a target more than once to send it more often. With a `rate`, slots
+    still unsent at the end are counted against their targets as unsent.
+
+    Returns a mapping of target name to merged EndpointStats, and the elapsed time.
+    """
+    pacer = Pacer(rate)
+    started = pacer.started
+    deadline = started + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_worker, transport, targets, pacer, deadline) for _ in range(concurrency)]
+        results = {target.name: EndpointStats() for target in targets}
+        for future in futures:
+            for name, stats in future.result().items():
+                results[name].merge(stats)
+    count_unsent(results, targets, pacer, deadline)
+    return results, time.monotonic() - started
+
+
+def count_unsent(results, targets, pacer, deadline):
+    for index in pacer.unsent(deadline):
+        stats = results[targets[index % len(targets)].name]
+        stats.unsent += 1
+        stats.late += 1
+
+
+async def run_async_worker(transport, targets, pacer, deadline, results):
+    while True:
+        slot = pacer.take(deadline)
+        if slot is None:
+            break
+        index, due = slot
+        delay = due - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        target = targets[index % len(targets)]
+
+        late = time.monotonic() - due > LATE_AFTER
+        try:
+            response = await transport.request(
+                target.method, target.url, target.headers, target.name, target.params, target.payload
+            )
+            outcome, ok = check_response(target, response)
+        except transport.errors as ex:
+            outcome = type(ex).__name__
+            ok = False
+        results[target.name].record(time.monotonic() - due, outcome, ok, late)
+
+
+async def run_load_async(transport, targets, concurrency, duration, rate=0):
+    """Like run_load, with `concurrency` tasks on the running event loop sending through an AsyncTrqpTransport."""
+    pacer = Pacer(rate)
+    deadline = pacer.started + duration
+    results = {target.name: EndpointStats() for target in targets}
+    await asyncio.gather(
+        *(run_async_worker(transport, targets, pacer, deadline, results) for _ in range(concurrency))
+    )
+    count_unsent(results, targets, pacer, deadline)
+    return results, time.monotonic() - pacer.started
+
+
+class AsyncLoadRunner:
+    """Runs run_load_async calls on one event loop, with the run_load signature minus the transport.
+
+    An AsyncTrqpTransport's connections belong to the loop that opened them,
+    so every run, such as each stage of a capacity run, uses the same loop.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.loop = asyncio.new_event_loop()
+
+    def __call__(self, targets, concurrency, duration, rate=0):
+        return self.loop.run_until_complete(run_load_async(self.transport, targets, concurrency, duration, rate))
+
+    def close(self):
+        self.loop.run_until_complete(self.transport.aclose())
+        self.loop.close()
+
+
+def print_load_report(results, elapsed, concurrency, rate):
+    """Prints per-endpoint load results. Returns False when any request failed."""
+    target_rate = f"{rate:g} req/s" if rate else "unthrottled"
+    print("\n==================== Load Test Results ====================")
+    print(f"Elapsed: {elapsed:.1f}s  Concurrency: {concurrency}  Target rate: {target_rate}")
+
+    overall_success = True
+    for name, stats in results.items():
+        error_rate = stats.errors / stats.count if stats.count else 0.0
+        print(f"\n{name}")
+        print(
+            f"  requests: {stats.count}  throughput: {stats.count / elapsed:.1f} req/s  "
+            f"errors: {stats.errors} ({error_rate:.2%})"
+        )
+        if stats.late:
+            print(f"  late: {stats.late} ({stats.unsent} never sent before the run ended)")
+        print(
+            "  latency ms: "
+            + "  ".join(
+                f"{label}={stats.latencies.percentile(pct) * 1000:.2f}"
+                for label, pct in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+            )
+        )
+        print("  outcomes:")
+        for outcome, count in stats.outcomes.most_common():
+            print(f"    {outcome:>24}: {count} ({count / stats.count:.2%})")
+        overall_success = overall_success and stats.count > 0 and stats.errors == 0
+
+    print("============================================================")
+    return overall_success
@@ -0,0 +1,387 @@
+"""Compact, array-backed index of PARC authorizations with validity intervals.
+
+`ParcIndex` answers the questions a registry is asked about authorizations,
+including at a past `context.time`:
+
+- point queries: does entity E hold (authority, action, resource) at time T,
+  in O(log n);
+- listings: which entities hold a matching authorization at time T, with a
+  total, paginated in `entity_id` order, without visiting every record.
+
+Memory is kept compact for registries with tens of millions of records:
+
+- entity IDs are stored once, sorted, in a single UTF-8 blob with an offsets
+  array, and referred to everywhere else by their rank;
+- authorities, actions and resources are small vocabularies, interned once;
+- validity intervals live in `array` columns, not in a Python object per record.
+
+Records for one (authority, action, resource) scope are sorted by entity and
+start time, and overlapping intervals of the same entity are merged. Each scope
+is an `IntervalListing`. A listing keeps, per block of `BLOCK_SIZE` records, a
+sorted copy of the start and end times. The number of intervals in a block
+that hold at T is then two bisections, so counting and seeking to a page
+offset touch `n / BLOCK_SIZE` blocks instead of `n` records. Filters spanning
+several scopes, such as an authority alone, merge their scopes' listings on
+first use.
+
+Add records with `add()`, then call `build()` once. The index is read-only after
+that.
+"""
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from functools import partial
+from itertools import accumulate, groupby
+from operator import itemgetter
+
+
+BLOCK_SIZE = 1024
+# Records sorted at a time while building. Sorted chunks are kept packed and merged.
+SORT_CHUNK = 1 << 20
+NEG_INF = float("-inf")
+POS_INF = float("inf")
+
+
+class EntityTable:
+    """Sorted, de-duplicated entity IDs in one blob. Indexing returns UTF-8 bytes."""
+
+    def __init__(self, sorted_entity_ids):
+        encoded = [entity_id.encode() for entity_id in sorted_entity_ids]
+        self.blob = b"".join(encoded)
+        self.offsets = array("I" if len(self.blob) < 2**32 else "Q", [0])
+        self.offsets.extend(accumulate(len(entity_id) for entity_id in encoded))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rank):
+        return self.blob[self.offsets[rank] : self.offsets[rank + 1]]
+
+    def entity_id(self, rank):
+        return self[rank].decode()
+
+    def rank(self, entity_id):
+        """Rank of `entity_id`, or None if it is not in the table. O(log n)."""
+        needle = entity_id.encode()
+        rank = bisect_left(self, needle)
+        if rank < len(self) and self[rank] == needle:
+            return rank
+        return None
+
+    def range_with_prefix(self, prefix):
+        """The [start, stop) ranks of entity IDs starting with `prefix`."""
+        needle = prefix.encode()
+        # IDs are valid UTF-8, so no ID continues the prefix with byte 0xFF.
+        return bisect_left(self, needle), bisect_left(self, needle + b"\xff")
+
+
+def did_method(did):
+    """`did:web` for `did:web:example.com`, or None for a value that is not a DID."""
+    parts = did.split(":", 2)
+    if len(parts) < 3 or parts[0] != "did":
+        return None
+    return f"did:{parts[1]}"
+
+
+def merge_intervals(triples):
+    """Merges overlapping or touching intervals per entity. Input is sorted by (entity, valid_from)."""
+    current = None
+    for entity, valid_from, valid_until in triples:
+        if current is not None and current[0] == entity and valid_from <= current[2]:
+            if valid_until > current[2]:
+                current[2] = valid_until
+            continue
+        if current is not None:
+            yield tuple(current)
+        current = [entity, valid_from, valid_until]
+    if current is not None:
+        yield tuple(current)
+
+
+class IntervalListing:
+    """Merged validity intervals of one listing, sorted by entity rank, with per-block time summaries."""
+
+    def __init__(self, triples):
+        self.entities = array("I")
+        self.valid_from = array("d")
+        self.valid_until = array("d")
+        for entity, valid_from, valid_until in merge_intervals(triples):
+            self.entities.append(entity)
+            self.valid_from.append(valid_from)
+            self.valid_until.append(valid_until)
+
+        # After merging, an entity has at most one interval holding at any time,
+        # so counting intervals counts entities. Entities with several disjoint
+        # intervals need a de-duplicated list for untimed listings.
+        distinct = array("I", sorted(set(self.entities)))
+        self.distinct_entities = self.entities if len(distinct) == len(self.entities) else distinct
+
+        self.block_from = array("d")
+        self.block_until = array("d")
+        for start in range(0, len(self.entities), BLOCK_SIZE):
+            self.block_from.extend(sorted(self.valid_from[start : start + BLOCK_SIZE]))
+            self.block_until.extend(sorted(self.valid_until[start : start + BLOCK_SIZE]))
+
+    def __len__(self):
+        return len(self.entities)
+
+    def triples(self):
+        return zip(self.entities, self.valid_from, self.valid_until)
+
+    def holds(self, entity, at):
+        """True if `entity` has an interval holding at `at`. O(log n)."""
+        position = bisect_left(self.entities, entity)
+        while position < len(self.entities) and self.entities[position] == entity:
+            if self.valid_from[position] <= at < self.valid_until[position]:
+                return True
+            position += 1
+        return False
+
+    def has_entity(self, entity):
+        position = bisect_left(self.entities, entity)
+        return position < len(self.entities) and self.entities[position] == entity
+
+    def block_count(self, start, at):
+        stop = min(start + BLOCK_SIZE, len(self.entities))
+        started = bisect_right(self.block_from, at, start, stop)
+        ended = bisect_right(self.block_until, at, start, stop)
+        # Every interval that ended by `at` also started by it, so the difference is what holds.
+        return started - ended
+
+    def page(self, at, offset, limit):
+        """Returns (entity ranks, total) for the entities holding at `at`, or at any time when `at` is None."""
+        if at is None:
+            return self.distinct_entities[offset : offset + limit].tolist(), len(self.distinct_entities)
+
+        total = 0
+        page = []
+        for start in range(0, len(self.entities), BLOCK_SIZE):
+            count = self.block_count(start, at)
+            if count and total + count > offset and len(page) < limit:
+                skip = max(0, offset - total)
+                for position in range(start, min(start + BLOCK_SIZE, len(self.entities))):
+                    if self.valid_from[position] <= at < self.valid_until[position]:
+                        if skip:
+                            skip -= 1
+                        elif len(page) < limit:
+                            page.append(self.entities[position])
+                        else:
+                            break
+            total += count
+        return page, total
+
+
+class ParcIndex:
+    """Authorizations with validity intervals, keyed on (authority_id, action, resource) and entity_id."""
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.scope_ids = {}
+        self.scopes = []
+        self.authorities = []
+        self.authority_numbers = {}
+        self.authority_of = array("I")
+        self.names = {}
+        self.entities = None
+        self.scope_listings = []
+        self.listing_scopes = {}
+        self.merged_listings = {}
+        self._merge_lock = threading.Lock()
+        self._entity_ids = {}
+        self._entity_list = []
+        self._scope = array("I")
+        self._entity = array("I")
+        self._from = array("d")
+        self._until = array("d")
+
+    def intern(self, value):
+        """Returns the single shared copy of a vocabulary string."""
+        return self.vocabulary.setdefault(value, value)
+
+    def add(self, entity_id, authority_id, action, resource, valid_from=NEG_INF, valid_until=POS_INF, name=None):
+        """Adds one authorization holding from `valid_from` up to `valid_until`, in seconds since the epoch."""
+        if self.entities is not None:
+            raise RuntimeError("ParcIndex is read-only after build()")
+        scope = (self.intern(authority_id), self.intern(action), self.intern(resource))
+        scope_id = self.scope_ids.get(scope)
+        if scope_id is None:
+            scope_id = self.scope_ids[scope] = len(self.scopes)
+            self.scopes.append(scope)
+            if scope[0] not in self.authority_numbers:
+                self.authority_numbers[scope[0]] = len(self.authorities)
+                self.authorities.append(scope[0])
+
+        entity = self._entity_ids.get(entity_id)
+        if entity is None:
+            entity = self._entity_ids[entity_id] = len(self._entity_list)
+            self._entity_list.append(entity_id)
+            # An entity's summary names the authority of its first record.
+            self.authority_of.append(self.authority_numbers[scope[0]])
+        if name:
+            self.names[entity] = name
+        self._scope.append(scope_id)
+        self._entity.append(entity)
+        self._from.append(valid_from)
+        self._until.append(valid_until)
+
+    def build(self):
+        """Sorts and indexes everything added so far. The index is read-only afterwards."""
+        # Sorting the IDs themselves holds one reference per entity; sorting
+        # entity numbers by ID would box every number and keep a key list too.
+        sorted_ids = sorted(self._entity_list)
+        rank = array("I", bytes(4 * len(sorted_ids)))
+        authority_of = array("I", bytes(4 * len(sorted_ids)))
+        for position, entity_id in enumerate(sorted_ids):
+            entity = self._entity_ids[entity_id]
+            rank[entity] = position
+            authority_of[position] = self.authority_of[entity]
+        self.entities = EntityTable(sorted_ids)
+        self.authority_of = authority_of
+        self.names = {rank[entity]: name for entity, name in self.names.items()}
+        self._entity_ids = self._entity_list = sorted_ids = None
+
+        valid_from, valid_until = self._from, self._until
+
+        def scope_triples(scope_records):
+            for entity_rank, group in groupby(scope_records, key=itemgetter(1)):
+                for record in sorted((record for _, _, record in group), key=valid_from.__getitem__):
+                    yield entity_rank, valid_from[record], valid_until[record]
+
+        # Every scope has at least one record, so listings come out in scope_id order.
+        self.scope_listings = [
+            IntervalListing(scope_triples(scope_records))
+            for _, scope_records in groupby(self._sorted_records(rank), key=itemgetter(0))
+        ]
+        self._scope = self._entity = self._from = self._until = None
+
+        groups = defaultdict(list)
+        for scope_id, (authority_id, action, resource) in enumerate(self.scopes):
+            for key in (
+                (authority_id, action, resource),
+                (authority_id, None, None),
+                (None, action, resource),
+                (None, None, None),
+            ):
+                groups[key].append(scope_id)
+        self.listing_scopes = {key: tuple(scope_ids) for key, scope_ids in groups.items()}
+
+    def _sorted_records(self, rank):
+        """Yields (scope_id, entity rank, record) for every record added, in that order.
+
+        Each record is packed into one integer. Chunks of SORT_CHUNK are sorted
+        and stored back into an array of 8 bytes per record, and the chunks are
+        merged, so only one chunk is ever held as Python ints.
+        """
+        scope, entity = self._scope, self._entity
+        record_bits = max(1, (len(scope) - 1).bit_length())
+        rank_bits = max(1, (len(rank) - 1).bit_length())
+        packed_bits = max(1, (len(self.scopes) - 1).bit_length()) + rank_bits + record_bits
+        # Keys too wide for an unsigned 64-bit array are kept in lists.
+        store = partial(array, "Q") if packed_bits <= 64 else list
+        chunks = [
+            store(
+                sorted(
+                    (((scope[record] << rank_bits) | rank[entity[record]]) << record_bits) | record
+                    for record in range(start, min(start + SORT_CHUNK, len(scope)))
+                )
+            )
+            for start in range(0, len(scope), SORT_CHUNK)
+        ]
+        record_mask, rank_mask = (1 << record_bits) - 1, (1 << rank_bits) - 1
+        for key in heapq.merge(*chunks):
+            yield key >> (rank_bits + record_bits), (key >> record_bits) & rank_mask, key & record_mask
+
+    def listing(self, authority_id=None, action=None, resource=None):
+        """The IntervalListing for a `listEntities` filter, or None if nothing matches it.
+
+        A filter spanning several scopes gets a listing merged from theirs on
+        first use, so filters that are never queried cost no memory.
+        """
+        scope_ids = self.listing_scopes.get((authority_id, action, resource))
+        if scope_ids is None:
+            return None
+        if len(scope_ids) == 1:
+            return self.scope_listings[scope_ids[0]]
+        with self._merge_lock:
+            if scope_ids not in self.merged_listings:
+                self.merged_listings[scope_ids] = IntervalListing(
+                    heapq.merge(*(self.scope_listings[scope_id].triples() for scope_id in scope_ids))
+                )
+            return self.merged_listings[scope_ids]
+
+    def __len__(self):
+        return len(self.entities)
+
+    def summary(self, rank):
+        summary = {"entity_id": self.entities.entity_id(rank), "authority_id": self.authorities[self.authority_of[rank]]}
+        if rank in self.names:
+            summary["name"] = self.names[rank]
+        return summary
+
+    def entity_summary(self, entity_id):
+        """The entity's listing summary, or None for an entity with no authorizations."""
+        rank = self.entities.rank(entity_id)
+        return None if rank is None else self.summary(rank)
+
+    def holds(self, entity_id, authority_id, action, resource, at):
+        """True if the entity holds the authorization at `at`. O(log n)."""
+        scope_id = self.scope_ids.get((authority_id, action, resource))
+        if scope_id is None:
+            return False
+        rank = self.entities.rank(entity_id)
+        return rank is not None and self.scope_listings[scope_id].holds(rank, at)
+
+    def entity_scopes(self, entity_id, at=None):
+        """(authority_id, action, resource) of the entity's authorizations holding at `at`, or ever when `at` is None."""
+        rank = self.entities.rank(entity_id)
+        if rank is None:
+            return []
+        return [
+            scope
+            for scope, listing in zip(self.scopes, self.scope_listings)
+            if (listing.has_entity(rank) if at is None else listing.holds(rank, at))
+        ]
+
+    def list_entities(self, authority_id=None, action=None, resource=None, at=None, limit=100, offset=0):
+        """Returns (entity summaries, total) for the listing filters, in `entity_id` order."""
+        if at is None and authority_id is None and action is None and resource is None:
+            # Every entity in the table holds some authorization.
+            ranks = range(offset, min(offset + limit, len(self.entities)))
+            return [self.summary(rank) for rank in ranks], len(self.entities)
+        listing = self.listing(authority_id, action, resource)
+        if listing is None:
+            return [], 0
+        ranks, total = listing.page(at, offset, limit)
+        return [self.summary(rank) for rank in ranks], total
+
+    def entity_count(self, authority_id=None):
+        if authority_id is None:
+            return len(self.entities)
+        listing = self.listing(authority_id)
+        return 0 if listing is None else len(listing.distinct_entities)
+
+    def did_methods(self):
+        """Maps each authority to the sorted DID methods of its entities."""
+        method_ranges = []
+        rank = 0
+        while rank < len(self.entities):
+            method = did_method(self.entities.entity_id(rank))
+            if method is None:
+                rank += 1
+                continue
+            start, stop = self.entities.range_with_prefix(f"{method}:")
+            method_ranges.append((method, start, stop))
+            rank = stop
+
+        # Scope listings are enough: an authority has a method if any of its scopes does.
+        methods = defaultdict(set)
+        for (authority_id, _, _), listing in zip(self.scopes, self.scope_listings):
+            entities = listing.distinct_entities
+            for method, start, stop in method_ranges:
+                position = bisect_left(entities, start)
+                if position < len(entities) and entities[position] < stop:
+                    methods[authority_id].add(method)
+        return {authority_id: sorted(methods[authority_id]) for authority_id in self.authorities}
@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""Local reference Trust Registry implementing every operation in the Ayra TRQP profile.
+
+The server answers from an in-memory `ParcStore` loaded from PARC JSON Lines
+files (see trqp_store.py), or from a synthetic population, so the smoke test,
+load mode, batch replay, crawler and client caches can be exercised and
+benchmarked offline. It is a single-threaded asyncio HTTP/1.1 server with
+keep-alive. `--workers` forks extra processes that share the listening socket
+and the loaded store, to use more than one CPU.
+
+Operations:
+
+- `POST /authorization`, `POST /recognition`: decided from the store at the
+  query's `context.time`, or now.
+- `GET /metadata`
+- `GET /entities`, `GET /entities/{entity_id}`, `GET /entities/{entity_id}/authorizations`
+- `GET /ecosystems/{ecosystem_id}`, `GET /ecosystems/{ecosystem_id}/recognitions`
+- `GET /lookups/assuranceLevels`, `GET /lookups/authorizations`, `GET /lookups/didMethods`
+
+`GET /metadata` and the lookups carry `ETag`, `Last-Modified` and
+`Cache-Control` headers, and answer conditional requests with `304`.
+
+The `--fault-*` options delay or fail a random share of requests, to exercise
+client retries, hedging and circuit breaking (trqp_resilience.py).
+
+It is a fixture and a performance baseline, not a production registry.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import time
+import traceback
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from trqp_store import ParcStore, format_time, parse_time
+
+
+MAX_BODY_SIZE = 1024 * 1024
+# Answers that change only when the records do; sent with ETag and Cache-Control.
+CACHEABLE_PATHS = frozenset(
+    {"/metadata", "/lookups/assuranceLevels", "/lookups/authorizations", "/lookups/didMethods"}
+)
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_SYNTHETIC_ENTITIES = 1000
+
+
+class ProblemError(Exception):
+    """Ends a request with a ProblemDetails response."""
+
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def problem(status, detail=None):
+    body = {"title": HTTPStatus(status).phrase, "status": status}
+    if detail:
+        body["detail"] = detail
+    return status, body
+
+
+def query_time(value):
+    """Seconds since the epoch for a `time` parameter, or now when it is absent."""
+    if not value:
+        return time.time()
+    try:
+        return parse_time(value)
+    except ValueError:
+        raise ProblemError(400, f"Invalid RFC3339 time: {value!r}") from None
+
+
+def parc_response(key, decision_field, decision, evaluated_at, query_context=None):
+    entity_id, authority_id, action, resource = key
+    response = {
+        "entity_id": entity_id,
+        "authority_id": authority_id,
+        "action": action,
+        "resource": resource,
+        decision_field: decision,
+        "time_evaluated": format_time(evaluated_at),
+    }
+    if query_context:
+        response["context"] = query_context
+        if "time" in query_context:
+            response["time_requested"] = query_context["time"]
+    return response
+
+
+class ReferenceRegistry:
+    """Maps requests to profile operations over a ParcStore. Transport-independent."""
+
+    def __init__(self, store, metadata, bearer_token=None, max_age=60, loaded_at=None):
+        self.store = store
+        self.metadata = metadata
+        self.bearer_token = bearer_token
+        self.max_age = max_age
+        # The store does not change after loading, so this dates every cacheable answer.
+        self.loaded_at = int(loaded_at or time.time())
+        self.last_modified = formatdate(self.loaded_at, usegmt=True)
+        self.get_routes = {
+            "/metadata": self.get_metadata,
+            "/entities": self.list_entities,
+            "/lookups/assuranceLevels": self.lookup_assurance_levels,
+            "/lookups/authorizations": self.lookup_authorizations,
+            "/lookups/didMethods": self.lookup_did_methods,
+        }
+        # Path templates with one `{id}` segment: (prefix segment, suffix segment or None) -> handler.
+        self.get_templates = {
+            ("entities", None): self.get_entity,
+            ("entities", "authorizations"): self.list_entity_authorizations,
+            ("ecosystems", None): self.get_ecosystem,
+            ("ecosystems", "recognitions"): self.list_ecosystem_recognitions,
+        }
+        self.post_routes = {
+            "/authorization": self.query_authorization,
+            "/recognition": self.query_recognition,
+        }
+
+    def handle(self, method, target, headers, body):
+        """Returns (status, JSON body) for one request."""
+        if self.bearer_token and headers.get("authorization") != f"Bearer {self.bearer_token}":
+            return problem(401, "Missing or invalid bearer token")
+        url = urlsplit(target)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        try:
+            if method == "GET":
+                return self.route_get(url.path, params)
+            if method == "POST":
+                handler = self.post_routes.get(url.path)
+                if handler is None:
+                    return problem(404)
+                return 200, handler(self.parse_query(body))
+            return problem(405)
+        except ProblemError as ex:
+            return problem(ex.status, ex.detail)
+
+    def cache_validators(self, target, headers, body):
+        """Adds caching headers to a 200 answer to GET /metadata or a lookup.
+
+        Returns (status, body, header lines). The body comes back encoded, or
+        as None when a matching `If-None-Match` or `If-Modified-Since` turns
+        the answer into a 304.
+        """
+        if urlsplit(target).path not in CACHEABLE_PATHS:
+            return 200, body, ""
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        etag = f'"{hashlib.blake2b(payload, digest_size=8).hexdigest()}"'
+        cache_control = f"{'private, ' if self.bearer_token else ''}max-age={self.max_age}"
+        lines = f"ETag: {etag}\r\nLast-Modified: {self.last_modified}\r\nCache-Control: {cache_control}\r\n"
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            not_modified = etag in tags or "*" in tags
+        else:
+            try:
+                not_modified = parsedate_to_datetime(headers["if-modified-since"]).timestamp() >= self.loaded_at
+            except (KeyError, TypeError, ValueError):
+                not_modified = False
+        if not_modified:
+            return 304, None, lines
+        return 200, payload, lines
+
+    def route_get(self, path, params):
+        handler = self.get_routes.get(path)
+        if handler is not None:
+            return 200, handler(params)
+        segments = path.strip("/").split("/")
+        if len(segments) in (2, 3):
+            handler = self.get_templates.get((segments[0], segments[2] if len(segments) == 3 else None))
+            if handler is not None:
+                return 200, handler(unquote(segments[1]), params)
+        return problem(404)
+
+    def parse_query(self, body):
+        try:
+            query = json.loads(body)
+        except ValueError:
+            raise ProblemError(400, "Invalid JSON") from None
+        if not isinstance(query, dict):
+            raise ProblemError(400, "Expected a JSON object")
+        for name in ("entity_id", "authority_id", "action", "resource"):
+            if not isinstance(query.get(name), str) or not query[name]:
+                raise ProblemError(400, f"Missing or invalid '{name}'")
+        context = query.get("context")
+        if context is not None and not isinstance(context, dict):
+            raise ProblemError(400, "'context' must be an object")
+        return query
+
+    def decide(self, query, decide, decision_field, denial):
+        key = (query["entity_id"], query["authority_id"], query["action"], query["resource"])
+        if not self.store.knows(key[0], key[1]):
+            raise ProblemError(404, "Entity or authority not found")
+        context = query.get("context") or {}
+        at = query_time(context.get("time"))
+        decision = decide(*key, at)
+        response = parc_response(key, decision_field, decision, time.time(), context)
+        if not decision:
+            response["message"] = denial
+        return response
+
+    def query_authorization(self, query):
+        return self.decide(query, self.store.authorized, "authorized", "No authorization holds at the requested time.")
+
+    def query_recognition(self, query):
+        return self.decide(query, self.store.recognized, "recognized", "No recognition holds at the requested time.")
+
+    def get_metadata(self, params):
+        return self.metadata
+
+    def list_entities(self, params):
+        authority_id, action, resource = params.get("authority_id"), params.get("action"), params.get("resource")
+        if (action is None) != (resource is None):
+            raise ProblemError(400, "'action' and 'resource' must be given together")
+        if authority_id is not None and authority_id not in self.store.authorities:
+            raise ProblemError(404, "Authority not found")
+        try:
+            limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+            offset = int(params.get("offset", 0))
+        except ValueError:
+            raise ProblemError(400, "'limit' and 'offset' must be integers") from None
+        if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+            raise ProblemError(400, f"'limit' must be 1-{MAX_PAGE_SIZE} and 'offset' at least 0")
+        at = query_time(params["time"]) if "time" in params else None
+        items, total = self.store.list_entities(authority_id, action, resource, at, limit, offset)
+        return {"items": items, "pagination": {"limit": limit, "offset": offset, "total": total}}
+
+    def get_entity(self, entity_id, params):
+        summary = self.store.entity_summary(entity_id)
+        if summary is None:
+            raise ProblemError(404, "Entity not found")
+        keys = self.store.entity_authorizations(entity_id)
+        return {
+            **summary,
+            "authorizations": [{"authority_id": key[1], "action": key[2], "resource": key[3]} for key in keys],
+        }
+
+    def list_entity_authorizations(self, entity_id, params):
+        if self.store.entity_summary(entity_id) is None:
+            raise ProblemError(404, "Entity not found")
+        at = query_time(params.get("time"))
+        now = time.time()
+        return [parc_response(key, "authorized", True, now) for key in self.store.entity_authorizations(entity_id, at)]
+
+    def get_ecosystem(self, ecosystem_id, params):
+        if ecosystem_id not in self.store.authorities:
+            raise ProblemError(404, "Ecosystem not found")
+        return {
+            "id": ecosystem_id,
+            "entity_count": self.store.entity_count(ecosystem_id),
+            "authorizations": [
+                {"action": action, "resource": resource}
+                for action, resource in self.store.authority_pairs.get(ecosystem_id, ())
+            ],
+        }
+
+    def list_ecosystem_recognitions(self, ecosystem_id, params):
+        if ecosystem_id not in self.store.authorities:
+            raise ProblemError(404, "Ecosystem not found")
+        at = query_time(params.get("time"))
+        now = time.time()
+        return [parc_response(key, "recognized", True, now) for key in self.store.active_recognitions(ecosystem_id, at)]
+
+    def authorities_for(self, params):
+        authority_id = params.get("authority_id")
+        if authority_id is None:
+            return sorted(self.store.authorities)
+        if authority_id not in self.store.authorities:
+            raise ProblemError(404, "Authority not found")
+        return [authority_id]
+
+    def lookup_assurance_levels(self, params):
+        return [
+            {"authority_id": authority_id, "assurance_level": level, "description": f"Assurance level {level}."}
+            for authority_id in self.authorities_for(params)
+            for level in sorted(self.store.assurance_levels.get(authority_id, ()))
+        ]
+
+    def lookup_authorizations(self, params):
+        pairs = sorted(
+            {pair for authority_id in self.authorities_for(params) for pair in self.store.authority_pairs.get(authority_id, ())}
+        )
+        return [{"action": action, "resource": resource} for action, resource in pairs]
+
+    def lookup_did_methods(self, params):
+        return [
+            {"identifier": method, "authority_id": authority_id}
+            for authority_id in self.authorities_for(params)
+            for method in self.store.authority_did_methods.get(authority_id, ())
+        ]
+
+
+class FaultInjector:
+    """Injects slow answers and transient errors, to exercise client retries and hedging.
+
+    Each request is delayed by `delay` seconds with probability `delay_rate`,
+    and otherwise answered with `error_status` with probability `error_rate`.
+    A `retry_after` is sent as a `Retry-After` header on those errors.
+    """
+
+    def __init__(self, delay_rate=0.0, delay=0.0, error_rate=0.0, error_status=503, retry_after=None, seed=None):
+        self.delay_rate = delay_rate
+        self.delay = delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+    def draw(self):
+        """Returns (delay in seconds, error status or None) for the next request."""
+        roll = self.random.random()
+        if roll < self.delay_rate:
+            return self.delay, None
+        if roll < self.delay_rate + self.error_rate:
+            return 0.0, self.error_status
+        return 0.0, None
+
+
+def encode_response(status, body, keep_alive, extra_headers=""):
+    """Encodes a response. `body` is a JSON value, already encoded bytes, or None for a 304."""
+    connection = f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    if body is None:
+        return f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n{extra_headers}{connection}".encode("latin-1")
+    payload = body if isinstance(body, bytes) else json.dumps(body, separators=(",", ":")).encode()
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n"
+        f"{extra_headers}"
+        f"{connection}"
+    )
+    return head.encode("latin-1") + payload
+
+
+async def serve_connection(registry, reader, writer, faults=None):
+    """Serves HTTP/1.1 requests on one connection until the client closes it or asks to."""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line.strip():
+                break
+            try:
+                method, target, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(encode_response(*problem(400, "Malformed request line"), False))
+                break
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                length = -1
+            if not 0 <= length <= MAX_BODY_SIZE or "transfer-encoding" in headers:
+                writer.write(encode_response(*problem(413 if length > MAX_BODY_SIZE else 400), False))
+                break
+
+            body = await reader.readexactly(length) if length else b""
+            delay, fault_status = faults.draw() if faults is not None else (0.0, None)
+            if delay:
+                await asyncio.sleep(delay)
+            extra_headers = ""
+            if fault_status is not None:
+                status, payload = problem(fault_status, "Injected fault")
+                if faults.retry_after is not None:
+                    extra_headers = f"Retry-After: {faults.retry_after}\r\n"
+            else:
+                try:
+                    status, payload = registry.handle(method, target, headers, body)
+                    if method == "GET" and status == 200:
+                        status, payload, extra_headers = registry.cache_validators(target, headers, payload)
+                except Exception:
+                    traceback.print_exc()
+                    status, payload = problem(500)
+            writer.write(encode_response(status, payload, keep_alive, extra_headers))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(registry, listener, faults=None):
+    server = await asyncio.start_server(
+        lambda reader, writer: serve_connection(registry, reader, writer, faults), sock=listener
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def build_store(record_paths, synthetic):
+    store = ParcStore()
+    started = time.perf_counter()
+    count = 0
+    for path in record_paths:
+        count += store.load_jsonl(path)
+    if synthetic:
+        store.add_synthetic(synthetic)
+        count += synthetic + 1
+    store.build_indexes()
+    elapsed = time.perf_counter() - started
+    print(
+        f"Loaded {count} records ({store.entity_count()} entities, {len(store.authorities)} authorities) "
+        f"in {elapsed:.1f}s",
+        file=sys.stderr,
+    )
+    return store
+
+
+def build_metadata(args, store):
+    metadata = {
+        "id": args.registry_id,
+        "name": "Reference Trust Registry",
+        "description": "Local reference Trust Registry for the Ayra TRQP profile tooling.",
+        "supported_did_methods": sorted(
+            {method for methods in store.authority_did_methods.values() for method in methods}
+        ),
+    }
+    if len(store.authorities) == 1:
+        metadata["authority_id"] = next(iter(store.authorities))
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local reference Trust Registry for the Ayra TRQP profile.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    parser.add_argument(
+        "--records", action="append", default=[], help="PARC JSON Lines file to load. May be repeated."
+    )
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        help=f"Add this many synthetic entities (default {DEFAULT_SYNTHETIC_ENTITIES} when no --records are given).",
+    )
+    parser.add_argument("--registry-id", default="did:example:trust-registry", help="DID returned by GET /metadata.")
+    parser.add_argument("--bearer-token", help="Require this bearer token on every request.")
+    parser.add_argument("--workers", type=int, default=1, help="Server processes sharing the listening socket.")
+    parser.add_argument(
+        "--max-age", type=int, default=60, help="Cache-Control max-age, in seconds, for /metadata and the lookups."
+    )
+    parser.add_argument("--fault-delay-rate", type=float, default=0.0, help="Fraction of requests to delay.")
+    parser.add_argument("--fault-delay", type=float, default=0.2, help="Seconds to delay those requests.")
+    parser.add_argument("--fault-error-rate", type=float, default=0.0, help="Fraction of requests to fail.")
+    parser.add_argument("--fault-status", type=int, default=503, help="Status code of failed requests.")
+    parser.add_argument("--fault-retry-after", help="Retry-After header value sent on failed requests.")
+    parser.add_argument("--fault-seed", type=int, help="Random seed for fault injection.")
+    args = parser.parse_args()
+
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("--workers requires a platform with os.fork")
+    synthetic = args.synthetic
+    if synthetic is None:
+        synthetic = 0 if args.records else DEFAULT_SYNTHETIC_ENTITIES
+    try:
+        store = build_store(args.records, synthetic)
+    except (OSError, ValueError) as ex:
+        parser.error(str(ex))
+    registry = ReferenceRegistry(store, build_metadata(args, store), args.bearer_token, args.max_age)
+
+    listener = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(1024)
+    # Workers fork after loading, so they share the store's memory copy-on-write.
+    children = []
+    for _ in range(args.workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            children = None
+            break
+        children.append(pid)
+
+    # Built after forking, so unseeded workers draw different faults.
+    faults = None
+    if args.fault_delay_rate or args.fault_error_rate:
+        faults = FaultInjector(
+            args.fault_delay_rate,
+            args.fault_delay,
+            args.fault_error_rate,
+            args.fault_status,
+            args.fault_retry_after,
+            args.fault_seed,
+        )
+
+    if children is not None:
+        print(
+            f"Reference Trust Registry listening on http://{args.host}:{listener.getsockname()[1]} "
+            f"({args.workers} worker{'s' if args.workers > 1 else ''})",
+            file=sys.stderr,
+        )
+    try:
+        asyncio.run(serve(registry, listener, faults))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        for pid in children or ():
+            os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
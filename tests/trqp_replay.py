@@ -0,0 +1,94 @@
+"""Streaming JSON Lines replay of TRQP queries, used by the smoke test's `--batch-file` mode.
+
+Each input line is one query object with the PARC request fields and an
+optional `"type"` of `"authorization"` (default) or `"recognition"`:
+
+    {"type": "authorization", "entity_id": "did:example:issuer", "authority_id": "did:example:ecosystem", "action": "issue", "resource": "credential"}
+
+Each output line records the input line number, the query type, the request
+body, and the registry's status and response. `200` responses are validated
+against the profile schema and carry `schema_errors` when invalid. Lines that
+cannot be parsed produce an output line with an `error` instead. Input is read and output is
+written one line at a time, so memory use does not grow with the file size.
+"""
+
+import json
+from collections import Counter
+
+from trqp_client import TrqpAuthorizationQuery, TrqpRecognitionQuery, map_bounded
+from trqp_schema import get_schema_registry
+
+
+QUERY_TYPES = {
+    "authorization": TrqpAuthorizationQuery,
+    "recognition": TrqpRecognitionQuery,
+}
+
+OPERATION_IDS = {
+    "/authorization": "queryAuthorization",
+    "/recognition": "queryRecognition",
+}
+
+
+def parse_query_line(line):
+    """Parses one JSON Lines query. Raises ValueError for lines that are not a valid query."""
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    query_type = data.pop("type", "authorization")
+    if not isinstance(query_type, str) or query_type not in QUERY_TYPES:
+        raise ValueError(f"Unknown query type '{query_type}'")
+    try:
+        return QUERY_TYPES[query_type].from_payload(data)
+    except KeyError as ex:
+        raise ValueError(f"Missing '{ex.args[0]}'") from None
+    except (TypeError, AttributeError) as ex:
+        raise ValueError(f"Malformed query: {ex}") from None
+
+
+def replay_line(client, validators, numbered_line):
+    """Runs one input line and returns its output record."""
+    line_number, line = numbered_line
+    record = {"line": line_number}
+    try:
+        query = parse_query_line(line)
+    except ValueError as ex:
+        record["error"] = f"Invalid query: {ex}"
+        return record
+
+    result = client.query(query)
+    record.update(
+        type=query.path.lstrip("/"),
+        query=query.payload(),
+        status=result.status,
+        response=result.data,
+    )
+    if result.error is not None:
+        record["error"] = f"{type(result.error).__name__}: {result.error}"
+    elif result.status == 200:
+        schema_errors = validators[query.path](result.data)
+        if schema_errors:
+            record["schema_errors"] = schema_errors
+    return record
+
+
+def replay(client, lines, max_in_flight, ordered=True):
+    """Yields an output record for every non-blank input line, with bounded concurrency."""
+    schemas = get_schema_registry()
+    validators = {path: schemas.response_validator(operation_id) for path, operation_id in OPERATION_IDS.items()}
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    return map_bounded(lambda item: replay_line(client, validators, item), numbered, max_in_flight, ordered)
+
+
+def replay_file(client, source, output, max_in_flight, ordered=True):
+    """Replays `source` into `output` as JSON Lines. Returns a Counter of outcomes."""
+    outcomes = Counter()
+    for record in replay(client, source, max_in_flight, ordered):
+        output.write(json.dumps(record) + "\n")
+        if "error" in record:
+            outcomes["error"] += 1
+        elif "schema_errors" in record:
+            outcomes["schema-invalid"] += 1
+        else:
+            outcomes[str(record["status"])] += 1
+    return outcomes
@@ -0,0 +1,299 @@
+"""Retries, hedged requests and circuit breaking for TrqpTransport.
+
+`ResilientTransport` wraps a `TrqpTransport` and keeps its interface, so
+`TrqpClient`, the crawler and the load driver use it unchanged:
+
+- Retries: connection errors, timeouts, and `429`, `502`, `503` and `504`
+  answers are retried up to `max_attempts` times. The waits grow
+  exponentially, with full jitter. A `Retry-After` header sets the wait
+  instead, if it is longer. If it asks for more than `max_retry_after`
+  seconds, the response is returned without retrying.
+- Hedging: with `hedge_percentile` set, a request still unanswered after that
+  percentile of its endpoint's recent latency gets one duplicate, and the
+  first answer wins. Hedges are capped at `max_hedge_ratio` of requests, so a
+  slow registry does not get twice the load. TRQP queries are read-only, so
+  the POST queries are hedged too.
+- Circuit breaking: after `failure_threshold` consecutive failures of one
+  endpoint on one host, requests to it fail fast with `CircuitOpenError` for
+  `reset_timeout` seconds. Then a single trial request is let through. A
+  success closes the circuit, and a failure opens it again. A request counts
+  once, with the outcome of its last attempt. Connection errors, timeouts,
+  `500` and the retried statuses are failures; other answers, such as
+  `501 Not Implemented`, show that the endpoint is up.
+
+Retries and hedges are reported to the transport's instrumentation through
+its `retry` hook, with the status code, exception name or `hedge` as reason.
+"""
+
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from trqp_transport import percentile
+
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class CircuitOpenError(Exception):
+    """The endpoint's circuit is open, so the request was not sent."""
+
+
+def retry_after(response, now=None):
+    """Seconds requested by a `Retry-After` header, or None if there is no valid one."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (now or time.time()))
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open trial."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=10.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self.trial else "open"
+
+    def allow(self):
+        """True if a request may be sent now."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if not self.trial and self.clock() - self.opened_at >= self.reset_timeout:
+                self.trial = True
+                return True
+            return False
+
+    def record(self, ok):
+        with self.lock:
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+            else:
+                self.failures += 1
+                # A failed trial reopens the circuit at once.
+                if self.failures >= self.failure_threshold or self.trial:
+                    self.opened_at = self.clock()
+            self.trial = False
+
+    def abandon(self):
+        """Ends a request that neither succeeded nor failed, so a half-open trial can be retried."""
+        with self.lock:
+            self.trial = False
+
+
+class LatencyWindow:
+    """Recent latencies of one endpoint, with a periodically refreshed percentile."""
+
+    def __init__(self, pct, size=256, min_samples=50, refresh_every=16):
+        self.pct = pct
+        self.samples = deque(maxlen=size)
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self.added = 0
+        self.cached = None
+        self.lock = threading.Lock()
+
+    def add(self, value):
+        with self.lock:
+            self.samples.append(value)
+            self.added += 1
+            if len(self.samples) >= self.min_samples and self.added % self.refresh_every == 0:
+                self.cached = percentile(sorted(self.samples), self.pct)
+
+    def threshold(self):
+        """The latency percentile, or None until `min_samples` latencies have been seen."""
+        return self.cached
+
+
+class ResilientTransport:
+    """A TrqpTransport with retries, optional hedging and per-endpoint circuit breakers."""
+
+    def __init__(
+        self,
+        transport,
+        max_attempts=3,
+        base_delay=0.05,
+        max_delay=2.0,
+        max_retry_after=30.0,
+        retry_statuses=RETRY_STATUSES,
+        hedge_percentile=None,
+        hedge_min_samples=50,
+        max_hedge_ratio=0.1,
+        failure_threshold=5,
+        reset_timeout=10.0,
+        hedge_workers=64,
+        sleep=time.sleep,
+    ):
+        self.transport = transport
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = frozenset(retry_statuses)
+        self.failure_statuses = self.retry_statuses | {500}
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+        self.errors = transport.errors + (CircuitOpenError,)
+        self.instrumentation = transport.instrumentation
+        self.breakers = {}
+        self.windows = {}
+        self.counts = Counter()
+        self.hedge_tokens = 1.0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=hedge_workers) if hedge_percentile else None
+
+    def breaker(self, key):
+        with self.lock:
+            breaker = self.breakers.get(key)
+            if breaker is None:
+                breaker = self.breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff before retry number `attempt`."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        """Sends one request with retries, hedging and circuit breaking. Returns the final response."""
+        endpoint = endpoint or f"{method.upper()} {urlsplit(url).path}"
+        key = (urlsplit(url).netloc, endpoint)
+        breaker = self.breaker(key) if self.failure_threshold else None
+        if breaker is not None and not breaker.allow():
+            with self.lock:
+                self.counts["circuit-open rejections"] += 1
+            raise CircuitOpenError(f"Circuit open for {endpoint} on {key[0]}")
+        failed = None
+        try:
+            response = self.retrying(key, method, url, headers, endpoint, kwargs)
+            failed = response.status_code in self.failure_statuses
+            return response
+        except self.transport.errors:
+            failed = True
+            raise
+        finally:
+            # The breaker counts requests, not attempts: a request that succeeds on a retry is a success.
+            # Anything else raised (a bug, KeyboardInterrupt) must not leave the circuit stuck half-open.
+            if breaker is not None and failed is None:
+                breaker.abandon()
+            elif breaker is not None:
+                breaker.record(not failed)
+
+    def retrying(self, key, method, url, headers, endpoint, kwargs):
+        """Sends attempts until one is not retried. Returns its response, or raises its error."""
+        attempt = 1
+        while True:
+            try:
+                response = self.send(key, method, url, headers, endpoint, kwargs)
+            except self.transport.errors as ex:
+                if attempt >= self.max_attempts:
+                    raise
+                reason, delay = type(ex).__name__, self.backoff(attempt)
+            else:
+                status = response.status_code
+                if status not in self.retry_statuses or attempt >= self.max_attempts:
+                    return response
+                reason, delay = str(status), self.backoff(attempt)
+                requested = retry_after(response)
+                if requested is not None:
+                    if requested > self.max_retry_after:
+                        return response
+                    delay = max(delay, requested)
+            with self.lock:
+                self.counts["retries"] += 1
+            self.instrumentation.retry(endpoint, attempt, reason)
+            self.sleep(delay)
+            attempt += 1
+
+    def timed(self, window, method, url, headers, endpoint, kwargs):
+        started = time.perf_counter()
+        response = self.transport.request(method, url, headers=headers, endpoint=endpoint, **kwargs)
+        window.add(time.perf_counter() - started)
+        return response
+
+    def send(self, key, method, url, headers, endpoint, kwargs):
+        """One attempt, hedged with a duplicate when it runs past the endpoint's latency percentile."""
+        if self.executor is None:
+            return self.transport.request(method, url, headers=headers, endpoint=endpoint, **kwargs)
+
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None:
+                window = self.windows[key] = LatencyWindow(self.hedge_percentile, min_samples=self.hedge_min_samples)
+            self.hedge_tokens = min(10.0, self.hedge_tokens + self.max_hedge_ratio)
+        threshold = window.threshold()
+        if threshold is None:
+            return self.timed(window, method, url, headers, endpoint, kwargs)
+
+        first = self.executor.submit(self.timed, window, method, url, headers, endpoint, kwargs)
+        done, _ = wait([first], timeout=threshold)
+        if done:
+            return first.result()
+        with self.lock:
+            hedge = self.hedge_tokens >= 1.0
+            if hedge:
+                self.hedge_tokens -= 1.0
+                self.counts["hedges"] += 1
+        if not hedge:
+            return first.result()
+        self.instrumentation.retry(endpoint, 0, "hedge")
+        second = self.executor.submit(self.timed, window, method, url, headers, endpoint, kwargs)
+
+        # The first response wins. A failed attempt only counts if both fail.
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self.lock:
+                            self.counts["hedge wins"] += 1
+                    return future.result()
+        return first.result()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+            counts["open circuits"] = sum(breaker.state != "closed" for breaker in self.breakers.values())
+        return counts
+
+    def print_latency_report(self):
+        self.transport.print_latency_report()
+        counts = self.stats()
+        print(
+            f"Resilience: retries={counts.get('retries', 0)} hedges={counts.get('hedges', 0)} "
+            f"hedge wins={counts.get('hedge wins', 0)} "
+            f"circuit-open rejections={counts.get('circuit-open rejections', 0)}"
+        )
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.transport.close()
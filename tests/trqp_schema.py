@@ -0,0 +1,318 @@
+"""Compiled JSON Schema validation for Ayra TRQP profile responses.
+
+The schemas are loaded once from the repository:
+
+- `trqp/schema/*.schema.json` and `schema/ayra_metadata.schema.json`, by `$id`
+  and by file name;
+- `components/schemas` of `trqp_ayra_profile_swagger.yaml`, by component name;
+- the `application/json` response schema of every swagger operation, by
+  `operationId` and status code.
+
+Each schema is compiled once into nested Python closures, with `$ref`s into
+swagger `components/schemas` resolved at compile time. A compiled validator
+returns an empty tuple for a valid document and a list of `$.path: message`
+strings otherwise. Only the keywords the profile uses are supported: `type`,
+`required`, `properties`, `additionalProperties`, `items`, `enum`, `allOf`,
+`minLength`, `maxLength`, `minItems`, `minimum`, `maximum`, `format`
+(`date-time` and `uri`) and `$ref`. Annotation keywords are ignored.
+
+Loading the swagger profile requires PyYAML. Without PyYAML, or when the
+profile is not next to the scripts (a copy of the tests directory on its own),
+response validators accept every document, and a warning saying why is printed
+once to stderr.
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SWAGGER_PATH = "trqp_ayra_profile_swagger.yaml"
+JSON_SCHEMA_GLOBS = ("trqp/schema/*.schema.json", "schema/*.schema.json")
+
+NO_ERRORS = ()
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "boolean": bool,
+    "integer": int,
+    "number": (int, float),
+}
+
+FORMATS = {
+    "date-time": re.compile(
+        r"^\d{4}-\d{2}-\d{2}[Tt]\d{2}:\d{2}:\d{2}(\.\d+)?([Zz]|[+-]\d{2}:\d{2})$"
+    ).match,
+    "uri": re.compile(r"^[A-Za-z][A-Za-z0-9+.\-]*:\S*$").match,
+}
+
+# Keywords that only annotate a schema and never affect validation.
+ANNOTATIONS = {"$id", "$schema", "title", "description", "example", "default", "format"}
+
+
+def _valid(value):
+    return None
+
+
+def _not_validated(data):
+    return NO_ERRORS
+
+
+def _prefix(key, found):
+    return [(key + path, message) for path, message in found]
+
+
+class SchemaRegistry:
+    """Loads the profile schemas once and hands out compiled validators."""
+
+    def __init__(self, root=REPO_ROOT):
+        self.root = Path(root)
+        self.schemas = {}
+        self.operations = {}
+        self._compiled = {}
+        self._refs = {}
+        self._swagger = None
+        # Why the swagger profile could not be loaded, if it could not.
+        self.unavailable = None
+        self._warned = False
+
+        for pattern in JSON_SCHEMA_GLOBS:
+            for path in sorted(self.root.glob(pattern)):
+                with path.open(encoding="utf-8") as schema_file:
+                    schema = json.load(schema_file)
+                self.schemas[path.name[: -len(".schema.json")]] = schema
+                if "$id" in schema:
+                    self.schemas[schema["$id"]] = schema
+
+        swagger_path = self.root / SWAGGER_PATH
+        try:
+            import yaml
+        except ImportError:
+            yaml = None
+        if not swagger_path.exists():
+            self.unavailable = f"{swagger_path} was not found"
+        elif yaml is None:
+            self.unavailable = "loading the swagger profile requires PyYAML (python -m pip install pyyaml)"
+        else:
+            # The libyaml loader parses the profile about ten times faster, which matters to probes.
+            loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+            with swagger_path.open(encoding="utf-8") as swagger_file:
+                self._swagger = yaml.load(swagger_file, Loader=loader)
+            self.schemas.update(self._swagger.get("components", {}).get("schemas", {}))
+            for path_item in self._swagger.get("paths", {}).values():
+                for operation in path_item.values():
+                    if isinstance(operation, dict) and "operationId" in operation:
+                        self.operations[operation["operationId"]] = operation
+
+    def validator(self, name):
+        """Compiled validator for a JSON schema `$id`/file name or a swagger component name."""
+        key = ("schema", name)
+        if key not in self._compiled:
+            if name not in self.schemas:
+                if self.unavailable:
+                    return self._not_validated()
+                raise KeyError(f"Unknown schema '{name}'")
+            self._compiled[key] = self._finish(self._compile(self.schemas[name]))
+        return self._compiled[key]
+
+    def response_validator(self, operation_id, status=200):
+        """Compiled validator for an operation's `application/json` response body."""
+        key = ("response", operation_id, status)
+        if key not in self._compiled:
+            if operation_id not in self.operations:
+                if self.unavailable:
+                    return self._not_validated()
+                raise KeyError(f"Unknown operationId '{operation_id}'")
+            responses = self.operations[operation_id].get("responses", {})
+            response = responses.get(status) or responses.get(str(status))
+            if response is None:
+                raise KeyError(f"Operation '{operation_id}' defines no {status} response")
+            schema = response.get("content", {}).get("application/json", {}).get("schema", {})
+            self._compiled[key] = self._finish(self._compile(schema))
+        return self._compiled[key]
+
+    def _not_validated(self):
+        """A validator that accepts everything, for a schema the missing swagger profile would have defined."""
+        if not self._warned:
+            self._warned = True
+            print(f"Warning: {self.unavailable}; response bodies are not schema-validated.", file=sys.stderr)
+        return _not_validated
+
+    def _finish(self, check):
+        def validate(data):
+            found = check(data)
+            if not found:
+                return NO_ERRORS
+            return [f"${path}: {message}" for path, message in found]
+
+        return validate
+
+    def _resolve_ref(self, ref):
+        if ref in self._refs:
+            compiled = self._refs[ref]
+            # A None entry means the ref is still being compiled (a recursive schema).
+            return compiled or (lambda value: self._refs[ref](value))
+
+        if not ref.startswith("#/"):
+            raise ValueError(f"Only local $refs are supported: '{ref}'")
+        target = self._swagger
+        for part in ref[2:].split("/"):
+            target = target[part]
+        self._refs[ref] = None
+        self._refs[ref] = self._compile(target)
+        return self._refs[ref]
+
+    def _compile(self, schema):
+        """Compiles one schema node into check(value) -> None or [(path, message), ...]."""
+        if "$ref" in schema:
+            return self._resolve_ref(schema["$ref"])
+
+        checks = [self._compile(sub_schema) for sub_schema in schema.get("allOf", [])]
+        type_name = schema.get("type")
+        if type_name == "object" or "properties" in schema or "required" in schema:
+            checks.append(self._compile_object(schema))
+        if type_name == "array" or "items" in schema:
+            checks.append(self._compile_array(schema))
+        checks.extend(self._compile_scalar(schema))
+
+        expected = JSON_TYPES.get(type_name)
+        unknown = set(schema) - ANNOTATIONS - {
+            "allOf", "type", "properties", "required", "additionalProperties", "items",
+            "enum", "minLength", "maxLength", "minItems", "minimum", "maximum",
+        }
+        if unknown:
+            raise ValueError(f"Unsupported schema keywords: {sorted(unknown)}")
+
+        reject_bool = type_name in ("integer", "number")
+
+        def check_type(value):
+            if not isinstance(value, expected) or (reject_bool and isinstance(value, bool)):
+                return [("", f"expected {type_name}, got {type(value).__name__}")]
+            return None
+
+        if not checks:
+            return check_type if expected is not None else _valid
+        if expected is None and len(checks) == 1:
+            return checks[0]
+
+        def check(value):
+            if expected is not None:
+                found = check_type(value)
+                if found:
+                    return found
+            found = None
+            for sub_check in checks:
+                sub_found = sub_check(value)
+                if sub_found:
+                    found = (found or []) + sub_found
+            return found
+
+        return check
+
+    def _compile_object(self, schema):
+        required = schema.get("required", [])
+        properties = {
+            name: self._compile(sub_schema) for name, sub_schema in schema.get("properties", {}).items()
+        }
+        additional = schema.get("additionalProperties", True)
+        if isinstance(additional, dict):
+            additional = self._compile(additional)
+
+        def check_object(value):
+            if not isinstance(value, dict):
+                return None
+            found = None
+            for name in required:
+                if name not in value:
+                    found = (found or []) + [("", f"missing required property '{name}'")]
+            for name, item in value.items():
+                item_check = properties.get(name)
+                if item_check is None:
+                    if additional is True:
+                        continue
+                    if additional is False:
+                        found = (found or []) + [("", f"unexpected property '{name}'")]
+                        continue
+                    item_check = additional
+                item_found = item_check(item)
+                if item_found:
+                    found = (found or []) + _prefix(f".{name}", item_found)
+            return found
+
+        return check_object
+
+    def _compile_array(self, schema):
+        item_check = self._compile(schema["items"]) if "items" in schema else None
+        min_items = schema.get("minItems")
+
+        def check_array(value):
+            if not isinstance(value, list):
+                return None
+            found = None
+            if min_items is not None and len(value) < min_items:
+                found = [("", f"expected at least {min_items} items")]
+            if item_check is not None:
+                for index, item in enumerate(value):
+                    item_found = item_check(item)
+                    if item_found:
+                        found = (found or []) + _prefix(f"[{index}]", item_found)
+            return found
+
+        return check_array
+
+    def _compile_scalar(self, schema):
+        checks = []
+        if "enum" in schema:
+            allowed = schema["enum"]
+            checks.append(lambda value: None if value in allowed else [("", f"expected one of {allowed}")])
+
+        min_length, max_length = schema.get("minLength"), schema.get("maxLength")
+        if min_length is not None or max_length is not None:
+            min_length = min_length or 0
+            max_length = max_length if max_length is not None else float("inf")
+
+            def check_length(value):
+                if isinstance(value, str) and not min_length <= len(value) <= max_length:
+                    return [("", f"length {len(value)} outside [{min_length}, {max_length}]")]
+                return None
+
+            checks.append(check_length)
+
+        minimum, maximum = schema.get("minimum"), schema.get("maximum")
+        if minimum is not None or maximum is not None:
+            minimum = minimum if minimum is not None else float("-inf")
+            maximum = maximum if maximum is not None else float("inf")
+
+            def check_range(value):
+                if isinstance(value, (int, float)) and not minimum <= value <= maximum:
+                    return [("", f"{value} outside [{minimum}, {maximum}]")]
+                return None
+
+            checks.append(check_range)
+
+        format_name = schema.get("format")
+        if format_name in FORMATS:
+            matches = FORMATS[format_name]
+
+            def check_format(value):
+                if isinstance(value, str) and not matches(value):
+                    return [("", f"'{value}' is not a valid {format_name}")]
+                return None
+
+            checks.append(check_format)
+        return checks
+
+
+_registry = None
+
+
+def get_schema_registry():
+    """Returns the process-wide SchemaRegistry, loading and compiling schemas on first use."""
+    global _registry
+    if _registry is None:
+        _registry = SchemaRegistry()
+    return _registry
@@ -0,0 +1,280 @@
+"""Cross-process cache of TRQP answers and DID documents, in a shared mmap file.
+
+A verifier running as many worker processes on one node keeps a
+`TrqpResponseCache` per process. Each one fills up separately, and each one
+holds its own copy of every answer. `SharedResponseCache` keeps the entries in
+one memory-mapped file instead. Every process that opens the file reads and
+fills the same entries. It has the `TrqpResponseCache` interface, so
+`TrqpClient`, `EndpointDiscovery` and `TrustChainResolver` take it as `cache`.
+
+- The file is a fixed number of fixed-size slots, so its size is bounded.
+  A key hashes to a bucket of `BUCKET_SLOTS` slots. A new entry takes a free
+  or expired slot in its bucket, or else the one stored longest ago.
+- Readers take no locks. Each slot has a sequence number that is odd while
+  the slot is written, and a CRC-32 of its key and value. A read that overlaps
+  a write sees a changed sequence number or a bad checksum and is a miss.
+- Writers in all processes are serialized by a `lockf` lock on the file.
+- Keys are the `repr` of the cache key tuple. Values are encoded with
+  `marshal`, so they must be built from None, booleans, numbers, strings,
+  bytes, tuples, lists and dicts. Other values, such as the failures cached
+  by discovery, and entries too large for a slot, stay out of the cache.
+  `marshal` is only safe for data written by the same Python version, so
+  keep the file private to one deployment.
+- Expiry times are wall-clock times, since the file outlives processes.
+
+Put the file on a memory-backed file system, such as `/dev/shm` on Linux.
+"""
+
+import fcntl
+import marshal
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from ast import literal_eval
+from contextlib import contextmanager
+
+from trqp_cache import MISSING, TrqpResponseCache
+
+
+MAGIC = b"TRQPSHC1"
+# magic, slot count, slot size.
+FILE_HEADER = struct.Struct("<8sII")
+FILE_HEADER_SIZE = 64
+# sequence, key hash, expires at, stored at, key length, value length, CRC-32.
+SLOT_HEADER = struct.Struct("<QQddHII")
+SEQUENCE = struct.Struct("<Q")
+EMPTY_SLOT = (0, 0.0, 0.0, 0, 0, 0)
+BUCKET_SLOTS = 8
+
+DOCUMENT_PATH = "/did-document"
+
+
+def key_bytes(key):
+    """Deterministic encoding of a cache key tuple, the same in every process."""
+    return repr(key).encode()
+
+
+def key_hash(encoded):
+    """A 64-bit hash of an encoded key, never 0, which marks an empty slot.
+
+    Not hash(), which is randomized per process. Stored keys are compared in
+    full, so a checksum is enough.
+    """
+    return (zlib.adler32(encoded) << 32 | zlib.crc32(encoded)) or 1
+
+
+def plain(value):
+    """Recursively copies a cached, read-only DID document into plain dicts and lists that marshal can encode."""
+    if isinstance(value, dict):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    return value
+
+
+class SharedResponseCache:
+    """A TrqpResponseCache that lives in a memory-mapped file shared by every process that opens it.
+
+    The first process creates the file with `slots` slots of `slot_size` bytes.
+    Later ones must use the same geometry, or get a ValueError. Hit, miss,
+    eviction and expiration counters are per process.
+    """
+
+    ttl_for = TrqpResponseCache.ttl_for
+
+    def __init__(self, path, slots=65536, slot_size=512, ttl=60.0, negative_ttl=10.0, clock=time.time):
+        if slots < BUCKET_SLOTS or slots % BUCKET_SLOTS:
+            raise ValueError(f"slots must be a multiple of {BUCKET_SLOTS}")
+        if slot_size % 64 or slot_size <= SLOT_HEADER.size:
+            raise ValueError("slot_size must be a multiple of 64 bytes")
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = FILE_HEADER_SIZE + slots * slot_size
+        with self.writing():
+            if os.fstat(self.fd).st_size == 0:
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, FILE_HEADER.pack(MAGIC, slots, slot_size), 0)
+            magic, self.slots, self.slot_size = FILE_HEADER.unpack(os.pread(self.fd, FILE_HEADER.size, 0))
+        if magic != MAGIC or (self.slots, self.slot_size) != (slots, slot_size):
+            os.close(self.fd)
+            raise ValueError(
+                f"{path} is not a shared cache with {slots} slots of {slot_size} bytes; remove it or match its geometry"
+            )
+        self.buckets = slots // BUCKET_SLOTS
+        self.max_entry = slot_size - SLOT_HEADER.size
+        self.map = mmap.mmap(self.fd, size)
+
+    @contextmanager
+    def writing(self):
+        """Holds the cross-process writer lock, and the thread lock under it."""
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+    def bucket(self, hashed):
+        """File offsets of the slots of the bucket for a key hash, starting at the key's preferred slot.
+
+        Most keys are in their preferred slot, so a hit usually reads one slot.
+        """
+        first = FILE_HEADER_SIZE + (hashed % self.buckets) * BUCKET_SLOTS * self.slot_size
+        start = (hashed // self.buckets) % BUCKET_SLOTS
+        return (first + (start + way) % BUCKET_SLOTS * self.slot_size for way in range(BUCKET_SLOTS))
+
+    def read(self, offset, hashed, encoded):
+        """The (expires at, value bytes) of the slot at `offset` if it holds `encoded`, or None. Lock-free."""
+        sequence, slot_hash, expires_at, _, key_length, value_length, checksum = SLOT_HEADER.unpack_from(
+            self.map, offset
+        )
+        if slot_hash != hashed or sequence & 1:
+            return None
+        start = offset + SLOT_HEADER.size
+        data = self.map[start : start + key_length + value_length]
+        if (
+            SEQUENCE.unpack_from(self.map, offset)[0] != sequence
+            or data[:key_length] != encoded
+            or zlib.crc32(data) != checksum
+        ):
+            return None
+        return expires_at, data[key_length:]
+
+    def get(self, key):
+        """Returns the cached value for `key`, or MISSING."""
+        encoded = key_bytes(key)
+        hashed = key_hash(encoded)
+        for offset in self.bucket(hashed):
+            found = self.read(offset, hashed, encoded)
+            if found is None:
+                continue
+            expires_at, value = found
+            if expires_at <= self.clock():
+                self.expirations += 1
+                break
+            self.hits += 1
+            return marshal.loads(value)
+        self.misses += 1
+        return MISSING
+
+    def put(self, key, value, ttl):
+        """Stores `value` for `ttl` seconds; `ttl=None` keeps it until evicted.
+
+        Values that marshal cannot encode, or that do not fit in a slot, are not stored.
+        """
+        encoded = key_bytes(key)
+        try:
+            data = encoded + marshal.dumps(value)
+        except ValueError:
+            data = b""
+        if not data or len(data) > self.max_entry:
+            self.rejected += 1
+            return
+        hashed = key_hash(encoded)
+        now = self.clock()
+        expires_at = math.inf if ttl is None else now + ttl
+        with self.writing():
+            victim, victim_rank = None, None
+            for offset in self.bucket(hashed):
+                _, slot_hash, slot_expires, stored_at, _, _, _ = SLOT_HEADER.unpack_from(self.map, offset)
+                if slot_hash == hashed and self.stored_key(offset) == encoded:
+                    victim, victim_rank = offset, (0, 0.0)
+                    break
+                # Prefer an empty slot, then an expired one, then the one stored longest ago.
+                rank = (0 if slot_hash == 0 else 1 if slot_expires <= now else 2, stored_at)
+                if victim is None or rank < victim_rank:
+                    victim, victim_rank = offset, rank
+            self.evictions += victim_rank[0] == 2
+            fields = (hashed, expires_at, now, len(encoded), len(data) - len(encoded), zlib.crc32(data))
+            self.write(victim, fields, data)
+
+    def stored_key(self, offset):
+        key_length = SLOT_HEADER.unpack_from(self.map, offset)[4]
+        start = offset + SLOT_HEADER.size
+        return self.map[start : start + key_length]
+
+    def write(self, offset, fields, data=b""):
+        """Rewrites one slot, with an odd sequence number while it changes. Call with the writer lock held."""
+        sequence = SEQUENCE.unpack_from(self.map, offset)[0]
+        sequence += sequence & 1  # A writer that died mid-write left it odd.
+        SEQUENCE.pack_into(self.map, offset, sequence + 1)
+        start = offset + SLOT_HEADER.size
+        self.map[start : start + len(data)] = data
+        SLOT_HEADER.pack_into(self.map, offset, sequence + 1, *fields)
+        SEQUENCE.pack_into(self.map, offset, sequence + 2)
+
+    def keys(self):
+        """Yields (offset, key) for every occupied slot, decoding the stored key tuples."""
+        for offset in range(FILE_HEADER_SIZE, len(self.map), self.slot_size):
+            if SLOT_HEADER.unpack_from(self.map, offset)[1]:
+                try:
+                    yield offset, literal_eval(self.stored_key(offset).decode())
+                except (SyntaxError, ValueError):
+                    continue
+
+    def invalidate_entities(self, entity_ids):
+        """Drops every entry about one of `entity_ids`, in every process. Returns the number of entries dropped."""
+        entity_ids = set(entity_ids)
+        with self.writing():
+            stale = [offset for offset, key in self.keys() if len(key) > 2 and key[2] in entity_ids]
+            for offset in stale:
+                self.write(offset, EMPTY_SLOT)
+        return len(stale)
+
+    def clear(self):
+        with self.writing():
+            for offset in range(FILE_HEADER_SIZE, len(self.map), self.slot_size):
+                self.write(offset, EMPTY_SLOT)
+
+    def stats(self):
+        now = self.clock()
+        entries = 0
+        for offset in range(FILE_HEADER_SIZE, len(self.map), self.slot_size):
+            _, slot_hash, expires_at, _, _, _, _ = SLOT_HEADER.unpack_from(self.map, offset)
+            entries += slot_hash != 0 and expires_at > now
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejected": self.rejected,
+        }
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+
+def shared_resolver(resolve, cache, ttl=None):
+    """Wraps a DID resolver so that the documents it returns are shared through `cache`.
+
+    The default `ttl=None` suits did:peer:2, whose documents never change.
+    Give resolvers of mutable DID methods, such as did:web, a TTL.
+    """
+
+    def resolve_shared(did):
+        key = ("", DOCUMENT_PATH, did)
+        document = cache.get(key)
+        if document is MISSING:
+            document = resolve(did)
+            if document is not None:
+                document = plain(document)
+                cache.put(key, document, ttl)
+        return document
+
+    return resolve_shared
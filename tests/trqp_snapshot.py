@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Sorted on-disk snapshots of a registry crawl, and a streaming diff between two of them.
+
+`build` turns the JSON Lines output of `trqp_crawl.py` into a snapshot file
+sorted by `entity_id`, using an external merge sort so memory use is bounded by
+`run_size` lines whatever the size of the crawl. Each snapshot line is
+
+    <entity_id> TAB <digest> TAB <canonical JSON record>
+
+where the record holds the entity summary and its authorizations. Fields the
+registry stamps at query time (`time_evaluated`, `time_requested`) are dropped
+and authorizations are sorted, so the digest only changes when the registry's
+data does. A sparse index of every `INDEX_STRIDE`-th `entity_id` is written
+next to the snapshot for point lookups.
+
+`diff` walks two snapshots side by side in one pass. Entities whose digests
+match are skipped without parsing their JSON. It reports added, removed and
+changed entities, and for changed entities the authorizations that were added,
+removed or changed.
+"""
+
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sys
+import tempfile
+from bisect import bisect_right
+from collections import Counter, namedtuple
+
+
+INDEX_STRIDE = 1024
+VOLATILE_FIELDS = ("time_evaluated", "time_requested")
+
+SnapshotEntry = namedtuple("SnapshotEntry", "entity_id digest record")
+
+
+def authorization_key(authorization):
+    return (authorization.get("authority_id"), authorization.get("action"), authorization.get("resource"))
+
+
+def snapshot_line(crawl_record):
+    """The snapshot line for one crawl output record."""
+    entity = crawl_record["entity"]
+    entity_id = entity["entity_id"]
+    # Control characters would break both the line format and the sort order.
+    if any(character < " " for character in entity_id):
+        raise ValueError(f"entity_id contains a control character: {entity_id!r}")
+
+    # Entities whose authorizations could not be fetched keep `null`, so a
+    # failed request is not mistaken for an entity losing all authorizations.
+    authorizations = crawl_record.get("authorizations")
+    if crawl_record.get("status") != 200 or not isinstance(authorizations, list):
+        authorizations = None
+    else:
+        authorizations = sorted(
+            (
+                {name: value for name, value in authorization.items() if name not in VOLATILE_FIELDS}
+                for authorization in authorizations
+            ),
+            key=lambda authorization: json.dumps(authorization, sort_keys=True),
+        )
+
+    record = json.dumps({"entity": entity, "authorizations": authorizations}, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.blake2b(record.encode(), digest_size=16).hexdigest()
+    return f"{entity_id}\t{digest}\t{record}\n"
+
+
+def parse_line(line):
+    entity_id, digest, record = line.rstrip("\n").split("\t", 2)
+    return SnapshotEntry(entity_id, digest, record)
+
+
+def _write_run(lines, directory):
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".run", delete=False) as run:
+        run.writelines(sorted(lines))
+        return run.name
+
+
+def build_snapshot(crawl_path, snapshot_path, run_size=100000):
+    """Writes a sorted snapshot of `crawl_path` and its index. Returns the number of entities.
+
+    Entities listed more than once by the crawl are written once.
+    """
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    with tempfile.TemporaryDirectory(dir=directory) as run_directory:
+        runs = []
+        lines = []
+        with open(crawl_path, encoding="utf-8") as crawl:
+            for raw in crawl:
+                if raw.strip():
+                    lines.append(snapshot_line(json.loads(raw)))
+                if len(lines) >= run_size:
+                    runs.append(_write_run(lines, run_directory))
+                    lines = []
+        if lines:
+            runs.append(_write_run(lines, run_directory))
+
+        run_files = [open(run, encoding="utf-8") for run in runs]
+        try:
+            return _write_snapshot(heapq.merge(*run_files), snapshot_path)
+        finally:
+            for run_file in run_files:
+                run_file.close()
+
+
+def _write_snapshot(sorted_lines, snapshot_path):
+    keys, offsets = [], []
+    count = 0
+    previous = None
+    with open(snapshot_path, "wb") as snapshot:
+        for line in sorted_lines:
+            entity_id = line[: line.index("\t")]
+            if entity_id == previous:
+                continue
+            previous = entity_id
+            if count % INDEX_STRIDE == 0:
+                keys.append(entity_id)
+                offsets.append(snapshot.tell())
+            snapshot.write(line.encode())
+            count += 1
+
+    with open(f"{snapshot_path}.idx", "w", encoding="utf-8") as index:
+        json.dump({"stride": INDEX_STRIDE, "count": count, "keys": keys, "offsets": offsets}, index)
+    return count
+
+
+class Snapshot:
+    """Read access to a snapshot file: ordered iteration and indexed lookup by `entity_id`."""
+
+    def __init__(self, path):
+        self.path = path
+        self._index = None
+
+    def __iter__(self):
+        with open(self.path, encoding="utf-8") as snapshot:
+            for line in snapshot:
+                yield parse_line(line)
+
+    def get(self, entity_id):
+        """Returns the decoded record for `entity_id`, or None. Reads at most one index stride."""
+        if self._index is None:
+            with open(f"{self.path}.idx", encoding="utf-8") as index:
+                self._index = json.load(index)
+        position = bisect_right(self._index["keys"], entity_id) - 1
+        if position < 0:
+            return None
+        with open(self.path, "rb") as snapshot:
+            snapshot.seek(self._index["offsets"][position])
+            for _ in range(self._index["stride"]):
+                line = snapshot.readline().decode("utf-8")
+                if not line:
+                    return None
+                entry = parse_line(line)
+                if entry.entity_id == entity_id:
+                    return json.loads(entry.record)
+                if entry.entity_id > entity_id:
+                    return None
+        return None
+
+
+def diff_authorizations(old, new):
+    """Added, removed and changed authorizations between two normalized lists, keyed on (authority, action, resource)."""
+    old_by_key = {authorization_key(authorization): authorization for authorization in old}
+    new_by_key = {authorization_key(authorization): authorization for authorization in new}
+    changes = {}
+    added = [new_by_key[key] for key in new_by_key.keys() - old_by_key.keys()]
+    removed = [old_by_key[key] for key in old_by_key.keys() - new_by_key.keys()]
+    changed = [
+        {"old": old_by_key[key], "new": new_by_key[key]}
+        for key in old_by_key.keys() & new_by_key.keys()
+        if old_by_key[key] != new_by_key[key]
+    ]
+    for name, items in (("added", added), ("removed", removed), ("changed", changed)):
+        if items:
+            changes[name] = sorted(items, key=lambda item: json.dumps(item, sort_keys=True))
+    return changes
+
+
+def changed_entity(old_entry, new_entry):
+    old = json.loads(old_entry.record)
+    new = json.loads(new_entry.record)
+    change = {"change": "changed", "entity_id": new_entry.entity_id}
+    if old["entity"] != new["entity"]:
+        change["entity"] = {"old": old["entity"], "new": new["entity"]}
+    if old["authorizations"] is None or new["authorizations"] is None:
+        if old["authorizations"] != new["authorizations"]:
+            change["authorizations_unknown"] = "old" if old["authorizations"] is None else "new"
+    else:
+        authorization_changes = diff_authorizations(old["authorizations"], new["authorizations"])
+        if authorization_changes:
+            change["authorizations"] = authorization_changes
+    return change
+
+
+def diff_snapshots(old, new):
+    """Yields one change record per entity that differs between two Snapshots, in `entity_id` order."""
+    old_entries, new_entries = iter(old), iter(new)
+    old_entry, new_entry = next(old_entries, None), next(new_entries, None)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None or (old_entry is not None and old_entry.entity_id < new_entry.entity_id):
+            yield {"change": "removed", "entity_id": old_entry.entity_id, **json.loads(old_entry.record)}
+            old_entry = next(old_entries, None)
+        elif old_entry is None or new_entry.entity_id < old_entry.entity_id:
+            yield {"change": "added", "entity_id": new_entry.entity_id, **json.loads(new_entry.record)}
+            new_entry = next(new_entries, None)
+        else:
+            if old_entry.digest != new_entry.digest:
+                yield changed_entity(old_entry, new_entry)
+            old_entry, new_entry = next(old_entries, None), next(new_entries, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build, query and diff sorted registry crawl snapshots.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build a snapshot from trqp_crawl.py output.")
+    build_parser.add_argument("crawl", help="JSON Lines output of trqp_crawl.py.")
+    build_parser.add_argument("snapshot", help="Snapshot file to write. The index is written to <snapshot>.idx.")
+    build_parser.add_argument("--run-size", type=int, default=100000, help="Lines sorted in memory at once.")
+
+    get_parser = subparsers.add_parser("get", help="Print the snapshot record of one entity.")
+    get_parser.add_argument("snapshot", help="Snapshot file.")
+    get_parser.add_argument("entity_id", help="Entity to look up.")
+
+    diff_parser = subparsers.add_parser("diff", help="Write the changes between two snapshots as JSON Lines.")
+    diff_parser.add_argument("old", help="Older snapshot file.")
+    diff_parser.add_argument("new", help="Newer snapshot file.")
+    diff_parser.add_argument("--output", default="-", help="File to write changes to, or '-' for stdout.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_snapshot(args.crawl, args.snapshot, args.run_size)
+        print(f"Wrote {count} entities to {args.snapshot}", file=sys.stderr)
+        return 0
+
+    if args.command == "get":
+        record = Snapshot(args.snapshot).get(args.entity_id)
+        if record is None:
+            print(f"{args.entity_id} is not in {args.snapshot}", file=sys.stderr)
+            return 1
+        print(json.dumps(record, indent=2))
+        return 0
+
+    counts = Counter()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        for change in diff_snapshots(Snapshot(args.old), Snapshot(args.new)):
+            output.write(json.dumps(change) + "\n")
+            counts[change["change"]] += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(
+        f"added: {counts['added']}, removed: {counts['removed']}, changed: {counts['changed']}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
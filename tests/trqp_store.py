@@ -0,0 +1,169 @@
+"""In-memory PARC record store behind the reference Trust Registry server.
+
+Records are loaded from JSON Lines, one record per line:
+
+    {"type": "authorization", "entity_id": "did:example:issuer", "authority_id": "did:example:ecosystem", "action": "issue", "resource": "credential", "valid_from": "2024-01-01T00:00:00Z"}
+
+- `type` is `"authorization"` (the default) or `"recognition"`.
+- `valid_from` and `valid_until` are optional RFC3339 times. The record holds
+  from `valid_from` up to, but not including, `valid_until`.
+- `name` and `assurance_level` are optional. `name` is shown in entity
+  summaries, and `assurance_level` is listed by `GET /lookups/assuranceLevels`.
+
+Every entity and authority that appears in a record is known to the store.
+Call `build_indexes()` after loading and before querying. Authorizations are
+indexed by trqp_parc_index.py, including for queries at a past time.
+"""
+
+import json
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from trqp_parc_index import ParcIndex
+
+
+ALWAYS = (float("-inf"), float("inf"))
+RECORD_TYPES = ("authorization", "recognition")
+
+SYNTHETIC_AUTHORITY = "did:example:ecosystem"
+SYNTHETIC_REGISTRY = "did:example:trust-registry"
+
+
+def parse_time(value):
+    """Seconds since the epoch for an RFC3339 timestamp. Raises ValueError if it is not one."""
+    if not isinstance(value, str):
+        raise ValueError(f"Expected an RFC3339 timestamp, got {value!r}")
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00").replace("z", "+00:00"))
+    if parsed.tzinfo is None:
+        raise ValueError(f"RFC3339 timestamp without a UTC offset: {value!r}")
+    return parsed.timestamp()
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def active(intervals, at):
+    return any(valid_from <= at < valid_until for valid_from, valid_until in intervals)
+
+
+class ParcStore:
+    """Authorization and recognition records with the indexes the profile operations need.
+
+    Authorizations, which can number in the tens of millions, live in a compact
+    `ParcIndex`. Recognitions between registries and ecosystems are few and
+    are kept in plain dicts.
+    """
+
+    def __init__(self):
+        self.index = ParcIndex()
+        # (entity_id, authority_id, action, resource) -> [(valid_from, valid_until), ...]
+        self.recognitions = defaultdict(list)
+        self.authority_recognitions = defaultdict(list)
+        self.recognized_entities = set()
+        self.authorities = set()
+        self.assurance_levels = defaultdict(set)
+        self.authority_pairs = {}
+        self.authority_did_methods = {}
+
+    def add(self, record):
+        """Adds one record dict. Raises ValueError for a record that is not a valid PARC record."""
+        record_type = record.get("type", "authorization")
+        if record_type not in RECORD_TYPES:
+            raise ValueError(f"Unknown record type '{record_type}'")
+        try:
+            key = tuple(record[name] for name in ("entity_id", "authority_id", "action", "resource"))
+        except KeyError as ex:
+            raise ValueError(f"Missing '{ex.args[0]}'") from None
+        if not all(isinstance(value, str) and value for value in key):
+            raise ValueError("PARC fields must be non-empty strings")
+
+        valid_from = parse_time(record["valid_from"]) if record.get("valid_from") else ALWAYS[0]
+        valid_until = parse_time(record["valid_until"]) if record.get("valid_until") else ALWAYS[1]
+        if valid_from >= valid_until:
+            raise ValueError("'valid_from' must be before 'valid_until'")
+        entity_id, authority_id = key[0], key[1]
+        self.authorities.add(authority_id)
+        if record_type == "recognition":
+            self.recognized_entities.add(entity_id)
+            if key not in self.recognitions:
+                self.authority_recognitions[authority_id].append(key)
+            self.recognitions[key].append((valid_from, valid_until))
+            return
+
+        self.index.add(*key, valid_from, valid_until, record.get("name"))
+        if record.get("assurance_level"):
+            self.assurance_levels[authority_id].add(record["assurance_level"])
+
+    def load_jsonl(self, path):
+        """Adds every record in a JSON Lines file. Returns the number of records added."""
+        count = 0
+        with open(path, encoding="utf-8") as records:
+            for line_number, line in enumerate(records, 1):
+                if not line.strip():
+                    continue
+                try:
+                    self.add(json.loads(line))
+                except ValueError as ex:
+                    raise ValueError(f"{path}:{line_number}: {ex}") from None
+                count += 1
+        return count
+
+    def add_synthetic(self, count):
+        """Adds `count` entities, each authorized to issue credentials in one ecosystem."""
+        valid_from = parse_time("2020-01-01T00:00:00Z")
+        self.authorities.add(SYNTHETIC_AUTHORITY)
+        for index in range(count):
+            self.index.add(f"did:example:entity{index}", SYNTHETIC_AUTHORITY, "issue", "credential", valid_from)
+        self.add(
+            {
+                "type": "recognition",
+                "entity_id": SYNTHETIC_REGISTRY,
+                "authority_id": SYNTHETIC_AUTHORITY,
+                "action": "recognize",
+                "resource": "trust-registry",
+            }
+        )
+
+    def build_indexes(self):
+        """Builds the authorization index and lookup tables. Call after the last add()."""
+        self.index.build()
+        pairs = defaultdict(set)
+        for authority_id, action, resource in self.index.scopes:
+            pairs[authority_id].add((action, resource))
+        self.authority_pairs = {authority_id: sorted(values) for authority_id, values in pairs.items()}
+        self.authority_did_methods = self.index.did_methods()
+
+    def authorized(self, entity_id, authority_id, action, resource, at):
+        return self.index.holds(entity_id, authority_id, action, resource, at)
+
+    def recognized(self, entity_id, authority_id, action, resource, at):
+        return active(self.recognitions.get((entity_id, authority_id, action, resource), ()), at)
+
+    def knows(self, entity_id, authority_id):
+        """True if both IDs appear in some record, as the subject and the authority respectively."""
+        if authority_id not in self.authorities:
+            return False
+        return entity_id in self.recognized_entities or self.index.entities.rank(entity_id) is not None
+
+    def entity_summary(self, entity_id):
+        """The entity's listing summary, or None for an entity with no authorizations."""
+        return self.index.entity_summary(entity_id)
+
+    def entity_count(self, authority_id=None):
+        return self.index.entity_count(authority_id)
+
+    def entity_authorizations(self, entity_id, at=None):
+        """PARC keys of the entity's authorizations that hold at `at`, or at any time when `at` is None."""
+        return [(entity_id, *scope) for scope in self.index.entity_scopes(entity_id, at)]
+
+    def active_recognitions(self, authority_id, at):
+        return [key for key in self.authority_recognitions.get(authority_id, ()) if active(self.recognitions[key], at)]
+
+    def list_entities(self, authority_id=None, action=None, resource=None, at=None, limit=100, offset=0):
+        """Returns (page of entity summaries, total) for the listing filters, in `entity_id` order.
+
+        Without `at`, entities holding any matching authorization are listed.
+        With `at`, the matching authorization must hold at that time.
+        """
+        return self.index.list_entities(authority_id, action, resource, at, limit, offset)
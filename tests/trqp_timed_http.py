@@ -0,0 +1,83 @@
+"""requests adapter whose connections report DNS, connect and TLS time.
+
+Used by TrqpTransport when an active Instrumentation is set. It lives apart
+from trqp_transport.py so that importing the transport does not import
+requests and urllib3.
+"""
+
+import socket
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+from trqp_instrument import phase_timers
+
+
+class TimedConnectionMixin:
+    """Records DNS and connect time in the current PhaseTimer when urllib3 opens a connection."""
+
+    def _new_conn(self):
+        timer = getattr(phase_timers, "current", None)
+        if timer is None:
+            return super()._new_conn()
+        started = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(
+                self._dns_host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM
+            )
+        except OSError:
+            # Let urllib3 resolve again and report the failure in its usual way.
+            return super()._new_conn()
+        resolved = time.perf_counter()
+        timer.dns = resolved - started
+
+        # Connect to the resolved addresses in order, as urllib3 itself would.
+        dns_host = self._dns_host
+        try:
+            for *_, address in addresses:
+                self._dns_host = address[0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (ConnectTimeoutError, NewConnectionError) as ex:
+                    error = ex
+            else:
+                raise error
+        finally:
+            self._dns_host = dns_host
+        timer.connect = time.perf_counter() - resolved
+        return sock
+
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        timer = getattr(phase_timers, "current", None)
+        started = time.perf_counter()
+        super().connect()
+        if timer is not None and timer.connect is not None:
+            timer.tls = time.perf_counter() - started - timer.dns - timer.connect
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report their DNS, connect and TLS time."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
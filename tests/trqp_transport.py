@@ -0,0 +1,320 @@
+"""Pooled HTTP transport shared by the smoke checks and the load driver.
+
+Every request goes through one connection pool with HTTP keep-alive, so the
+latency reported by the smoke test is registry work rather than repeated
+TCP/TLS handshakes. Requests that had to open a new connection are recorded as
+"cold" and requests that reused a pooled connection as "warm", so handshake
+cost can be told apart from query cost. HTTP/2 is available through the
+optional `httpx` dependency.
+
+With `stdlib=True`, requests go through `http.client` instead of `requests`.
+Each thread keeps one keep-alive connection per host. This suits a health
+probe that makes a single request, where importing `requests` would take
+longer than the request itself. `requests` and `httpx` are only imported by
+the transports that use them.
+
+Pass an active `Instrumentation` (see trqp_instrument.py) to also time each
+request's DNS, connect, TLS, time-to-first-byte and body phases. Without one,
+none of that work is done. The `http.client` transport reports total time
+only.
+"""
+
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from trqp_instrument import NO_INSTRUMENTATION, PhaseTimer, RequestTiming, phase_timers
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencySamples:
+    """Count and maximum of a latency series, plus a bounded uniform sample for percentiles.
+
+    Reservoir sampling keeps memory constant however many requests are made;
+    percentiles are exact until `capacity` samples have been recorded.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.count = 0
+        self.max = 0.0
+        self.samples = []
+
+    def add(self, value):
+        self.count += 1
+        self.max = max(self.max, value)
+        if len(self.samples) < self.capacity:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.capacity:
+                self.samples[slot] = value
+
+    def merge(self, other):
+        """Adds another series, keeping the sample uniform over both.
+
+        Each kept sample stands for count / len(samples) values of its series,
+        so draws alternate between the two in proportion to what they stand for.
+        """
+        mine, theirs = self.samples[:], other.samples[:]
+        random.shuffle(mine)
+        random.shuffle(theirs)
+        mine_weight = self.count / len(mine) if mine else 0.0
+        theirs_weight = other.count / len(theirs) if theirs else 0.0
+        mine_left, theirs_left = self.count, other.count
+        merged = []
+        while len(merged) < self.capacity and (mine or theirs):
+            if mine and (not theirs or random.random() * (mine_left + theirs_left) < mine_left):
+                merged.append(mine.pop())
+                mine_left -= mine_weight
+            else:
+                merged.append(theirs.pop())
+                theirs_left -= theirs_weight
+        self.samples = merged
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct):
+        if pct >= 100:
+            return self.max
+        return percentile(sorted(self.samples), pct)
+
+
+def json_dumps(value):
+    # HttpClientSession.request takes a `json` argument, like requests, which hides the module.
+    return json.dumps(value).encode()
+
+
+class HttpClientResponse:
+    """The parts of a requests.Response the clients use, for answers read with http.client."""
+
+    def __init__(self, status_code, headers, content, url):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HttpClientSession:
+    """A minimal requests-style session over http.client, with one keep-alive connection per host and thread."""
+
+    errors = (OSError, http.client.HTTPException)
+
+    def __init__(self):
+        self.headers = {}
+        self.connections_opened = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers=None, timeout=None, params=None, json=None, data=None, stream=False):
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        if params:
+            query = urlencode({name: value for name, value in params.items() if value is not None}, doseq=True)
+            target += ("&" if parts.query else "?") + query
+        headers = {**self.headers, **(headers or {})}
+        if json is not None:
+            data = json_dumps(json)
+            headers.setdefault("Content-Type", "application/json")
+
+        connections = self._local.__dict__.setdefault("connections", {})
+        key = (parts.scheme, parts.netloc)
+        while True:
+            connection = connections.get(key)
+            reused = connection is not None
+            if not reused:
+                connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+                connection = connections[key] = connection_class(parts.hostname, parts.port, timeout=timeout)
+                with self._lock:
+                    self.connections_opened += 1
+            try:
+                connection.request(method.upper(), target, body=data, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                del connections[key]
+                # The server closed an idle keep-alive connection: retry once on a new one.
+                if not reused:
+                    raise
+            except BaseException:
+                connection.close()
+                del connections[key]
+                raise
+        if response.will_close:
+            connection.close()
+            del connections[key]
+        return HttpClientResponse(response.status, response.headers, content, f"{parts.scheme}://{parts.netloc}{target}")
+
+    def close(self):
+        for connection in self._local.__dict__.pop("connections", {}).values():
+            connection.close()
+
+
+class TrqpTransport:
+    """Connection-pooled HTTP client that records cold and warm latency per endpoint."""
+
+    def __init__(
+        self, pool_size=10, keep_alive=True, http2=False, timeout=15, instrumentation=NO_INSTRUMENTATION, stdlib=False
+    ):
+        if http2 and stdlib:
+            raise ValueError("HTTP/2 needs httpx; it cannot be combined with the http.client transport")
+        self.timeout = timeout
+        self.http2 = http2
+        self.stdlib = stdlib
+        self.keep_alive = keep_alive
+        self.instrumentation = instrumentation
+        self.cold = defaultdict(LatencySamples)
+        self.warm = defaultdict(LatencySamples)
+        self._seen_hosts = set()
+        self._lock = threading.Lock()
+
+        if http2:
+            try:
+                import httpx
+            except ImportError as ex:
+                raise ImportError(
+                    "HTTP/2 support requires httpx: python -m pip install 'httpx[http2]'"
+                ) from ex
+            limits = httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size if keep_alive else 0,
+            )
+            self.session = httpx.Client(http2=True, limits=limits)
+            self.errors = (httpx.HTTPError,)
+        elif stdlib:
+            self.session = HttpClientSession()
+            self.errors = HttpClientSession.errors
+        else:
+            import requests
+
+            if instrumentation.active:
+                from trqp_timed_http import TimedHTTPAdapter as adapter_class
+            else:
+                from requests.adapters import HTTPAdapter as adapter_class
+            self.session = requests.Session()
+            adapter = adapter_class(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount("http://", adapter)
+            self.session.mount("https://", adapter)
+            self.errors = (requests.RequestException,)
+
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def request(self, method, url, headers=None, endpoint=None, **kwargs):
+        """Sends one request and records its latency under `endpoint` (defaults to method + path)."""
+        parts = urlsplit(url)
+        endpoint = endpoint or f"{method.upper()} {parts.path}"
+        instrumented = self.instrumentation.active
+        if instrumented:
+            timer, start_time_ns = self._start_timer(kwargs), time.time_ns()
+        opened_before = self._connections_opened(url)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, url, headers=headers, timeout=self.timeout, **kwargs)
+            headers_received = time.perf_counter()
+            # Read the body so it is part of the measured latency.
+            response.content
+        except self.errors as ex:
+            if instrumented:
+                phase_timers.current = None
+                self.instrumentation.request_finished(
+                    RequestTiming(
+                        endpoint, method, url, None, ex, start_time_ns, time.perf_counter() - started,
+                        timer.connect is not None, timer.dns, timer.connect, timer.tls, None, None,
+                    )
+                )
+            raise
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            if not self.keep_alive:
+                cold = True
+            elif opened_before is None:
+                cold = parts.netloc not in self._seen_hosts
+                self._seen_hosts.add(parts.netloc)
+            else:
+                cold = self._connections_opened(url) > opened_before
+            (self.cold if cold else self.warm)[endpoint].add(elapsed)
+
+        if instrumented:
+            phase_timers.current = None
+            setup = (timer.dns or 0.0) + (timer.connect or 0.0) + (timer.tls or 0.0)
+            # httpx and http.client read the body along with the headers, so there is no separate body phase.
+            body = None if self.http2 or self.stdlib else elapsed - (headers_received - started)
+            self.instrumentation.request_finished(
+                RequestTiming(
+                    endpoint, method, url, response.status_code, None, start_time_ns, elapsed,
+                    timer.connect is not None, timer.dns, timer.connect, timer.tls, headers_received - started - setup, body,
+                )
+            )
+        return response
+
+    def _start_timer(self, kwargs):
+        """Arms a PhaseTimer for this request. Returns it."""
+        timer = PhaseTimer()
+        if self.http2:
+            kwargs["extensions"] = {**kwargs.get("extensions", {}), "trace": timer.trace}
+        elif not self.stdlib:
+            # Return at the headers, so time to first byte and body time can be told apart.
+            kwargs["stream"] = True
+            phase_timers.current = timer
+        return timer
+
+    def _connections_opened(self, url):
+        """Connections opened so far by the urllib3 pools serving `url`'s adapter.
+
+        httpx does not expose this, so HTTP/2 falls back to treating the first
+        request to each host as the only cold one. Under concurrency the count
+        is shared by all threads, so the cold/warm split is approximate.
+        """
+        if self.http2:
+            return None
+        if self.stdlib:
+            return self.session.connections_opened
+        pools = self.session.get_adapter(url).poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def close(self):
+        self.session.close()
+
+    def print_latency_report(self):
+        """Prints cold (new connection) and warm (reused connection) latency per endpoint."""
+        protocol = f"{'HTTP/2' if self.http2 else 'HTTP/1.1'}{' (http.client)' if self.stdlib else ''}"
+        print_latency_report(protocol, self.cold, self.warm)
+
+
+def print_latency_report(protocol, cold, warm):
+    """Prints the cold and warm LatencySamples of each endpoint."""
+    print("\n==================== Transport Latency ====================")
+    print(f"Protocol: {protocol}")
+    for endpoint in sorted(set(cold) | set(warm)):
+        line = f"{endpoint}:"
+        for label, samples in (("cold", cold[endpoint]), ("warm", warm[endpoint])):
+            if samples.count:
+                line += (
+                    f" {label} n={samples.count} p50={samples.percentile(50) * 1000:.2f}ms"
+                    f" max={samples.max * 1000:.2f}ms"
+                )
+        print(line)
+    print("============================================================")
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Multi-hop trust-chain resolution over TRQP recognitions.
+
+"Is this issuer trusted by my ecosystem?" is answered by walking the
+recognition graph breadth-first from a trust anchor ecosystem:
+
+- at depth 0, the anchor's own registry is asked whether it authorizes the
+  entity (`POST /authorization`);
+- at depth n, the same question goes to every ecosystem recognized by an
+  ecosystem at depth n - 1.
+
+An ecosystem's recognitions are listed with `GET
+/ecosystems/{ecosystem_id}/recognitions`, an optional extension, and each
+one is then confirmed with the core `POST /recognition` query before it is
+followed. A listed recognition that the registry does not confirm is not an
+edge.
+
+All registries at one depth are queried concurrently. The walk stops at the
+first depth with an authorizing ecosystem, so the chain returned is a
+shortest one. It also stops at `max_depth`. Ecosystems already visited are not
+visited again, so recognition cycles end the walk instead of looping.
+
+Each ecosystem's registry is found through an `EndpointDiscovery`
+(trqp_discovery.py). It follows the `TRQP` services of DID documents.
+
+Every edge (one authorization answer, or one ecosystem's confirmed
+recognitions) is kept in a `TrqpResponseCache` for `ttl` seconds. Edges already in the cache are
+answered inline, without threads or network, so a hot verifier answers a
+repeated chain query in microseconds.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import quote
+
+from trqp_cache import MISSING, TrqpResponseCache, cache_key
+from trqp_client import TrqpAuthorizationQuery, TrqpClient, TrqpRecognitionQuery, map_bounded
+from trqp_discovery import DiscoveryError, EndpointDiscovery
+from trqp_transport import TrqpTransport
+
+
+RECOGNITIONS_PATH = "/ecosystems/recognitions"
+
+
+class TrustChainError(Exception):
+    """An edge of the recognition graph could not be checked."""
+
+
+TrustChain = namedtuple("TrustChain", "trusted path errors")
+TrustChain.__doc__ = """Outcome of TrustChainResolver.resolve.
+
+`path` runs from the trust anchor to the ecosystem that authorizes the entity,
+and is empty when `trusted` is False. `errors` holds (ecosystem_id, message)
+pairs for edges that could not be checked. A False answer with errors is
+inconclusive: the entity may be trusted through an unchecked edge.
+"""
+
+
+class TrustChainResolver:
+    """Resolves trust chains from an anchor ecosystem to an entity's authorizing ecosystem."""
+
+    def __init__(
+        self,
+        discovery,
+        headers=None,
+        transport=None,
+        cache=None,
+        max_depth=3,
+        ttl=300.0,
+        negative_ttl=60.0,
+        max_in_flight=8,
+        recognition_resource=None,
+    ):
+        self.discovery = discovery
+        self.headers = dict(headers or {})
+        self.transport = transport or TrqpTransport(pool_size=max_in_flight)
+        self.cache = cache or TrqpResponseCache(ttl=ttl, negative_ttl=negative_ttl)
+        self.max_depth = max_depth
+        self.max_in_flight = max_in_flight
+        self.recognition_resource = recognition_resource
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def client(self, base_url):
+        with self.lock:
+            client = self.clients.get(base_url)
+            if client is None:
+                client = self.clients[base_url] = TrqpClient(
+                    base_url, self.headers, transport=self.transport, cache=self.cache
+                )
+            return client
+
+    def authorization_query(self, ecosystem_id, entity_id, action, resource, at):
+        return TrqpAuthorizationQuery(entity_id, ecosystem_id, action, resource, (("time", at),) if at else ())
+
+    def recognition_query(self, ecosystem_id, entity_id, action, resource, at):
+        return TrqpRecognitionQuery(entity_id, ecosystem_id, action, resource, (("time", at),) if at else ())
+
+    def recognitions_key(self, base_url, ecosystem_id, at):
+        # key[2] is the ecosystem, so TrqpResponseCache.invalidate_entities drops its recognitions.
+        return (base_url, RECOGNITIONS_PATH, ecosystem_id, at)
+
+    def cached(self, edge):
+        """The cached answer or error for an edge, or MISSING.
+
+        Sends no TRQP requests. Finding the ecosystem's registry may still
+        resolve its DID over the network, unless discovery has it cached.
+        """
+        kind, ecosystem_id, entity_id, action, resource, at = edge
+        try:
+            base_url = self.discovery.discover(ecosystem_id)
+        except DiscoveryError as ex:
+            return TrustChainError(str(ex))
+        if kind == "authorizes":
+            query = self.authorization_query(ecosystem_id, entity_id, action, resource, at)
+            answer = self.cache.get(cache_key(query, base_url))
+            if answer is MISSING:
+                return MISSING
+            try:
+                return self.authorized(answer[0], answer[1], base_url)
+            except TrustChainError as ex:
+                return ex
+        return self.cache.get(self.recognitions_key(base_url, ecosystem_id, at))
+
+    def fetch(self, edge):
+        """Checks an edge over the network. Returns its answer, or the TrustChainError."""
+        kind, ecosystem_id, entity_id, action, resource, at = edge
+        try:
+            base_url = self.discovery.discover(ecosystem_id)
+            if kind == "authorizes":
+                return self.fetch_authorization(base_url, ecosystem_id, entity_id, action, resource, at)
+            return self.fetch_recognitions(base_url, ecosystem_id, at)
+        except DiscoveryError as ex:
+            return TrustChainError(str(ex))
+        except TrustChainError as ex:
+            return ex
+
+    def fetch_authorization(self, base_url, ecosystem_id, entity_id, action, resource, at):
+        result = self.client(base_url).query(self.authorization_query(ecosystem_id, entity_id, action, resource, at))
+        if result.error is not None:
+            raise TrustChainError(f"POST /authorization to {base_url} failed: {result.error}")
+        return self.authorized(result.status, result.data, base_url)
+
+    def authorized(self, status, data, base_url=""):
+        return self.decision(status, data, "/authorization", "authorized", base_url)
+
+    def decision(self, status, data, path, field, base_url):
+        if status == 404:
+            return False
+        if status != 200 or not isinstance(data, dict):
+            raise TrustChainError(f"POST {path} to {base_url} returned {status}")
+        return data.get(field) is True
+
+    def fetch_recognitions(self, base_url, ecosystem_id, at):
+        url = f"{base_url}/ecosystems/{quote(ecosystem_id, safe='')}/recognitions"
+        try:
+            response = self.transport.request(
+                "get",
+                url,
+                headers={"Accept": "application/json", **self.headers},
+                endpoint="GET /ecosystems/{ecosystem_id}/recognitions",
+                params={"time": at} if at else None,
+            )
+        except self.transport.errors as ex:
+            raise TrustChainError(f"GET {url} failed: {ex}") from ex
+
+        key = self.recognitions_key(base_url, ecosystem_id, at)
+        if response.status_code in (404, 501):
+            # No recognitions, or the optional extension is not implemented: a leaf.
+            self.cache.put(key, (), self.cache.negative_ttl)
+            return ()
+        try:
+            items = response.json() if response.status_code == 200 else None
+        except ValueError:
+            items = None
+        if not isinstance(items, list):
+            raise TrustChainError(f"GET {url} returned {response.status_code} without a recognition list")
+        queries = [
+            self.recognition_query(ecosystem_id, item["entity_id"], item["action"], item["resource"], at)
+            for item in items
+            if isinstance(item, dict)
+            and item.get("recognized") is True
+            and all(isinstance(item.get(name), str) for name in ("entity_id", "action", "resource"))
+            and (self.recognition_resource is None or item["resource"] == self.recognition_resource)
+        ]
+        recognized = self.confirm_recognitions(base_url, queries)
+        self.cache.put(key, recognized, self.cache.ttl)
+        return recognized
+
+    def confirm_recognitions(self, base_url, queries):
+        """The entity IDs, in listing order, that the registry confirms recognizing with `POST /recognition`.
+
+        Raises TrustChainError if any confirmation fails, since an unconfirmed
+        recognition may be the only edge to a trusted ecosystem.
+        """
+        confirmed = set()
+        if queries:
+            for result in self.client(base_url).batch(queries, min(self.max_in_flight, len(queries))):
+                if result.error is not None:
+                    raise TrustChainError(f"POST /recognition to {base_url} failed: {result.error}")
+                if self.decision(result.status, result.data, "/recognition", "recognized", base_url):
+                    confirmed.add(result.query.entity_id)
+        return tuple(dict.fromkeys(query.entity_id for query in queries if query.entity_id in confirmed))
+
+    def check(self, edges):
+        """Answers every edge: cached ones inline, the rest concurrently. Returns {edge: answer or error}."""
+        answers = {}
+        missing = []
+        for edge in edges:
+            answer = self.cached(edge)
+            if answer is MISSING:
+                missing.append(edge)
+            else:
+                answers[edge] = answer
+        if len(missing) == 1:
+            answers[missing[0]] = self.fetch(missing[0])
+        elif missing:
+            for edge, answer in zip(
+                missing, map_bounded(self.fetch, missing, min(self.max_in_flight, len(missing)), ordered=True)
+            ):
+                answers[edge] = answer
+        return answers
+
+    def resolve(self, entity_id, action, resource, trust_anchor, at=None):
+        """Finds a shortest chain from `trust_anchor` to an ecosystem authorizing the entity. Returns a TrustChain.
+
+        `at` is an RFC3339 time, sent as `context.time` and `time`, to ask
+        about a past instant instead of now.
+        """
+        parents = {trust_anchor: None}
+        frontier = [trust_anchor]
+        errors = []
+        for depth in range(self.max_depth + 1):
+            # The next depth's recognitions are fetched along with this depth's
+            # authorizations, so each depth costs one round of requests.
+            edges = [("authorizes", ecosystem_id, entity_id, action, resource, at) for ecosystem_id in frontier]
+            if depth < self.max_depth:
+                edges += [("recognizes", ecosystem_id, None, None, None, at) for ecosystem_id in frontier]
+            answers = self.check(edges)
+
+            for edge in edges:
+                error = (edge[1], str(answers[edge]))
+                if isinstance(answers[edge], TrustChainError) and error not in errors:
+                    errors.append(error)
+            for edge in edges[: len(frontier)]:
+                if answers[edge] is True:
+                    return TrustChain(True, self.path(parents, edge[1]), tuple(errors))
+
+            next_frontier = []
+            for edge in edges[len(frontier) :]:
+                if isinstance(answers[edge], TrustChainError):
+                    continue
+                for recognized in answers[edge]:
+                    if recognized not in parents:
+                        parents[recognized] = edge[1]
+                        next_frontier.append(recognized)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return TrustChain(False, (), tuple(errors))
+
+    def path(self, parents, ecosystem_id):
+        path = []
+        while ecosystem_id is not None:
+            path.append(ecosystem_id)
+            ecosystem_id = parents[ecosystem_id]
+        return tuple(reversed(path))
+
+
+def parse_registry(value):
+    did, separator, base_url = value.partition("=")
+    if not separator or not did or not base_url:
+        raise argparse.ArgumentTypeError(f"Expected DID=BASE_URL, got {value!r}")
+    return did, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve a trust chain from an anchor ecosystem to an entity.")
+    parser.add_argument("--trust-anchor", required=True, help="DID of the ecosystem the verifier trusts.")
+    parser.add_argument("--entity-id", required=True, help="Entity to check, for example an issuer DID.")
+    parser.add_argument("--action", default="issue", help="Authorization action.")
+    parser.add_argument("--resource", default="credential", help="Authorization resource.")
+    parser.add_argument(
+        "--registry",
+        type=parse_registry,
+        action="append",
+        default=[],
+        metavar="DID=BASE_URL",
+        help="TRQP base URL of an ecosystem or registry DID, for DIDs that cannot be resolved. Repeatable.",
+    )
+    parser.add_argument("--time", help="RFC3339 time to resolve the chain at (default: now).")
+    parser.add_argument("--max-depth", type=int, default=3, help="Maximum recognition hops from the anchor.")
+    parser.add_argument("--bearer-token", default="", help="Bearer token sent to every registry.")
+    parser.add_argument("--repeat", type=int, default=1, help="Resolve this many times, to show cached timing.")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.bearer_token}"} if args.bearer_token else None
+    resolver = TrustChainResolver(EndpointDiscovery(dict(args.registry)), headers=headers, max_depth=args.max_depth)
+    for attempt in range(args.repeat):
+        started = time.perf_counter()
+        chain = resolver.resolve(args.entity_id, args.action, args.resource, args.trust_anchor, args.time)
+        elapsed = time.perf_counter() - started
+        print(f"Resolution {attempt + 1}: {elapsed * 1e6:.0f} us", file=sys.stderr)
+    for ecosystem_id, message in chain.errors:
+        print(f"Unchecked edge at {ecosystem_id}: {message}", file=sys.stderr)
+    if chain.trusted:
+        print("TRUSTED: " + " -> ".join(chain.path + (args.entity_id,)))
+        return 0
+    print("NOT TRUSTED" + (" (inconclusive)" if chain.errors else ""))
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
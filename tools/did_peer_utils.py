@@ -1,13 +1,26 @@
 #!/usr/bin/env python
 
+import argparse
 import json
 import base64
-from cryptography.hazmat.primitives.asymmetric import ed25519, x25519
-from cryptography.hazmat.primitives import serialization
+import os
+import sys
+from collections import deque, namedtuple
+from functools import lru_cache
+from itertools import islice
 from base58 import b58encode
 
+# cryptography and the process pool are imported where they are used, since
+# resolving a DID needs neither and is often the only thing a caller does.
+
+# Number of distinct DIDs kept by resolve_did_peer2_cached and did_peer2_material.
+RESOLVE_CACHE_SIZE = 4096
+
 def generate_did_peer2(config_data, method_prefix="did:peer:2"):
     """Generate a DID:peer:2 identifier with service endpoints."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, x25519
+
     # Generate Ed25519 Key
     ed_private_key = ed25519.Ed25519PrivateKey.generate()
     ed_public_key = ed_private_key.public_key()
@@ -53,109 +66,308 @@ def generate_did_peer2(config_data, method_prefix="did:peer:2"):
     return did, ed_priv_hex, x25519_priv_hex
 
 
-def resolve_did_peer2(did_str, method_prefix="did:peer:2"):
-    """Resolve a DID:peer:2 string into a DID Document."""
+KEY_PURPOSES = {
+    "V": "authentication",
+    "A": "assertionMethod",
+    "E": "keyAgreement",
+    "I": "capabilityInvocation",
+    "D": "capabilityDelegation",
+}
+
+DID_CONTEXT = (
+    "https://www.w3.org/ns/did/v1",
+    "https://w3id.org/security/multikey/v1",
+)
+
+DidPeer2Material = namedtuple("DidPeer2Material", "keys services")
+
+
+def _did_peer2_segments(did_str, method_prefix):
     if not did_str.startswith(method_prefix):
         raise ValueError(
             f"DID '{did_str}' does not match method prefix '{method_prefix}'"
         )
 
-    doc = {
-        "@context": [
-            "https://www.w3.org/ns/did/v1",
-            "https://w3id.org/security/multikey/v1",
-        ],
-        "id": did_str,
-    }
-
-    vm_list, auth, assertion, key_agreement, cap_inv, cap_del, services = (
-        [],
-        [],
-        [],
-        [],
-        [],
-        [],
-        [],
-    )
-    service_count = 0
-
-    body = did_str[len(method_prefix) :].lstrip(".")
-    parts = body.split(".")
-    key_index = 1
-
-    for seg in parts:
+    segments = did_str[len(method_prefix) :].lstrip(".").split(".")
+    for seg in segments:
         if len(seg) < 2:
             raise ValueError(f"Malformed segment: '{seg}'")
-        purpose, rest = seg[0], seg[1:]
+        if seg[0] not in KEY_PURPOSES and seg[0] != "S":
+            raise ValueError(f"Unknown purpose code '{seg[0]}' in segment '{seg}'")
+    return segments
 
-        if purpose in ["V", "A", "E", "I", "D"]:
-            key_id = f"#key-{key_index}"
-            key_index += 1
-            vm_list.append(
-                {
-                    "id": key_id,
-                    "type": "Multikey",
-                    "controller": did_str,
-                    "publicKeyMultibase": rest,
-                }
-            )
 
-            if purpose == "V":
-                auth.append(key_id)
-            elif purpose == "A":
-                assertion.append(key_id)
-            elif purpose == "E":
-                key_agreement.append(key_id)
-            elif purpose == "I":
-                cap_inv.append(key_id)
-            elif purpose == "D":
-                cap_del.append(key_id)
-
-        elif purpose == "S":
-            # Decode the service segment
-            padding_needed = (4 - len(rest) % 4) % 4
-            svc_bytes = base64.urlsafe_b64decode(rest + ("=" * padding_needed))
-            service = json.loads(svc_bytes)
-
-            if not isinstance(service, dict):
-                raise ValueError("Decoded service is not an object")
-
-            # Fill in an ID if one is missing
-            if "id" not in service:
-                service["id"] = f"#service-{service_count}" if service_count else "#service"
-                service_count += 1
-                
-            # Ensure we're using full property names (handling any abbreviated that might be in the DID)
-            if "serviceEndpoint" in service and isinstance(service["serviceEndpoint"], dict):
-                endpoint = service["serviceEndpoint"]
-                
-                # Convert any abbreviated properties to full names
-                if "p" in endpoint and "profile" not in endpoint:
-                    endpoint["profile"] = endpoint.pop("p")
-                if "u" in endpoint and "uri" not in endpoint:
-                    uri_value = endpoint.pop("u")
-                    endpoint["uri"] = uri_value[0] if isinstance(uri_value, list) else uri_value
-                if "i" in endpoint and "integrity" not in endpoint:
-                    endpoint["integrity"] = endpoint.pop("i")
-                    
+def _decode_service(rest, service_count):
+    """Decode one S segment. Returns the service and the updated unnamed-service count."""
+    padding_needed = (4 - len(rest) % 4) % 4
+    svc_bytes = base64.urlsafe_b64decode(rest + ("=" * padding_needed))
+    service = json.loads(svc_bytes)
+
+    if not isinstance(service, dict):
+        raise ValueError("Decoded service is not an object")
+
+    # Fill in an ID if one is missing
+    if "id" not in service:
+        service["id"] = f"#service-{service_count}" if service_count else "#service"
+        service_count += 1
+
+    # Ensure we're using full property names (handling any abbreviated that might be in the DID)
+    if "serviceEndpoint" in service and isinstance(service["serviceEndpoint"], dict):
+        endpoint = service["serviceEndpoint"]
+
+        # Convert any abbreviated properties to full names
+        if "p" in endpoint and "profile" not in endpoint:
+            endpoint["profile"] = endpoint.pop("p")
+        if "u" in endpoint and "uri" not in endpoint:
+            uri_value = endpoint.pop("u")
+            endpoint["uri"] = uri_value[0] if isinstance(uri_value, list) else uri_value
+        if "i" in endpoint and "integrity" not in endpoint:
+            endpoint["integrity"] = endpoint.pop("i")
+
+    return service, service_count
+
+
+def resolve_did_peer2(did_str, method_prefix="did:peer:2"):
+    """Resolve a DID:peer:2 string into a DID Document."""
+    doc = {"@context": list(DID_CONTEXT), "id": did_str}
+
+    vm_list, services = [], []
+    relationships = {}
+    service_count = 0
+    key_index = 1
+
+    for seg in _did_peer2_segments(did_str, method_prefix):
+        purpose, rest = seg[0], seg[1:]
+        if purpose == "S":
+            service, service_count = _decode_service(rest, service_count)
             services.append(service)
+            continue
 
-        else:
-            raise ValueError(f"Unknown purpose code '{purpose}' in segment '{seg}'")
+        key_id = f"#key-{key_index}"
+        key_index += 1
+        vm_list.append(
+            {
+                "id": key_id,
+                "type": "Multikey",
+                "controller": did_str,
+                "publicKeyMultibase": rest,
+            }
+        )
+        relationships.setdefault(KEY_PURPOSES[purpose], []).append(key_id)
 
     if vm_list:
         doc["verificationMethod"] = vm_list
-    if auth:
-        doc["authentication"] = auth
-    if assertion:
-        doc["assertionMethod"] = assertion
-    if key_agreement:
-        doc["keyAgreement"] = key_agreement
-    if cap_inv:
-        doc["capabilityInvocation"] = cap_inv
-    if cap_del:
-        doc["capabilityDelegation"] = cap_del
+    for relationship in KEY_PURPOSES.values():
+        if relationship in relationships:
+            doc[relationship] = relationships[relationship]
     if services:
         doc["service"] = services
 
     return doc
+
+
+class FrozenDict(dict):
+    """Read-only dict used for cached DID documents. Still a dict for json.dumps."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Cached DID documents are read-only; pass frozen=False for a copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Recursively convert dicts to FrozenDict and lists to tuples."""
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple([freeze(item) for item in value])
+    return value
+
+
+def thaw(value):
+    """Recursively copy a frozen structure back into plain dicts and lists."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def _resolve_did_peer2_frozen(did_str, method_prefix):
+    return freeze(resolve_did_peer2(did_str, method_prefix))
+
+
+def resolve_did_peer2_cached(did_str, method_prefix="did:peer:2", frozen=True):
+    """Memoized resolve_did_peer2.
+
+    A did:peer:2 is self-certifying, so its document is a pure function of the
+    string and is cached in a bounded LRU. By default the shared read-only
+    document is returned; `frozen=False` returns a private mutable copy.
+    """
+    doc = _resolve_did_peer2_frozen(did_str, method_prefix)
+    return doc if frozen else thaw(doc)
+
+
+resolve_did_peer2_cached.cache_info = _resolve_did_peer2_frozen.cache_info
+resolve_did_peer2_cached.cache_clear = _resolve_did_peer2_frozen.cache_clear
+
+
+@lru_cache(maxsize=RESOLVE_CACHE_SIZE)
+def did_peer2_material(did_str, method_prefix="did:peer:2"):
+    """Extract only the keys and services of a DID:peer:2, without building a DID Document.
+
+    Returns a cached DidPeer2Material whose `keys` are (key_id, relationship,
+    publicKeyMultibase) tuples in DID order and whose `services` are read-only
+    service objects, matching the entries resolve_did_peer2 would produce.
+    """
+    keys, services = [], []
+    service_count = 0
+    for seg in _did_peer2_segments(did_str, method_prefix):
+        purpose, rest = seg[0], seg[1:]
+        if purpose == "S":
+            service, service_count = _decode_service(rest, service_count)
+            services.append(freeze(service))
+        else:
+            keys.append((f"#key-{len(keys) + 1}", KEY_PURPOSES[purpose], rest))
+    return DidPeer2Material(tuple(keys), tuple(services))
+
+
+def _generate_chunk(count, config_data, method_prefix, as_json):
+    records = []
+    for _ in range(count):
+        did, ed_priv_hex, x25519_priv_hex = generate_did_peer2(config_data, method_prefix)
+        record = {
+            "did": did,
+            "ed25519_private_key_hex": ed_priv_hex,
+            "x25519_private_key_hex": x25519_priv_hex,
+        }
+        records.append(json.dumps(record) if as_json else record)
+    return records
+
+
+def _resolve_chunk(dids, method_prefix, as_json):
+    records = []
+    for did in dids:
+        try:
+            record = {"did": did, "didDocument": resolve_did_peer2(did, method_prefix)}
+        except ValueError as ex:
+            record = {"did": did, "error": str(ex)}
+        records.append(json.dumps(record) if as_json else record)
+    return records
+
+
+def _run_chunks(func, chunks, workers, *args):
+    """Yield the records of func(chunk, *args) for each chunk, in order.
+
+    With more than one worker the chunks run in a process pool with at most
+    two chunks per worker in flight, so memory stays bounded however many
+    chunks there are.
+    """
+    if workers == 1:
+        for chunk in chunks:
+            yield from func(chunk, *args)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk, *args))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def generate_did_peer2_bulk(
+    count, config_data, method_prefix="did:peer:2", workers=None, chunk_size=256, as_json=False
+):
+    """Generate `count` DID:peer:2 identifiers across a process pool.
+
+    Yields one {"did", "ed25519_private_key_hex", "x25519_private_key_hex"}
+    record per DID as results arrive. With `as_json` the records are encoded
+    to JSON strings inside the workers, which is cheaper than sending dicts
+    back to the parent process.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = (min(chunk_size, count - start) for start in range(0, count, chunk_size))
+    return _run_chunks(_generate_chunk, chunks, workers, config_data, method_prefix, as_json)
+
+
+def resolve_did_peer2_bulk(dids, method_prefix="did:peer:2", workers=None, chunk_size=256, as_json=False):
+    """Resolve an iterable of DID:peer:2 strings across a process pool.
+
+    Yields {"did", "didDocument"} records, or {"did", "error"} for DIDs that
+    fail to resolve, in input order. `dids` is read lazily. `as_json` works as
+    for generate_did_peer2_bulk.
+    """
+    workers = workers or os.cpu_count() or 1
+    dids = iter(dids)
+    chunks = iter(lambda: list(islice(dids, chunk_size)), [])
+    return _run_chunks(_resolve_chunk, chunks, workers, method_prefix, as_json)
+
+
+def _read_dids(lines):
+    """Accept one DID per line, either bare or as a JSON object with a "did" field."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        yield json.loads(line)["did"] if line.startswith("{") else line
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    common.add_argument("--chunk-size", type=int, default=256, help="DIDs handed to a worker per task.")
+    common.add_argument("--method-prefix", default="did:peer:2", help="DID method prefix.")
+    common.add_argument("--output", default="-", help="JSON Lines output file (default: stdout).")
+
+    parser = argparse.ArgumentParser(description="Bulk DID:peer:2 generation and resolution as JSON Lines.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", parents=[common], help="Generate DIDs.")
+    generate.add_argument("--count", type=int, required=True, help="Number of DIDs to generate.")
+    generate.add_argument(
+        "--config",
+        help="JSON file with a generate_did_peer2 config, e.g. {\"services\": [...]}.",
+    )
+
+    resolve = commands.add_parser("resolve", parents=[common], help="Resolve DIDs.")
+    resolve.add_argument(
+        "--input",
+        default="-",
+        help="File with one DID per line, bare or as JSON with a \"did\" field (default: stdin).",
+    )
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.command == "generate":
+            config_data = {}
+            if args.config:
+                with open(args.config, encoding="utf-8") as config_file:
+                    config_data = json.load(config_file)
+            lines = generate_did_peer2_bulk(
+                args.count, config_data, args.method_prefix, args.workers, args.chunk_size, as_json=True
+            )
+        else:
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            lines = resolve_did_peer2_bulk(
+                _read_dids(source), args.method_prefix, args.workers, args.chunk_size, as_json=True
+            )
+        for line in lines:
+            output.write(line + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Tests for batch Ed25519 key decoding and signature verification."""
+
+import pytest
+from base58 import b58decode, b58encode
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
+
+from did_peer_keys import (
+    ED25519_PUB_PREFIX,
+    decode_multibase_keys,
+    load_ed25519_keys,
+    verify_did_signatures,
+    verify_ed25519_batch,
+)
+from did_peer_utils import generate_did_peer2
+
+
+def multibase(raw):
+    return "z" + b58encode(raw).decode()
+
+
+def public_bytes(private_key):
+    return private_key.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+
+
+@pytest.mark.parametrize("raw", [bytes(range(1, 33)), b"\0" + bytes(range(1, 32)), b"\0\0\0" + b"\xff" * 29])
+def test_decodes_bare_and_prefixed_keys(raw):
+    buffer = decode_multibase_keys([multibase(raw), multibase(ED25519_PUB_PREFIX + raw)])
+    assert bytes(buffer) == raw + raw
+    assert bytes(buffer[:32]) == b58decode(multibase(raw)[1:])
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        bytes(range(1, 32)),  # 31 bytes, which used to be left-padded
+        b"\0" + bytes(range(1, 31)),
+        bytes(range(1, 34)),
+        ED25519_PUB_PREFIX + bytes(range(1, 32)),
+        b"\xed\x02" + bytes(range(1, 33)),
+        b"\0\0" + bytes(range(1, 33)),
+    ],
+)
+def test_rejects_keys_of_the_wrong_length(raw):
+    with pytest.raises(ValueError, match="Key 1 is not an Ed25519 public key"):
+        decode_multibase_keys([multibase(bytes(32)), multibase(raw)])
+
+
+@pytest.mark.parametrize("value", ["", "z", "m" + "A" * 43, "z0OIl", "z" + "é" * 44])
+def test_rejects_values_that_are_not_base58btc(value):
+    with pytest.raises(ValueError, match="Key 0 is not a base58btc multibase value"):
+        decode_multibase_keys([value])
+
+
+def test_verify_batch():
+    private_keys = [Ed25519PrivateKey.generate() for _ in range(3)]
+    messages = [b"first", b"second", b"third"]
+    signatures = [key.sign(message) for key, message in zip(private_keys, messages)]
+    signatures[1] = private_keys[0].sign(messages[1])
+    keys = load_ed25519_keys(decode_multibase_keys([multibase(public_bytes(key)) for key in private_keys]))
+    assert verify_ed25519_batch(keys, signatures, messages) == bytearray([1, 0, 1])
+    assert verify_ed25519_batch(keys, b"".join(signatures), messages) == bytearray([1, 0, 1])
+
+
+def test_verify_batch_rejects_mismatched_lengths():
+    private_key = Ed25519PrivateKey.generate()
+    keys = load_ed25519_keys(decode_multibase_keys([multibase(public_bytes(private_key))]))
+    signature = private_key.sign(b"message")
+    with pytest.raises(ValueError, match="Expected 2 public keys, got 1"):
+        verify_ed25519_batch(keys, [signature, signature], [b"message", b"message"])
+    with pytest.raises(ValueError, match="Expected 1 signatures, got 2"):
+        verify_ed25519_batch(keys, [signature, signature], [b"message"])
+    with pytest.raises(ValueError, match="Expected 64 bytes of signatures"):
+        verify_ed25519_batch(keys, signature * 2, [b"message"])
+
+
+def test_verify_did_signatures():
+    did, private_hex, _ = generate_did_peer2({})
+    private_key = Ed25519PrivateKey.from_private_bytes(bytes.fromhex(private_hex))
+    messages = [b"one", b"two", b"three"]
+    signatures = [private_key.sign(message) for message in messages]
+    dids = [did, did, "did:peer:2.Vzbogus"]
+    assert verify_did_signatures(dids, signatures, messages) == bytearray([1, 1, 0])
+    assert verify_did_signatures(dids, signatures, messages, key_id="#key-2") == bytearray([0, 0, 0])
+    with pytest.raises(ValueError, match="Expected 3 DIDs, got 2"):
+        verify_did_signatures(dids[:2], signatures, messages)
@@ -0,0 +1,124 @@
+"""Tests for cached and bulk did:peer:2 resolution, and bulk generation."""
+
+import json
+import pickle
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from did_peer_utils import (
+    FrozenDict,
+    did_peer2_material,
+    generate_did_peer2,
+    generate_did_peer2_bulk,
+    resolve_did_peer2,
+    resolve_did_peer2_bulk,
+    resolve_did_peer2_cached,
+)
+
+CONFIG = {
+    "services": [
+        {"type": "TRQP", "serviceEndpoint": {"u": ["https://registry.example"], "p": "ayra-trqp"}},
+        {"id": "#didcomm", "type": "DIDCommMessaging", "serviceEndpoint": "https://agent.example"},
+        {"type": "LinkedDomains", "serviceEndpoint": "https://example.com"},
+    ]
+}
+
+
+@pytest.fixture(scope="module")
+def did():
+    return generate_did_peer2(CONFIG)[0]
+
+
+def test_cached_resolution_matches_a_fresh_one(did):
+    resolve_did_peer2_cached.cache_clear()
+    document = resolve_did_peer2_cached(did)
+    assert json.loads(json.dumps(document)) == resolve_did_peer2(did)
+    assert resolve_did_peer2_cached(did) is document
+    assert resolve_did_peer2_cached.cache_info().hits == 1
+    assert [service["id"] for service in document["service"]] == ["#service", "#didcomm", "#service-1"]
+    assert document["service"][0]["serviceEndpoint"] == {"uri": "https://registry.example", "profile": "ayra-trqp"}
+
+
+def test_cached_documents_are_read_only(did):
+    document = resolve_did_peer2_cached(did)
+    with pytest.raises(TypeError, match="read-only"):
+        document["id"] = "did:example:other"
+    with pytest.raises(TypeError):
+        document["service"][0]["serviceEndpoint"].update(uri="https://attacker.example")
+    with pytest.raises(AttributeError):
+        document["verificationMethod"].append({})
+    assert pickle.loads(pickle.dumps(document)) == document
+
+
+def test_unfrozen_documents_are_private_copies(did):
+    copy = resolve_did_peer2_cached(did, frozen=False)
+    copy["service"].clear()
+    assert not isinstance(copy, FrozenDict)
+    assert len(resolve_did_peer2_cached(did)["service"]) == 3
+
+
+def test_material_matches_the_document(did):
+    document = resolve_did_peer2(did)
+    material = did_peer2_material(did)
+    assert material.keys == tuple(
+        (method["id"], relationship, method["publicKeyMultibase"])
+        for method in document["verificationMethod"]
+        for relationship in ("authentication", "keyAgreement")
+        if method["id"] in document.get(relationship, ())
+    )
+    assert [dict(service) for service in material.services] == document["service"]
+    assert did_peer2_material(did) is material
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        ("did:peer:4.Vz6Mk", "does not match method prefix"),
+        ("did:peer:2.X123", "Unknown purpose code"),
+        ("did:peer:2.V", "Malformed segment"),
+        ("did:peer:2.SWzFd", "not an object"),
+    ],
+)
+def test_invalid_dids_raise_and_are_not_cached(value, message):
+    for _ in range(2):
+        with pytest.raises(ValueError, match=message):
+            resolve_did_peer2_cached(value)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bulk_generation_yields_count_records(workers):
+    records = list(generate_did_peer2_bulk(7, CONFIG, workers=workers, chunk_size=3))
+    assert len(records) == 7 and len({record["did"] for record in records}) == 7
+    for record in records:
+        assert len(bytes.fromhex(record["ed25519_private_key_hex"])) == 32
+        assert resolve_did_peer2(record["did"])["service"][0]["type"] == "TRQP"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bulk_resolution_keeps_input_order_and_reports_errors(did, workers):
+    dids = [did, "did:peer:2.X123", did, "did:web:example.com"]
+    lines = list(resolve_did_peer2_bulk(iter(dids), workers=workers, chunk_size=1, as_json=True))
+    records = [json.loads(line) for line in lines]
+    assert [record["did"] for record in records] == dids
+    assert records[0]["didDocument"] == records[2]["didDocument"] == resolve_did_peer2(did)
+    assert "Unknown purpose code" in records[1]["error"]
+    assert "does not match method prefix" in records[3]["error"]
+
+
+def test_command_line_round_trip(tmp_path):
+    script = Path(__file__).with_name("did_peer_utils.py")
+    generated = tmp_path / "dids.jsonl"
+    subprocess.run(
+        [sys.executable, script, "generate", "--count", "5", "--workers", "1", "--output", generated], check=True
+    )
+    resolved = subprocess.run(
+        [sys.executable, script, "resolve", "--input", generated, "--workers", "1"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.splitlines()
+    dids = [json.loads(line)["did"] for line in generated.read_text().splitlines()]
+    assert [json.loads(line)["didDocument"]["id"] for line in resolved] == dids